@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Expired and surplus rows of the disk tier are deleted at most this often
+SWEEP_INTERVAL = 300  # seconds
+
+class AnalysisCache:
+    """Content-addressed cache for image analysis results
+
+    Results are keyed on the sha256 of the image bytes and the analysis
+    mode. Lookups go through an
+    in-memory LRU tier first and fall back to an optional SQLite tier that
+    survives restarts. The SQLite tier is swept periodically: expired rows
+    are deleted and the oldest rows beyond max_disk_entries are evicted.
+
+    The limits have no defaults here; Config (CACHE_MAX_ENTRIES, CACHE_TTL,
+    CACHE_MAX_DISK_ENTRIES) is the one place they are set.
+    """
+
+    def __init__(self, max_entries: int, ttl: int, db_path: Optional[str] = None, max_disk_entries: int = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path or None
+        # 0 leaves the disk tier uncapped (expired rows are still swept)
+        self.max_disk_entries = max_disk_entries
+
+        # key -> (stored_at, value, cost_seconds)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._last_sweep = 0.0
+        # key -> future of the analysis being computed for it
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        # Counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.coalesced = 0
+        self.saved_seconds = 0.0
+
+        if self.db_path:
+            self._open_db()
+
+    @staticmethod
+    def key_for(image_data: bytes, mode: str = "text") -> str:
+        """Return the cache key for image bytes analyzed in the given mode"""
+        return f"{mode}:{hashlib.sha256(image_data).hexdigest()}"
+
+    def _open_db(self):
+        """Open the SQLite tier, disabling it if the file cannot be used"""
+        try:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS analysis_cache (
+                    key TEXT PRIMARY KEY,
+                    stored_at REAL NOT NULL,
+                    value TEXT NOT NULL,
+                    cost_seconds REAL NOT NULL DEFAULT 0
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS analysis_cache_stored_at ON analysis_cache (stored_at)"
+            )
+            self._db.commit()
+            logger.info(f"Analysis cache disk tier enabled: {self.db_path}")
+        except sqlite3.Error as e:
+            logger.error(f"Could not open analysis cache database {self.db_path}: {e}")
+            self._db = None
+            return
+        self.sweep()
+
+    def _is_expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - stored_at > self.ttl
+
+    def _remember(self, key: str, stored_at: float, value: Any, cost: float):
+        """Insert into the memory tier, evicting least recently used entries"""
+        self._memory[key] = (stored_at, value, cost)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a cached analysis
+
+        Args:
+            key: Cache key from key_for()
+
+        Returns:
+            Cached analysis, or None on a miss
+        """
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            stored_at, value, cost = entry
+            if not self._is_expired(stored_at, now):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_seconds += cost
+                return value
+            del self._memory[key]
+
+        if self._db is not None:
+            loop = asyncio.get_event_loop()
+            row = await loop.run_in_executor(None, self._db_get, key)
+            if row is not None:
+                stored_at, value, cost = row
+                if not self._is_expired(stored_at, now):
+                    self._remember(key, stored_at, value, cost)
+                    self.disk_hits += 1
+                    self.saved_seconds += cost
+                    return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any, cost: float = 0.0):
+        """
+        Store an analysis result
+
+        Args:
+            key: Cache key from key_for()
+            value: JSON-serializable analysis result
+            cost: Seconds the analysis took, used to report time saved on hits
+        """
+        stored_at = time.time()
+        self._remember(key, stored_at, value, cost)
+
+        if self._db is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._db_set, key, stored_at, value, cost)
+            if stored_at - self._last_sweep >= SWEEP_INTERVAL:
+                self._last_sweep = stored_at
+                await loop.run_in_executor(None, self.sweep)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """
+        Look up an analysis, computing it once for all concurrent misses
+
+        The first caller to miss runs compute(); callers missing the same key
+        while it runs wait for its result instead of analyzing the image
+        again. compute() stores its result with set() if it should be cached.
+
+        Args:
+            key: Cache key from key_for()
+            compute: Coroutine function producing the analysis, or None
+
+        Returns:
+            Cached or computed analysis, or None
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        value = None
+        try:
+            value = await compute()
+            return value
+        finally:
+            # Waiters get None if the computation failed or was cancelled
+            future.set_result(value)
+            del self._inflight[key]
+
+    def sweep(self) -> int:
+        """
+        Delete expired rows and the oldest rows beyond max_disk_entries
+
+        Returns:
+            Number of rows deleted
+        """
+        if self._db is None:
+            return 0
+        self._last_sweep = time.time()
+        try:
+            with self._db_lock:
+                deleted = 0
+                if self.ttl > 0:
+                    deleted += self._db.execute(
+                        "DELETE FROM analysis_cache WHERE stored_at < ?",
+                        (time.time() - self.ttl,)
+                    ).rowcount
+                if self.max_disk_entries > 0:
+                    deleted += self._db.execute(
+                        """DELETE FROM analysis_cache WHERE key IN (
+                            SELECT key FROM analysis_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?
+                        )""",
+                        (self.max_disk_entries,)
+                    ).rowcount
+                self._db.commit()
+            self.disk_evictions += deleted
+            if deleted:
+                logger.debug(f"Analysis cache sweep deleted {deleted} rows")
+            return deleted
+        except sqlite3.Error as e:
+            logger.error(f"Analysis cache sweep failed: {e}")
+            return 0
+
+    def _db_get(self, key: str) -> Optional[tuple]:
+        """Read a row from the disk tier (runs in thread)"""
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT stored_at, value, cost_seconds FROM analysis_cache WHERE key = ?",
+                    (key,)
+                ).fetchone()
+                if row is not None and self._is_expired(row[0], time.time()):
+                    self._db.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    return None
+            if row is None:
+                return None
+            return row[0], json.loads(row[1]), row[2]
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            logger.error(f"Analysis cache read failed: {e}")
+            return None
+
+    def _db_set(self, key: str, stored_at: float, value: Any, cost: float):
+        """Write a row to the disk tier (runs in thread)"""
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, stored_at, value, cost_seconds) VALUES (?, ?, ?, ?)",
+                    (key, stored_at, json.dumps(value), cost)
+                )
+                self._db.commit()
+        except (sqlite3.Error, TypeError) as e:
+            logger.error(f"Analysis cache write failed: {e}")
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and estimated time saved"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+            "coalesced": self.coalesced,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+        }
+
+    def close(self):
+        """Close the disk tier"""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
@@ -0,0 +1,117 @@
+"""Compare the emoji scorer with the previous per-keyword loop
+
+Usage: python benchmarks/bench_emoji_scoring.py [--calls N] [--sizes 0,2000,20000] [--repeat N]
+
+Grows EmojiMapper by synthetic keywords (each with a few emojis from a
+shared pool) and maps seeded descriptions that mention a mix of built-in
+and synthetic keywords. "legacy" and "scorer" time a whole call, keyword
+matching included: the old random.choice/set/random.sample loop against
+EmojiMapper.get_emojis_for_content. "match" is the matching share of
+either; every timing is the best of --repeat passes. "add" is the cost of
+add_custom_mapping once the scorer is built. The last column checks that
+repeated calls with the scorer give identical results.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emoji_mapper import EmojiMapper
+
+BASE_TEXT = ("A happy dog and a cute cat playing on the beach next to the ocean at sunset, "
+             "with a red ball, a tree and some flowers in the background. ")
+
+def legacy_map(mapper, text, max_emojis):
+    """The mapping loop EmojiMapper used before the scorer"""
+    matched_keywords = {}
+    for label, keyword, _ in mapper.matcher.find_all(text.lower()):
+        if label == 'mapping':
+            matched_keywords.setdefault(keyword, None)
+
+    matched_emojis = set()
+    for keyword in matched_keywords:
+        matched_emojis.add(random.choice(mapper.emoji_mappings[keyword]))
+
+    emoji_list = list(matched_emojis)
+    if len(emoji_list) > max_emojis:
+        emoji_list = random.sample(emoji_list, max_emojis)
+    return emoji_list
+
+def build_mapper(extra_keywords, rng):
+    mapper = EmojiMapper()
+    pool = sorted({emoji for emojis in mapper.emoji_mappings.values() for emoji in emojis})
+    synthetic = []
+    for index in range(extra_keywords):
+        keyword = f"kw{index}"
+        mapper.add_custom_mapping(keyword, rng.sample(pool, rng.randint(1, 5)))
+        synthetic.append(keyword)
+    return mapper, synthetic
+
+def build_texts(synthetic, count, rng):
+    texts = []
+    for _ in range(count):
+        words = rng.sample(synthetic, min(len(synthetic), 8))
+        texts.append((BASE_TEXT + " ".join(words)).lower())
+    return texts
+
+def time_per_call(func, items, repeat=1):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - started)
+    return best / len(items) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000, help="descriptions mapped per size")
+    parser.add_argument("--sizes", default="0,2000,20000", help="synthetic keywords added to the built-in mappings")
+    parser.add_argument("--max-emojis", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5, help="timing passes, best is reported")
+    args = parser.parse_args()
+
+    # add_custom_mapping logs every keyword
+    logging.basicConfig(level=logging.WARNING)
+
+    header = (f"{'mappings':>10}{'build ms':>10}{'add us':>8}{'match us':>10}"
+              f"{'legacy us':>11}{'scorer us':>11}{'stable':>8}")
+    print(header)
+    print("-" * len(header))
+
+    for size in (int(value) for value in args.sizes.split(",")):
+        rng = random.Random(args.seed)
+        mapper, synthetic = build_mapper(size, rng)
+        texts = build_texts(synthetic, args.calls, rng)
+
+        started = time.perf_counter()
+        mapper.scorer
+        build_ms = (time.perf_counter() - started) * 1000
+
+        extra = [f"extra{index}" for index in range(100)]
+        add_us = time_per_call(lambda keyword: mapper.add_custom_mapping(keyword, ["🎉"]), extra)
+        for keyword in extra:
+            mapper.remove_mapping(keyword)
+
+        match_us = time_per_call(mapper.matcher.find_all, texts, args.repeat)
+        legacy_us = time_per_call(lambda text: legacy_map(mapper, text, args.max_emojis), texts, args.repeat)
+        scorer_us = time_per_call(lambda text: mapper.get_emojis_for_content(text, args.max_emojis), texts, args.repeat)
+        stable = all(
+            mapper.get_emojis_for_content(text, args.max_emojis) ==
+            mapper.get_emojis_for_content(text, args.max_emojis)
+            for text in texts[:100]
+        )
+
+        print(f"{len(mapper.emoji_mappings):>10}{build_ms:>10.1f}{add_us:>8.1f}{match_us:>10.1f}"
+              f"{legacy_us:>11.1f}{scorer_us:>11.1f}{'yes' if stable else 'no':>8}")
+
+    print()
+    print("legacy and scorer are whole calls; match is the part both spend matching keywords.")
+
+if __name__ == "__main__":
+    main()
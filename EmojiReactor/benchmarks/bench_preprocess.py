@@ -0,0 +1,115 @@
+"""Compare vision upload payloads with and without client-side preprocessing
+
+Usage: python benchmarks/bench_preprocess.py [--repeat N] [--max-long-side PX] [--max-short-side PX]
+
+Generates synthetic photo-like images at typical phone/screenshot sizes and
+reports, for each, the base64 payload size and the time to produce it when
+sending the raw attachment versus the downscaled/re-encoded version.
+
+With the default limits (2048/768, the API's own "high" detail fit) the
+token columns match: the API bills the image after shrinking it to those
+limits anyway, so preprocessing saves upload bytes and server-side decoding,
+not tokens. Lower limits trade detail for tokens, e.g. --max-short-side 512.
+"""
+import argparse
+import base64
+import io
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from utils import ImageUtils
+
+CASES = [
+    ("phone photo", (4032, 3024), "JPEG"),
+    ("phone screenshot", (1170, 2532), "PNG"),
+    ("desktop screenshot", (2560, 1440), "PNG"),
+    ("meme", (1080, 1080), "JPEG"),
+    ("thumbnail", (640, 480), "JPEG"),
+]
+
+def make_image(size, image_format, seed=0):
+    """Build a noisy, shape-filled image that compresses like a real photo"""
+    rng = random.Random(seed)
+    small = Image.effect_noise((size[0] // 8, size[1] // 8), 64).convert("RGB")
+    img = small.resize(size, Image.Resampling.BICUBIC)
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        r = rng.randrange(20, max(21, min(size) // 4))
+        colour = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=colour)
+    img = img.filter(ImageFilter.GaussianBlur(1))
+    output = io.BytesIO()
+    img.save(output, format=image_format, quality=92)
+    return output.getvalue()
+
+def vision_tokens(width, height):
+    """Estimate "high" detail image tokens after the API's own resizing"""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+def time_it(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions, best is reported")
+    parser.add_argument("--max-long-side", type=int, default=2048)
+    parser.add_argument("--max-short-side", type=int, default=768)
+    args = parser.parse_args()
+    limits = (args.max_long_side, args.max_short_side)
+
+    header = f"{'case':<20}{'raw b64':>12}{'prep b64':>12}{'ratio':>8}{'raw ms':>9}{'prep ms':>9}{'tokens':>8}{'tokens':>8}"
+    print(header)
+    print(f"{'':<20}{'':>12}{'':>12}{'':>8}{'':>9}{'':>9}{'before':>8}{'after':>8}")
+    print("-" * len(header))
+
+    for name, size, image_format in CASES:
+        data = make_image(size, image_format)
+
+        raw_time, raw_b64 = time_it(lambda: base64.b64encode(data), args.repeat)
+
+        def prepared():
+            if not ImageUtils.needs_preprocessing(ImageUtils.describe(data), *limits):
+                return base64.b64encode(data), ImageUtils.get_image_info(data)[1:]
+            payload, _ = ImageUtils.prepare_for_vision(data, *limits)
+            return base64.b64encode(payload), ImageUtils.get_image_info(payload)[1:]
+
+        prep_time, (prep_b64, prep_size) = time_it(prepared, args.repeat)
+
+        print(
+            f"{name:<20}"
+            f"{len(raw_b64) / 1024:>10.0f}KB"
+            f"{len(prep_b64) / 1024:>10.0f}KB"
+            f"{len(raw_b64) / len(prep_b64):>7.1f}x"
+            f"{raw_time * 1000:>9.1f}"
+            f"{prep_time * 1000:>9.1f}"
+            f"{vision_tokens(*size):>8}"
+            f"{vision_tokens(*prep_size):>8}"
+        )
+
+    print()
+    print("prep ms is CPU time spent in the process pool; the upload it saves is")
+    print("(raw b64 - prep b64) bytes per request over the network to the API.")
+    if limits == (2048, 768):
+        print("Tokens match because the API resizes to the same 2048/768 fit before")
+        print("billing; pass lower --max-*-side limits to trade detail for tokens.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""Replay synthetic image messages through the bot against local stand-ins
+
+Usage: python benchmarks/replay_bench.py [--messages N] [--mode on_message|direct] [--json]
+
+Starts one local aiohttp server that plays three roles: the attachment CDN,
+the OpenAI chat-completions endpoint (with configurable latency and a share
+of 429 responses) and Discord's REST API for reactions, which enforces a
+per-channel rate limit with Discord's X-RateLimit headers and 429 answers.
+A real ImageReactionBot (no gateway login) is pointed at it through
+OPENAI_BASE_URL, its reactions go through a discord.py HTTPClient whose
+API base is the stand-in, so the client's bucket handling is exercised,
+and it is fed synthetic messages, either through on_message and
+the ingest workers or by calling process_image_attachment directly. The
+report lists images/sec, per-stage p50/p99 from the bot's metrics registry
+and peak RSS, so runs before and after a change can be compared; the
+corpus, message mix and mock responses are seeded and reproducible.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+from aiohttp import web
+from PIL import Image, ImageDraw
+
+# Typical attachments: (name, size, format, frames)
+CORPUS_SHAPES = [
+    ("photo", (2016, 1512), "JPEG", 1),
+    ("screenshot", (1170, 2532), "PNG", 1),
+    ("meme", (1080, 1080), "JPEG", 1),
+    ("thumbnail", (640, 480), "JPEG", 1),
+    ("reaction", (320, 240), "GIF", 8),
+]
+
+DESCRIPTIONS = [
+    "A happy dog playing fetch in a sunny park with friends, bright green grass and a blue sky.",
+    "A delicious pizza with melted cheese on a wooden table, the mood is cozy and warm.",
+    "A screenshot of a video game showing a boss fight with fire effects and a score counter.",
+    "A cute cat sleeping on a laptop keyboard in a dark room, funny and relaxing.",
+    "A beautiful sunset over the ocean with orange and pink clouds and a small boat.",
+    "A crowded concert with music, lights and people dancing, exciting party atmosphere.",
+]
+
+STRUCTURED_ANSWERS = [
+    {"tags": ["dog", "park", "sunny"], "sentiment": "positive", "emojis": ["🐶", "☀️", "😊"]},
+    {"tags": ["pizza", "food"], "sentiment": "positive", "emojis": ["🍕", "😋"]},
+    {"tags": ["game", "screenshot", "fire"], "sentiment": "neutral", "emojis": ["🎮", "🔥"]},
+    {"tags": ["cat", "sleeping", "funny"], "sentiment": "positive", "emojis": ["🐱", "😂"]},
+]
+
+def make_image(shape, seed):
+    """Build a seeded image with shapes and noise so it compresses like a real one"""
+    name, size, image_format, frames = shape
+    rng = random.Random(seed)
+    images = []
+    for frame in range(frames):
+        img = Image.effect_noise((size[0] // 8, size[1] // 8), 48).convert("RGB").resize(size)
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            r = rng.randrange(10, max(11, min(size) // 5))
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+        images.append(img)
+    output = io.BytesIO()
+    if frames > 1:
+        images[0].save(output, format=image_format, save_all=True, append_images=images[1:], duration=80, loop=0)
+    else:
+        images[0].save(output, format=image_format, quality=90)
+    return f"{name}-{seed}.{image_format.lower().replace('jpeg', 'jpg')}", output.getvalue()
+
+def load_corpus(args):
+    if args.corpus:
+        corpus = {}
+        for filename in sorted(os.listdir(args.corpus)):
+            with open(os.path.join(args.corpus, filename), "rb") as f:
+                corpus[filename] = f.read()
+        return corpus
+    return dict(make_image(CORPUS_SHAPES[seed % len(CORPUS_SHAPES)], seed) for seed in range(args.corpus_size))
+
+class MockServer:
+    """CDN, chat-completions and reaction endpoints on one local port"""
+
+    def __init__(self, corpus, args):
+        self.corpus = corpus
+        self.latency = args.openai_latency_ms / 1000
+        self.latency_sigma = args.latency_sigma
+        self.fast_factor = args.fast_latency_factor
+        self.rate_429 = args.rate_429
+        self.reaction_latency = args.reaction_latency_ms / 1000
+        self.reaction_limit = args.reaction_limit
+        self.reaction_window = args.reaction_window_ms / 1000
+        # channel -> (window start, reactions in the window)
+        self.reaction_windows = {}
+        self.rng = random.Random(args.seed)
+        self.counters = {"cdn": 0, "completions": 0, "throttled": 0, "reactions": 0, "reactions_throttled": 0}
+        self._runner = None
+        self.port = None
+
+    async def cdn(self, request):
+        self.counters["cdn"] += 1
+        return web.Response(body=self.corpus[request.match_info["name"]])
+
+    async def completions(self, request):
+        body = await request.json()
+        latency = self.rng.lognormvariate(0, self.latency_sigma) * self.latency
+        # Smaller models and low-detail images answer faster
+        details = [part["image_url"].get("detail") for part in body["messages"][-1]["content"]
+                   if isinstance(part, dict) and part.get("type") == "image_url"]
+        if body.get("model") != "gpt-4o" or details and all(detail == "low" for detail in details):
+            latency *= self.fast_factor
+        await asyncio.sleep(latency)
+        if self.rng.random() < self.rate_429:
+            self.counters["throttled"] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status=429,
+                headers={"retry-after": "0.2", "x-ratelimit-remaining-requests": "0"}
+            )
+
+        self.counters["completions"] += 1
+        response_format = body.get("response_format") or {}
+        schema_name = response_format.get("json_schema", {}).get("name")
+        if schema_name == "image_reactions_batch":
+            images = sum(1 for part in body["messages"][-1]["content"] if part.get("type") == "image_url")
+            content = json.dumps({"results": [
+                {"image": number, **self.rng.choice(STRUCTURED_ANSWERS)} for number in range(1, images + 1)
+            ]})
+        elif schema_name:
+            content = json.dumps(self.rng.choice(STRUCTURED_ANSWERS))
+        else:
+            content = self.rng.choice(DESCRIPTIONS)
+
+        return web.json_response({
+            "id": f"chatcmpl-{self.counters['completions']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 850, "completion_tokens": 40, "total_tokens": 890},
+        })
+
+    async def current_user(self, request):
+        return web.json_response({"id": "1", "username": "benchmark", "discriminator": "0", "avatar": None, "bot": True})
+
+    async def reaction(self, request):
+        await asyncio.sleep(self.reaction_latency)
+        # Fixed window per channel, reported the way Discord does
+        channel = request.match_info["channel"]
+        now = time.monotonic()
+        window_start, used = self.reaction_windows.get(channel, (now, 0))
+        if now - window_start >= self.reaction_window:
+            window_start, used = now, 0
+        reset_after = self.reaction_window - (now - window_start)
+        headers = {
+            "X-RateLimit-Bucket": "reactions",
+            "X-RateLimit-Limit": str(self.reaction_limit),
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+        }
+        if used >= self.reaction_limit:
+            self.counters["reactions_throttled"] += 1
+            headers.update({"X-RateLimit-Remaining": "0", "X-RateLimit-Scope": "user", "Retry-After": f"{reset_after:.3f}"})
+            return web.json_response(
+                {"message": "You are being rate limited.", "retry_after": reset_after, "global": False},
+                status=429,
+                headers=headers
+            )
+
+        self.reaction_windows[channel] = (window_start, used + 1)
+        self.counters["reactions"] += 1
+        headers["X-RateLimit-Remaining"] = str(self.reaction_limit - used - 1)
+        return web.Response(status=204, headers=headers)
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 2 ** 20)
+        app.router.add_get("/cdn/{name}", self.cdn)
+        app.router.add_post("/v1/chat/completions", self.completions)
+        app.router.add_get("/api/v10/users/@me", self.current_user)
+        app.router.add_put("/api/v10/channels/{channel}/messages/{message}/reactions/{emoji}/@me", self.reaction)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+class FakeUser:
+    # Marked as a bot so process_commands returns before needing gateway state
+    bot = True
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+
+class FakeAttachment:
+    def __init__(self, attachment_id, filename, url, size):
+        self.id = attachment_id
+        self.filename = filename
+        self.url = url
+        self.size = size
+
+class FakeMessage:
+    """Just enough of discord.Message; reactions use discord.py's HTTP client like Message.add_reaction"""
+
+    def __init__(self, message_id, channel, attachments, http: discord.http.HTTPClient):
+        self.id = message_id
+        self.channel = channel
+        self.guild = None
+        self.author = FakeUser()
+        self.attachments = attachments
+        self.reactions = []
+        self.content = ""
+        self._http = http
+
+    async def add_reaction(self, emoji):
+        await self._http.add_reaction(self.channel.id, self.id, emoji)
+
+def build_messages(corpus, args, http, base_url):
+    rng = random.Random(args.seed)
+    names = sorted(corpus)
+    channels = [FakeChannel(1000 + index) for index in range(args.channels)]
+    messages = []
+    attachment_id = 0
+    for index in range(args.messages):
+        attachments = []
+        for _ in range(rng.choice((1, 1, 1, 2, 4))):
+            name = rng.choice(names)
+            attachment_id += 1
+            attachments.append(FakeAttachment(attachment_id, name, f"{base_url}/cdn/{name}", len(corpus[name])))
+        messages.append(FakeMessage(10 ** 17 + index, channels[index % len(channels)], attachments, http))
+    return messages, channels
+
+async def run(args):
+    corpus = load_corpus(args)
+    server = MockServer(corpus, args)
+    await server.start()
+    base_url = f"http://127.0.0.1:{server.port}"
+
+    os.environ.update({
+        "DISCORD_TOKEN": "benchmark",
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "JOURNAL_PATH": "",
+        "CACHE_DB_PATH": "",
+        "METRICS_PORT": "0",
+        "BACKFILL_ON_START": "false",
+        "SYNC_COMMANDS": "false",
+        "ANALYSIS_MODE": args.analysis_mode,
+        "OPENAI_RPM_LIMIT": str(args.rpm_limit),
+        "OPENAI_TPM_LIMIT": str(args.tpm_limit),
+    })
+    # Discord's REST calls go to the stand-in, paced by discord.py's own rate limit handling
+    discord.http.Route.BASE = f"{base_url}/api/v10"
+    http = discord.http.HTTPClient(asyncio.get_running_loop())
+    await http.static_login("benchmark")
+    messages, channels = build_messages(corpus, args, http, base_url)
+    os.environ["TARGET_CHANNEL_ID"] = ",".join(str(channel.id) for channel in channels)
+
+    # Imported late so the bot's Config sees the environment above
+    from bot import ImageReactionBot
+    from metrics import metrics
+
+    class ReplayBot(ImageReactionBot):
+        """Counts finished messages so the run knows when the replay is done"""
+
+        def __init__(self, total):
+            super().__init__()
+            self.remaining = total
+            self.finished = asyncio.Event()
+
+        async def process_message_images(self, message, attachments, policy, *args):
+            try:
+                await super().process_message_images(message, attachments, policy, *args)
+            finally:
+                self.remaining -= 1
+                if self.remaining <= 0:
+                    self.finished.set()
+
+    bot = ReplayBot(len(messages))
+    await bot.setup_hook()
+    images = sum(len(message.attachments) for message in messages)
+
+    started = time.perf_counter()
+    if args.mode == "on_message":
+        for message in messages:
+            await bot.on_message(message)
+        await bot.finished.wait()
+    else:
+        await asyncio.gather(*(
+            bot.process_image_attachment(message, attachment)
+            for message in messages for attachment in message.attachments
+        ))
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "mode": args.mode,
+        "analysis_mode": args.analysis_mode,
+        "messages": len(messages),
+        "images": images,
+        "seconds": elapsed,
+        "images_per_sec": images / elapsed,
+        "stages": {
+            stage: {"count": summary["count"], "p50_ms": summary["p50"] * 1000, "p99_ms": summary["p99"] * 1000}
+            for stage, summary in metrics.summary().items()
+        },
+        "tokens": {model: {"requests": totals[0], "prompt": totals[1], "completion": totals[2],
+                           "cost_usd": metrics.cost(model)}
+                   for model, totals in metrics.tokens.items()},
+        "models": {
+            model: {"p50_ms": histogram.quantile(0.5) * 1000, "p90_ms": histogram.quantile(0.9) * 1000}
+            for model, histogram in metrics.models.items()
+        },
+        "hedging": bot.image_analyzer.hedge_stats(),
+        "server": server.counters,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+    # Never logged in, so only the pipeline needs closing
+    await bot.close_pipeline()
+    await http.close()
+    await server.stop()
+    return report
+
+def print_report(report):
+    print(f"{report['images']} images in {report['messages']} messages ({report['mode']}, {report['analysis_mode']} mode)")
+    print(f"{report['seconds']:.2f}s, {report['images_per_sec']:.1f} images/sec, peak RSS {report['peak_rss_mb']:.0f}MB")
+    print()
+    print(f"{'stage':<12}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<12}{stats['count']:>8}{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+    print()
+    counters = report["server"]
+    print(f"mock server: {counters['completions']} completions, {counters['throttled']} throttled (429), "
+          f"{counters['reactions']} reactions ({counters['reactions_throttled']} throttled), {counters['cdn']} downloads")
+    for model, tokens in report["tokens"].items():
+        print(f"tokens ({model}): {tokens['requests']} requests, {tokens['prompt']} prompt + {tokens['completion']} completion, "
+              f"${tokens['cost_usd']:.4f}")
+    for model, latency in report["models"].items():
+        print(f"latency ({model}): p50 {latency['p50_ms']:.0f} ms, p90 {latency['p90_ms']:.0f} ms")
+    hedging = report["hedging"]
+    if hedging["hedged"]:
+        print(f"hedged {hedging['hedged']} requests, hedge won {hedging['hedge_wins']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200, help="synthetic messages to replay")
+    parser.add_argument("--channels", type=int, default=4, help="channels the messages are spread over")
+    parser.add_argument("--mode", choices=("on_message", "direct"), default="on_message",
+                        help="feed on_message and the ingest workers, or call process_image_attachment")
+    parser.add_argument("--analysis-mode", choices=("text", "structured"), default="text")
+    parser.add_argument("--corpus", help="directory of images to use instead of the synthetic corpus")
+    parser.add_argument("--corpus-size", type=int, default=40, help="synthetic images to generate")
+    parser.add_argument("--openai-latency-ms", type=float, default=800, help="median chat-completion latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="spread (lognormal sigma) of completion latency")
+    parser.add_argument("--fast-latency-factor", type=float, default=0.4,
+                        help="latency of gpt-4o-mini and low-detail requests relative to gpt-4o high")
+    parser.add_argument("--rate-429", type=float, default=0.05, help="share of completions answered with 429")
+    parser.add_argument("--rpm-limit", type=int, default=100000, help="client-side OpenAI requests/min budget")
+    parser.add_argument("--tpm-limit", type=int, default=100000000, help="client-side OpenAI tokens/min budget")
+    parser.add_argument("--reaction-latency-ms", type=float, default=50, help="latency of each reaction request")
+    parser.add_argument("--reaction-limit", type=int, default=1, help="reactions allowed per channel per window")
+    parser.add_argument("--reaction-window-ms", type=float, default=250, help="length of a channel's reaction window")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    # Retry warnings from the 429s would drown the report
+    logging.basicConfig(level=logging.ERROR)
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
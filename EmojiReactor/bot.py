@@ -3,60 +3,184 @@ from discord.ext import commands
 import asyncio
 import logging
 import os
+import signal
 from dotenv import load_dotenv
 from config import Config
-from image_analyzer import ImageAnalyzer
+from image_analyzer import ImageAnalyzer, STRUCTURED_MODE
 from emoji_mapper import EmojiMapper
+from analysis_cache import AnalysisCache
+from perceptual_index import PerceptualIndex
+from ingest_queue import IngestJob, IngestQueue, DEGRADE
+from reaction_dispatcher import ReactionDispatcher
+from local_classifier import LocalClassifierTier
+from channel_router import ChannelPolicy, ChannelRouter
+from metrics import MetricsServer, metrics
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN
+from job_journal import JobJournal, RECEIVED, DOWNLOADED, ANALYZED, FAILED, REACTED, DROPPED
+from bot_commands import BotCommands
+from utils import (DownloadError, ImageDownloader, ImageUtils, PRIORITY_BACKFILL, PRIORITY_FRESH, parse_sample_rates,
+                   run_in_process, setup_logging, shutdown_process_pool)
 import aiohttp
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit
+from typing import List, Optional, Set
 
 # Load environment variables
 load_dotenv()
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('discord_bot.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-class ImageReactionBot(commands.Bot):
+# Discord allows at most 20 distinct reactions per message
+MAX_REACTIONS_PER_MESSAGE = 20
+
+# Circuit breaker state as a metrics gauge value
+CIRCUIT_STATE_GAUGES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+class EmbeddedImage:
+    """An image embedded in a message, with the attachment fields the pipeline reads"""
+
+    def __init__(self, url: str):
+        self.url = url
+        # Journal entries name images by attachment ID; embeds have none
+        self.id = url
+        self.filename = os.path.basename(urlsplit(url).path) or "image"
+        # Unknown until the download's Content-Length
+        self.size = None
+
+class ImageReactionBot(commands.AutoShardedBot):
     def __init__(self):
+        config = Config()
         intents = discord.Intents.default()
-        # Remove privileged intents to avoid permission issues
-        intents.message_content = False
+        # Message content is privileged: without it text commands only work
+        # when the bot is mentioned, slash commands always work
+        intents.message_content = config.MESSAGE_CONTENT_INTENT
         intents.guild_messages = True
         intents.guilds = True
         
         super().__init__(
-            command_prefix='!',
+            command_prefix=commands.when_mentioned_or('!'),
             intents=intents,
-            help_command=None
+            help_command=None,
+            shard_count=config.SHARD_COUNT,
+            shard_ids=config.SHARD_IDS
         )
         
-        self.config = Config()
+        self.config = config
+        self.router = ChannelRouter(
+            ChannelPolicy(
+                max_emojis=self.config.MAX_EMOJIS_PER_IMAGE,
+                analysis_mode=self.config.ANALYSIS_MODE
+            ),
+            channel_ids=self.config.TARGET_CHANNEL_IDS,
+            path=self.config.CHANNEL_ROUTES_PATH
+        )
         self.image_analyzer = ImageAnalyzer()
-        self.emoji_mapper = EmojiMapper()
+        self.emoji_mapper = EmojiMapper(diversity=self.config.EMOJI_DIVERSITY)
+        self.analysis_cache = AnalysisCache(
+            max_entries=self.config.CACHE_MAX_ENTRIES,
+            ttl=self.config.CACHE_TTL,
+            db_path=self.config.CACHE_DB_PATH,
+            max_disk_entries=self.config.CACHE_MAX_DISK_ENTRIES
+        )
+        self.perceptual_index = PerceptualIndex(
+            max_distance=self.config.PHASH_MAX_DISTANCE,
+            max_entries=self.config.PHASH_MAX_ENTRIES
+        ) if self.config.PHASH_ENABLED else None
+        self.local_tier = LocalClassifierTier(
+            self.config.LOCAL_CLASSIFIER,
+            threshold=self.config.LOCAL_CLASSIFIER_THRESHOLD
+        ) if self.config.LOCAL_CLASSIFIER else None
         self.session: aiohttp.ClientSession | None = None
+        self.downloader: ImageDownloader | None = None
+        # Bounds images in flight across all messages and channels
+        self.image_semaphore = asyncio.Semaphore(self.config.MAX_CONCURRENT_IMAGES)
+        self.ingest_queue = IngestQueue(
+            max_depth=self.config.INGEST_MAX_DEPTH,
+            policy=self.config.INGEST_FULL_POLICY
+        )
+        self.ingest_workers: List[asyncio.Task] = []
+        # Keyword-only reactions to messages shed by a full DEGRADE queue
+        self.degraded_tasks: Set[asyncio.Task] = set()
+        self.reaction_dispatcher = ReactionDispatcher()
+        self.journal = JobJournal(
+            self.config.JOURNAL_PATH,
+            flush_interval=self.config.JOURNAL_FLUSH_MS / 1000
+        ) if self.config.JOURNAL_PATH else None
+        self.journal_replayed = False
+        self.metrics_server = MetricsServer(
+            metrics,
+            host=self.config.METRICS_HOST,
+            port=self.config.METRICS_PORT
+        ) if self.config.METRICS_PORT else None
+        metrics.register_gauges(self.metric_gauges)
+        self.backfill_task: Optional[asyncio.Task] = None
+        # Images analyzed from local signals while the vision API circuit was open
+        self.degraded_images = 0
 
     async def setup_hook(self):
         """Setup hook called when bot is starting up"""
         self.session = aiohttp.ClientSession()
+        self.downloader = ImageDownloader(
+            self.session,
+            max_size=self.config.MAX_IMAGE_SIZE,
+            timeout=self.config.ANALYSIS_TIMEOUT
+        )
+        self.ingest_workers = [
+            asyncio.create_task(self.ingest_worker(), name=f"ingest-worker-{i}")
+            for i in range(self.config.INGEST_WORKERS)
+        ]
+        if self.metrics_server is not None:
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.error(f"Could not serve metrics on port {self.config.METRICS_PORT}: {e}")
+        # Reload channel routes on SIGHUP where the platform supports it
+        if self.config.CHANNEL_ROUTES_PATH and hasattr(signal, "SIGHUP"):
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self.router.reload)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await self.add_cog(BotCommands(self))
+        if self.config.SYNC_COMMANDS:
+            try:
+                await self.tree.sync()
+            except discord.DiscordException as e:
+                logger.error(f"Could not register slash commands: {e}")
         logger.info("Bot setup completed")
 
     async def close(self):
         """Cleanup when bot is shutting down"""
+        await self.close_pipeline()
+        await super().close()
+
+    async def close_pipeline(self):
+        """Stop the workers and release the pipeline's sessions, pools and files"""
+        for worker in self.ingest_workers:
+            worker.cancel()
+        if self.backfill_task is not None:
+            self.backfill_task.cancel()
+        for task in self.degraded_tasks:
+            task.cancel()
+        self.reaction_dispatcher.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
         if self.session:
             await self.session.close()
-        await super().close()
+        await self.image_analyzer.close()
+        self.analysis_cache.close()
+        if self.journal is not None:
+            self.journal.close()
+        shutdown_process_pool()
 
     async def on_ready(self):
         """Called when bot is ready and connected to Discord"""
         logger.info(f'{self.user} has connected to Discord!')
-        logger.info(f'Bot is monitoring channel: {self.config.TARGET_CHANNEL_ID}')
+        routes = self.router.stats()
+        logger.info(f"Bot is monitoring {routes['channels']} channel(s) and {routes['guilds']} guild(s)")
+        logger.info(f"Running shard(s) {sorted(self.shard_ids or [])} of {self.shard_count}")
         
         # Set bot status
         activity = discord.Activity(
@@ -64,126 +188,502 @@ class ImageReactionBot(commands.Bot):
             name="for images to analyze 👁️"
         )
         await self.change_presence(activity=activity)
+        
+        # on_ready fires again after reconnects, replay only once
+        replayed = set()
+        if self.journal is not None and not self.journal_replayed:
+            self.journal_replayed = True
+            replayed = await self.replay_journal()
+        
+        # Catch up on images posted while the bot was offline or disconnected
+        if self.config.BACKFILL_ON_START:
+            self.start_backfill(skip_ids=replayed)
+
+    async def replay_journal(self) -> Set[int]:
+        """
+        Re-queue messages whose processing was interrupted by a restart
+        
+        Returns:
+            IDs of the messages queued again
+        """
+        max_age = self.config.JOURNAL_REPLAY_MAX_AGE
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.journal.compact, max_age)
+        jobs = await loop.run_in_executor(None, self.journal.unfinished, max_age)
+        replayed = set()
+        if not jobs:
+            return replayed
+        
+        # The journal is shared by every shard process, replay only our guilds
+        jobs = [job for job in jobs if self.owns_guild(job["guild_id"])]
+        if not jobs:
+            return replayed
+        
+        logger.info(f"Replaying {len(jobs)} unfinished job(s) from the journal")
+        for job in jobs:
+            try:
+                channel = self.get_channel(job["channel_id"]) or await self.fetch_channel(job["channel_id"])
+                message = await channel.fetch_message(job["message_id"])
+            except (discord.NotFound, discord.Forbidden) as e:
+                logger.warning(f"Cannot replay message {job['message_id']}: {e}")
+                continue
+            except discord.HTTPException as e:
+                # Leave it unfinished so the next start tries again
+                logger.error(f"Error fetching message {job['message_id']} for replay: {e}")
+                continue
+            
+            # Reactions from before the crash mean the job got that far
+            if any(reaction.me for reaction in message.reactions):
+                self.journal.record(message, REACTED)
+                continue
+            
+            policy = self.router.route_message(message)
+            image_attachments = self.get_image_attachments(message)
+            if policy is not None and image_attachments:
+                self.enqueue_images(message, image_attachments, policy, PRIORITY_BACKFILL)
+                replayed.add(message.id)
+            else:
+                self.journal.record(message, DROPPED)
+        return replayed
+
+    def metric_gauges(self) -> dict:
+        """Current queue depths and cache counters for the metrics endpoint"""
+        cache_stats = self.analysis_cache.stats()
+        gauges = {
+            "ingest_queue_depth": len(self.ingest_queue),
+            "reactions_queued": self.reaction_dispatcher.stats()["queued"],
+            "analysis_cache_hit_rate": cache_stats["hit_rate"],
+        }
+        if self.journal is not None:
+            gauges["journal_pending_events"] = self.journal.stats()["pending"]
+        limiter_stats = self.image_analyzer.rate_limiter.stats()
+        gauges["openai_circuit_state"] = CIRCUIT_STATE_GAUGES[self.image_analyzer.circuit_breaker.state]
+        gauges["degraded_images"] = self.degraded_images
+        hedge_stats = self.image_analyzer.hedge_stats()
+        gauges["openai_hedged_requests"] = hedge_stats["hedged"]
+        gauges["openai_hedge_wins"] = hedge_stats["hedge_wins"]
+        gauges["openai_requests_waiting"] = limiter_stats["waiting"]
+        gauges["openai_requests_per_minute_limit"] = limiter_stats["requests_per_minute"]
+        gauges["openai_tokens_per_minute_limit"] = limiter_stats["tokens_per_minute"]
+        return gauges
+
+    def owns_guild(self, guild_id: Optional[int]) -> bool:
+        """Return True if the guild is served by one of this process's shards"""
+        if not self.shard_count:
+            return True
+        # Discord's sharding formula; DMs always arrive on shard 0
+        shard_id = (guild_id >> 22) % self.shard_count if guild_id else 0
+        return self.shard_ids is None or shard_id in self.shard_ids
+
+    def start_backfill(self, skip_ids: Set[int] = frozenset()) -> bool:
+        """
+        Start scanning the history of the routed channels in the background
+        
+        Returns:
+            False if a scan is already running
+        """
+        if self.backfill_task is not None and not self.backfill_task.done():
+            return False
+        self.backfill_task = asyncio.create_task(self.backfill_channels(skip_ids), name="backfill")
+        return True
+
+    async def backfill_channels(self, skip_ids: Set[int] = frozenset()) -> int:
+        """Backfill each routed channel of this process's shards, returning the messages queued"""
+        queued = 0
+        for channel_id in self.router.channel_ids:
+            # Only channels of guilds on our shards are in the channel cache
+            if self.get_channel(channel_id) is None:
+                continue
+            queued += await self.backfill_channel(channel_id, skip_ids)
+        return queued
+
+    async def backfill_channel(self, channel_id: int, skip_ids: Set[int] = frozenset()) -> int:
+        """
+        Queue images posted to a channel that never got reactions
+        
+        Pages through the history after the newest message reacted to (or
+        BACKFILL_MAX_AGE ago, whichever is later), oldest first. A separate
+        task fetches history pages while this one feeds messages to the
+        ingest queue at BACKFILL_RATE, so pagination overlaps analysis. The
+        queue is fed with a blocking put: backfill waits for free slots
+        instead of evicting live messages.
+        
+        Returns:
+            Number of messages queued
+        """
+        try:
+            channel = self.get_channel(channel_id) or await self.fetch_channel(channel_id)
+        except discord.HTTPException as e:
+            logger.error(f"Cannot backfill channel {channel_id}: {e}")
+            return 0
+        
+        after = discord.utils.time_snowflake(
+            discord.utils.utcnow() - timedelta(seconds=self.config.BACKFILL_MAX_AGE)
+        )
+        if self.journal is not None:
+            last_reacted = await asyncio.get_running_loop().run_in_executor(
+                None, self.journal.last_reacted, channel_id
+            )
+            if last_reacted:
+                after = max(after, last_reacted)
+        
+        # Holds about one history page, so the next page loads while this one is fed
+        pending: asyncio.Queue = asyncio.Queue(maxsize=100)
+        
+        async def paginate():
+            cancelled = False
+            try:
+                async for message in channel.history(limit=None, after=discord.Object(id=after), oldest_first=True):
+                    await pending.put(message)
+            except discord.HTTPException as e:
+                logger.error(f"Error reading history of channel {channel_id}: {e}")
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            finally:
+                # Once the reader has stopped and cancelled us nobody takes the
+                # end marker, and putting it into a full queue would never return
+                if not cancelled:
+                    await pending.put(None)
+        
+        pager = asyncio.create_task(paginate())
+        interval = 1 / self.config.BACKFILL_RATE if self.config.BACKFILL_RATE > 0 else 0
+        scanned = queued = 0
+        try:
+            while (message := await pending.get()) is not None:
+                scanned += 1
+                if message.author == self.user or message.id in skip_ids:
+                    continue
+                if any(reaction.me for reaction in message.reactions):
+                    continue
+                # Routes may have been reloaded since the scan started
+                policy = self.router.route_message(message)
+                image_attachments = self.get_image_attachments(message)
+                if policy is None or not image_attachments:
+                    continue
+                
+                self.record_job(message, RECEIVED, attachments=[attachment.id for attachment in image_attachments])
+                await self.ingest_queue.put(IngestJob(message, image_attachments, policy, PRIORITY_BACKFILL))
+                queued += 1
+                if interval:
+                    await asyncio.sleep(interval)
+        finally:
+            pager.cancel()
+        
+        logger.info(f"Backfill of channel {channel_id} queued {queued} of {scanned} messages")
+        return queued
 
     async def on_message(self, message):
         """Handle incoming messages"""
+        # Reject messages from unrouted or disabled channels before anything else
+        policy = self.router.route_message(message)
+        if policy is None:
+            return
+        
         # Log all messages for debugging
-        logger.info(f"Received message in channel {message.channel.id} from {message.author}")
+        logger.debug(f"Received message in channel {message.channel.id} from {message.author}")
         
         # Ignore messages from the bot itself
         if message.author == self.user:
-            logger.info("Ignoring message from bot itself")
             return
 
-        # Check if message is in the target channel
-        if str(message.channel.id) != self.config.TARGET_CHANNEL_ID:
-            logger.info(f"Message not in target channel. Expected: {self.config.TARGET_CHANNEL_ID}, Got: {message.channel.id}")
-            return
-        
-        logger.info("Message is in target channel, checking for attachments")
-
         # Check if message contains attachments (images)
-        image_attachments = [
-            attachment for attachment in message.attachments
-            if any(attachment.filename.lower().endswith(ext) 
-                  for ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp'])
-        ]
+        image_attachments = self.get_image_attachments(message)
 
         if not image_attachments:
-            # Also check if message content contains image URLs (for compatibility without message_content intent)
-            if hasattr(message, 'content') and message.content:
-                # Only process if we can access content, otherwise skip
-                pass
+            # Text commands arrive as messages without images
+            await self.process_commands(message)
             return
 
         logger.info(f"Found {len(image_attachments)} image(s) in message from {message.author}")
 
-        # Process each image
-        for attachment in image_attachments:
-            await self.process_image_attachment(message, attachment)
+        # Hand the images to the ingest workers
+        self.enqueue_images(message, image_attachments, policy)
 
         # Process commands
         await self.process_commands(message)
 
+    async def on_message_edit(self, before, after):
+        """Handle link previews that Discord adds after the message was posted"""
+        # Messages that had images when posted were handled by on_message
+        if after.author == self.user or self.get_image_attachments(before):
+            return
+        policy = self.router.route_message(after)
+        image_attachments = self.get_image_attachments(after)
+        if policy is None or not image_attachments:
+            return
+        
+        logger.info(f"Found {len(image_attachments)} embedded image(s) in edited message from {after.author}")
+        self.enqueue_images(after, image_attachments, policy)
+
+    def get_image_attachments(self, message):
+        """
+        Return the images of a message: image attachments, then image embeds
+        
+        An image posted both as an attachment and as an embed, or linked
+        twice, is returned once, and at most MAX_IMAGES_PER_MESSAGE are.
+        """
+        images = [
+            attachment for attachment in message.attachments
+            if attachment.filename.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+        for embed in getattr(message, "embeds", []):
+            # Linked images unfurl as "image" embeds; rich embeds may carry one too
+            if embed.image and embed.image.url:
+                images.append(EmbeddedImage(embed.image.url))
+            elif embed.type == "image" and embed.thumbnail and embed.thumbnail.url:
+                images.append(EmbeddedImage(embed.thumbnail.url))
+        
+        # CDN links differ only in their signed query string
+        unique = {}
+        for image in images:
+            unique.setdefault(image.url.split("?", 1)[0], image)
+        return list(unique.values())[:self.config.MAX_IMAGES_PER_MESSAGE]
+
+    def record_job(self, message, state: str, **detail):
+        """Append a job state transition to the journal, if enabled"""
+        if self.journal is not None:
+            self.journal.record(message, state, detail)
+
+    def enqueue_images(self, message, attachments, policy: ChannelPolicy, priority: int = PRIORITY_FRESH):
+        """Queue a message's images, applying the full-queue policy"""
+        self.record_job(message, RECEIVED, attachments=[attachment.id for attachment in attachments])
+        job = IngestJob(message, attachments, policy, priority)
+        rejected = self.ingest_queue.put_nowait(job)
+        if rejected is None:
+            return
+        
+        if self.ingest_queue.policy == DEGRADE:
+            logger.warning(f"Ingest queue full, reacting to message {rejected.message.id} from filenames only")
+            task = asyncio.create_task(self.react_keyword_only(rejected.message, rejected.attachments, rejected.policy))
+            # Keep a reference so the task isn't garbage collected mid-flight
+            self.degraded_tasks.add(task)
+            task.add_done_callback(self._degraded_task_done)
+        else:
+            logger.warning(f"Ingest queue full, dropped message {rejected.message.id} in channel {rejected.channel_id}")
+            self.record_job(rejected.message, DROPPED)
+
+    def _degraded_task_done(self, task: asyncio.Task):
+        self.degraded_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Keyword-only reaction failed: {task.exception()}")
+
+    async def ingest_worker(self):
+        """Process queued messages one at a time"""
+        while True:
+            job = await self.ingest_queue.get()
+            try:
+                await self.process_message_images(job.message, job.attachments, job.policy, job.priority)
+            except Exception as e:
+                logger.error(f"Ingest worker failed on message {job.message.id}: {e}")
+
+    @staticmethod
+    def filename_keywords(filename: str) -> str:
+        """Turn an attachment filename such as "my_cat-photo.jpg" into words"""
+        return os.path.splitext(filename)[0].replace("_", " ").replace("-", " ")
+
+    async def react_keyword_only(self, message, attachments, policy: ChannelPolicy):
+        """React using attachment filename keywords, without downloading or calling the API"""
+        text = " ".join(self.filename_keywords(attachment.filename) for attachment in attachments)
+        emojis = self.emoji_mapper.get_emojis_for_content(text, policy.max_emojis, seed=message.id)
+        await self.add_reactions(message, emojis)
+
     async def process_image_attachment(self, message, attachment):
         """Process a single image attachment"""
+        policy = self.router.route_message(message) or self.router.default_policy
+        await self.process_message_images(message, [attachment], policy)
+
+    async def process_message_images(self, message, attachments, policy: ChannelPolicy,
+                                     priority: int = PRIORITY_FRESH):
+        """
+        Process all image attachments of a message concurrently
+        
+        Attachments are analyzed in parallel, bounded by the bot-wide image
+        semaphore, then their emojis are merged in attachment order without
+        duplicates so an album reacts once, in about the time of one image.
+        """
         try:
-            logger.info(f"Processing image: {attachment.filename}")
-            
-            # Download image
-            if self.session is None:
-                logger.error("HTTP session not initialized")
-                return
-            async with self.session.get(attachment.url) as response:
-                if response.status != 200:
-                    logger.error(f"Failed to download image: {response.status}")
-                    return
-                
-                image_data = await response.read()
-            
-            # Analyze image with OpenAI Vision
-            analysis_result = await self.image_analyzer.analyze_image(image_data)
-            
-            if not analysis_result:
-                logger.warning("No analysis result received")
-                return
-            
-            logger.info(f"Analysis result: {analysis_result[:100]}...")
-            
-            # Get appropriate emojis based on analysis
-            emojis = self.emoji_mapper.get_emojis_for_content(analysis_result)
-            
-            if not emojis:
-                logger.info("No suitable emojis found for this image")
-                return
-            
-            # Add reactions to the message
-            for emoji in emojis:
-                try:
-                    await message.add_reaction(emoji)
-                    logger.info(f"Added reaction: {emoji}")
-                    # Small delay to avoid rate limits
-                    await asyncio.sleep(0.5)
-                except discord.HTTPException as e:
-                    logger.error(f"Failed to add reaction {emoji}: {e}")
-                except Exception as e:
-                    logger.error(f"Unexpected error adding reaction {emoji}: {e}")
-            
-        except Exception as e:
-            logger.error(f"Error processing image {attachment.filename}: {e}")
-            # Optionally add a generic reaction to indicate processing failed
+            results = await asyncio.gather(*(
+                self.get_emojis_for_attachment(message, attachment, policy, priority) for attachment in attachments
+            ))
+        except DownloadError as e:
+            # A network error or timeout rather than a bad file: journal the
+            # job as FAILED so the next start retries it instead of reacting
+            logger.warning(f"Leaving message {message.id} for replay: {e}")
+            self.record_job(message, FAILED, reason="download")
+            return
+        
+        emojis = []
+        for attachment_emojis in results:
+            # None marks a failed attachment
+            emojis.extend(attachment_emojis if attachment_emojis is not None else ["❌"])
+        emojis = list(dict.fromkeys(emojis))[:MAX_REACTIONS_PER_MESSAGE]
+        
+        if not emojis:
+            logger.info("No suitable emojis found for this message")
+            self.record_job(message, REACTED, emojis=[])
+            return
+        
+        await self.add_reactions(message, emojis)
+
+    async def get_emojis_for_attachment(self, message, attachment, policy: ChannelPolicy,
+                                        priority: int = PRIORITY_FRESH) -> Optional[List[str]]:
+        """
+        Download and analyze one attachment
+        
+        Returns:
+            List of emojis (possibly empty), or None if processing failed
+        """
+        async with self.image_semaphore:
             try:
-                await message.add_reaction("❌")
-            except:
-                pass
+                logger.debug(f"Processing image: {attachment.filename}")
+                started = time.perf_counter()
+                
+                # Download image
+                if self.downloader is None:
+                    logger.error("HTTP session not initialized")
+                    return None
+                with metrics.timer("download"):
+                    image_data = await self.downloader.download(attachment.url, attachment.size)
+                if image_data is None:
+                    # Oversized, not an image or gone: nothing to react to
+                    return []
+                self.record_job(message, DOWNLOADED, attachment=attachment.id)
+                
+                # Analyze image, reusing earlier results where possible
+                mode = policy.analysis_mode
+                analysis_result = await self.get_analysis(attachment.filename, image_data, mode, priority)
+                
+                if not analysis_result:
+                    logger.warning("No analysis result received")
+                    return []
+                self.record_job(message, ANALYZED, attachment=attachment.id)
+                
+                logger.debug(f"Analysis result: {str(analysis_result)[:100]}...")
+                
+                # Get appropriate emojis based on analysis
+                with metrics.timer("mapping"):
+                    if mode == STRUCTURED_MODE:
+                        emojis = self.emoji_mapper.get_emojis_for_structured(
+                            analysis_result,
+                            policy.max_emojis
+                        )
+                    else:
+                        emojis = self.emoji_mapper.get_emojis_for_content(
+                            analysis_result,
+                            policy.max_emojis,
+                            seed=message.id
+                        )
+                metrics.observe("image", time.perf_counter() - started)
+                return emojis
+                
+            except DownloadError:
+                # Not the file's fault: the whole message is retried on replay
+                raise
+            except Exception as e:
+                logger.error(f"Error processing image {attachment.filename}: {e}")
+                return None
 
-    @commands.command(name='status')
-    async def status_command(self, ctx):
-        """Check bot status"""
-        embed = discord.Embed(
-            title="Bot Status",
-            color=discord.Color.green(),
-            description="Image Recognition Bot is running!"
-        )
-        embed.add_field(
-            name="Monitoring Channel", 
-            value=f"<#{self.config.TARGET_CHANNEL_ID}>",
-            inline=False
-        )
-        embed.add_field(
-            name="Supported Formats", 
-            value="PNG, JPG, JPEG, GIF, WEBP",
-            inline=False
+    async def add_reactions(self, message, emojis: List[str]) -> List[str]:
+        """
+        Add reactions to a message in order and journal the outcome
+        
+        The job is REACTED if at least one reaction went through, otherwise
+        FAILED so that the next start retries it.
+        
+        Returns:
+            Emojis that were added
+        """
+        added = await self.reaction_dispatcher.add_reactions(message, emojis)
+        if added or not emojis:
+            self.record_job(message, REACTED, emojis=added)
+        else:
+            self.record_job(message, FAILED, emojis=emojis)
+        return added
+
+    async def get_analysis(self, filename: str, image_data: bytes, mode: str, priority: int = PRIORITY_FRESH):
+        """Return the analysis for an image, calling the vision API only for unseen images"""
+        # Reuse the analysis of identical images posted before, or wait for
+        # one that is being analyzed right now
+        cache_key = AnalysisCache.key_for(image_data, mode)
+        return await self.analysis_cache.get_or_compute(
+            cache_key,
+            lambda: self.compute_analysis(cache_key, filename, image_data, mode, priority)
         )
-        await ctx.send(embed=embed)
 
-    @commands.command(name='test')
-    async def test_command(self, ctx):
-        """Test command to verify bot is responding"""
-        await ctx.send("🤖 Bot is working! Send an image to see magic happen!")
+    async def compute_analysis(self, cache_key: str, filename: str, image_data: bytes, mode: str,
+                               priority: int = PRIORITY_FRESH):
+        """Analyze an image that missed the cache, storing cacheable results"""
+        # Reuse the analysis of re-encoded, resized or cropped copies. The index
+        # stores one analysis per mode for each hash.
+        image_hash = None
+        known = {}
+        if self.perceptual_index is not None:
+            image_hash = await run_in_process(ImageUtils.compute_dhash, image_data)
+            match = self.perceptual_index.find(image_hash) if image_hash is not None else None
+            if match:
+                analyses, distance = match
+                if mode in analyses:
+                    logger.debug(f"Near-duplicate match for {filename} (distance {distance})")
+                    await self.analysis_cache.set(cache_key, analyses[mode])
+                    return analyses[mode]
+                if distance == 0:
+                    known = analyses
+        
+        # Easy images are labelled locally, uncertain ones escalate to the API
+        if self.local_tier is not None:
+            tags = await self.local_tier.classify(image_data)
+            if tags:
+                if mode == STRUCTURED_MODE:
+                    analysis_result = {"tags": tags, "sentiment": "neutral", "emojis": []}
+                else:
+                    analysis_result = f"Image tags: {', '.join(tags)}"
+                await self.analysis_cache.set(cache_key, analysis_result)
+                return analysis_result
+        
+        # While the vision API is failing or slow, make do with local signals
+        if not self.image_analyzer.circuit_breaker.allow():
+            return await self.get_degraded_analysis(filename, image_data, mode)
+        
+        # Analyze image with OpenAI Vision
+        started = time.monotonic()
+        analysis_result = await self.image_analyzer.analyze(image_data, mode, priority)
+        if not analysis_result:
+            return None
+        
+        await self.analysis_cache.set(cache_key, analysis_result, time.monotonic() - started)
+        if image_hash is not None:
+            self.perceptual_index.add(image_hash, {**known, mode: analysis_result})
+        return analysis_result
+
+    async def get_degraded_analysis(self, filename: str, image_data: bytes, mode: str):
+        """
+        Build an analysis from the filename, dimensions and dominant colours
+        
+        Used while the circuit breaker is open. The result is not cached, so
+        the image gets a real analysis if it is posted again after recovery.
+        """
+        self.degraded_images += 1
+        tags = self.filename_keywords(filename).lower().split()
+        signals = await run_in_process(ImageUtils.extract_local_signals, image_data)
+        tags.extend(signals or [])
+        logger.debug(f"Degraded analysis for {filename}: {tags}")
+        if mode == STRUCTURED_MODE:
+            return {"tags": tags, "sentiment": "neutral", "emojis": []}
+        return f"Image tags: {', '.join(tags)}"
 
 async def main():
     """Main function to run the bot"""
+    config = Config()
+    log_listener = setup_logging(
+        config.LOG_LEVEL,
+        config.LOG_FILE,
+        json_format=config.LOG_FORMAT == "json",
+        max_bytes=config.LOG_MAX_BYTES,
+        backup_count=config.LOG_BACKUP_COUNT,
+        rate_limit=config.LOG_RATE_LIMIT,
+        sample_rates=parse_sample_rates(config.LOG_SAMPLE)
+    )
     bot = ImageReactionBot()
     
     try:
@@ -197,6 +697,7 @@ async def main():
         logger.error(f"Bot encountered an error: {e}")
     finally:
         await bot.close()
+        log_listener.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,211 @@
+import logging
+
+import discord
+from discord.ext import commands
+
+from metrics import metrics
+from utils import MessageUtils, PRIORITY_BACKFILL, PRIORITY_FRESH
+
+logger = logging.getLogger(__name__)
+
+class BotCommands(commands.Cog, name="Bot"):
+    """Status and maintenance commands of the image reaction bot
+
+    The commands are hybrid: they work as slash commands, which need no
+    privileged intent, and as text commands with the bot's prefix. Text
+    commands only see message content when the bot is mentioned, unless
+    MESSAGE_CONTENT_INTENT is enabled.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @commands.hybrid_command(name='status')
+    async def status_command(self, ctx):
+        """Check bot status"""
+        embed = discord.Embed(
+            title="Bot Status",
+            color=discord.Color.green(),
+            description="Image Recognition Bot is running!"
+        )
+        routes = self.bot.router.stats()
+        channel_ids = self.bot.router.channel_ids
+        monitored = ", ".join(f"<#{channel_id}>" for channel_id in channel_ids[:10])
+        if len(channel_ids) > 10:
+            monitored += f" and {len(channel_ids) - 10} more"
+        if routes['guilds']:
+            monitored += f" (+ {routes['guilds']} whole guild(s))"
+        embed.add_field(
+            name="Monitoring Channels", 
+            value=monitored or "Guild routes only",
+            inline=False
+        )
+        embed.add_field(
+            name="Shards",
+            value=f"{', '.join(str(shard_id) for shard_id in sorted(self.bot.shard_ids or []))} of {self.bot.shard_count}",
+            inline=False
+        )
+        embed.add_field(
+            name="Supported Formats", 
+            value="PNG, JPG, JPEG, GIF, WEBP",
+            inline=False
+        )
+        cache_stats = self.bot.analysis_cache.stats()
+        embed.add_field(
+            name="Analysis Cache",
+            value=(
+                f"{cache_stats['memory_hits'] + cache_stats['disk_hits']} hits / {cache_stats['misses']} misses "
+                f"({cache_stats['hit_rate']:.0%}), ~{cache_stats['saved_seconds']:.0f}s saved"
+            ),
+            inline=False
+        )
+        breaker_stats = self.bot.image_analyzer.circuit_breaker.stats()
+        embed.add_field(
+            name="Vision API",
+            value=(
+                f"Circuit {breaker_stats['state'].replace('_', '-')}, "
+                f"{breaker_stats['bad_rate']:.0%} of recent requests failed or slow, "
+                f"{breaker_stats['trips']} trips, {self.bot.degraded_images} images analyzed locally"
+            ),
+            inline=False
+        )
+        model_lines = []
+        for model, (requests, _, _) in sorted(metrics.tokens.items()):
+            latency = metrics.models.get(model)
+            line = f"{model}: {requests} requests, ${metrics.cost(model):.2f}"
+            if latency is not None:
+                line += f", p50 {latency.quantile(0.5):.1f}s / p90 {latency.quantile(0.9):.1f}s"
+            model_lines.append(line)
+        if self.bot.config.HEDGE_ENABLED:
+            hedge_stats = self.bot.image_analyzer.hedge_stats()
+            model_lines.append(
+                f"{hedge_stats['hedged']} hedged, {hedge_stats['hedge_wins']} won by "
+                f"{self.bot.config.HEDGE_MODEL} ({hedge_stats['win_rate']:.0%})"
+            )
+        if model_lines:
+            embed.add_field(name="Models", value="\n".join(model_lines), inline=False)
+        queue_stats = self.bot.ingest_queue.stats()
+        embed.add_field(
+            name="Ingest Queue",
+            value=(
+                f"{queue_stats['depth']}/{self.bot.ingest_queue.max_depth} queued (peak {queue_stats['peak_depth']}), "
+                f"avg wait {queue_stats['avg_wait']:.1f}s, "
+                f"{queue_stats['dropped']} dropped, {queue_stats['degraded']} degraded"
+            ),
+            inline=False
+        )
+        if self.bot.downloader is not None:
+            download_stats = self.bot.downloader.stats()
+            embed.add_field(
+                name="Downloads",
+                value=(
+                    f"{download_stats['downloads']} images, "
+                    f"{MessageUtils.format_file_size(download_stats['bytes_downloaded'])} total, "
+                    f"peak buffer {MessageUtils.format_file_size(download_stats['peak_buffer_bytes'])}, "
+                    f"{download_stats['rejected_too_large']} too large, "
+                    f"{download_stats['rejected_not_image']} not images"
+                ),
+                inline=False
+            )
+        reaction_stats = self.bot.reaction_dispatcher.stats()
+        embed.add_field(
+            name="Reactions",
+            value=(
+                f"{reaction_stats['sent']} added, {reaction_stats['failed']} failed, "
+                f"{reaction_stats['coalesced']} coalesced, {reaction_stats['queued']} pending"
+            ),
+            inline=False
+        )
+        if self.bot.local_tier is not None:
+            local_stats = self.bot.local_tier.stats()
+            embed.add_field(
+                name="Local Classifier",
+                value=(
+                    f"{local_stats['accepted']}/{local_stats['classified']} handled locally, "
+                    f"escalation rate {local_stats['escalation_rate']:.0%}, "
+                    f"avg confidence {local_stats['avg_confidence']:.2f}, {local_stats['avg_ms']:.0f} ms"
+                ),
+                inline=False
+            )
+        limiter_stats = self.bot.image_analyzer.rate_limiter.stats()
+        embed.add_field(
+            name="OpenAI Rate Limiter",
+            value=(
+                f"{limiter_stats['requests_per_minute']:.0f} req/min, {limiter_stats['tokens_per_minute']:.0f} tokens/min, "
+                f"{limiter_stats['waiting']} waiting, {limiter_stats['throttled']} throttled, "
+                f"avg wait {limiter_stats['avg_wait'][PRIORITY_FRESH]:.1f}s live / "
+                f"{limiter_stats['avg_wait'][PRIORITY_BACKFILL]:.1f}s backfill"
+            ),
+            inline=False
+        )
+        if self.bot.journal is not None:
+            journal_stats = self.bot.journal.stats()
+            embed.add_field(
+                name="Job Journal",
+                value=(
+                    f"{journal_stats['events']} events in {journal_stats['commits']} commits "
+                    f"({journal_stats['events_per_commit']:.1f} per commit), {journal_stats['pending']} pending"
+                ),
+                inline=False
+            )
+        if self.bot.perceptual_index is not None:
+            phash_stats = self.bot.perceptual_index.stats()
+            embed.add_field(
+                name="Near-duplicate Index",
+                value=f"{phash_stats['entries']} images, {phash_stats['hits']} hits / {phash_stats['misses']} misses",
+                inline=False
+            )
+        await ctx.send(embed=embed)
+
+    @commands.hybrid_command(name='stats')
+    async def stats_command(self, ctx):
+        """Show per-stage latency percentiles and OpenAI token usage"""
+        embed = discord.Embed(
+            title="Pipeline Stats",
+            color=discord.Color.blue()
+        )
+        summary = metrics.summary()
+        if summary:
+            lines = [f"{'stage':<11}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}"]
+            for stage, stage_stats in summary.items():
+                lines.append(
+                    f"{stage:<11}{stage_stats['count']:>7}"
+                    f"{stage_stats['p50'] * 1000:>7.0f}ms"
+                    f"{stage_stats['p95'] * 1000:>7.0f}ms"
+                    f"{stage_stats['p99'] * 1000:>7.0f}ms"
+                )
+            embed.add_field(name="Latency", value="```\n" + "\n".join(lines) + "\n```", inline=False)
+        else:
+            embed.add_field(name="Latency", value="No images processed yet", inline=False)
+        for model, (requests, prompt_tokens, completion_tokens) in sorted(metrics.tokens.items()):
+            embed.add_field(
+                name=f"Tokens ({model})",
+                value=(
+                    f"{requests} requests, {prompt_tokens} prompt + {completion_tokens} completion, "
+                    f"~{(prompt_tokens + completion_tokens) / requests:.0f} per request"
+                ),
+                inline=False
+            )
+        await ctx.send(embed=embed)
+
+    @commands.hybrid_command(name='backfill')
+    async def backfill_command(self, ctx):
+        """Scan the monitored channel for images posted while the bot was offline"""
+        if self.bot.start_backfill():
+            await ctx.send("🔎 Backfill started, scanning for images without reactions...")
+        else:
+            await ctx.send("⏳ A backfill is already running")
+
+    @commands.hybrid_command(name='reload')
+    async def reload_command(self, ctx):
+        """Reload the channel routing file without restarting (SIGHUP does the same)"""
+        if self.bot.router.reload():
+            routes = self.bot.router.stats()
+            await ctx.send(f"🔁 Routes reloaded: {routes['channels']} channel(s), {routes['guilds']} guild(s)")
+        else:
+            await ctx.send("⚠️ Routing file is invalid, keeping the previous routes")
+
+    @commands.hybrid_command(name='test')
+    async def test_command(self, ctx):
+        """Test command to verify bot is responding"""
+        await ctx.send("🤖 Bot is working! Send an image to see magic happen!")
@@ -0,0 +1,133 @@
+import json
+import logging
+from typing import Dict, Iterable, Optional
+
+from image_analyzer import ANALYSIS_MODES
+
+logger = logging.getLogger(__name__)
+
+class ChannelPolicy:
+    """How the bot handles images in one channel (or every channel of a guild)"""
+
+    def __init__(self, enabled: bool = True, max_emojis: int = 3, analysis_mode: str = "text", weight: int = 1):
+        if analysis_mode not in ANALYSIS_MODES:
+            raise ValueError(f"analysis_mode must be one of: {', '.join(ANALYSIS_MODES)}")
+        if weight < 1:
+            raise ValueError("weight must be at least 1")
+
+        self.enabled = enabled
+        self.max_emojis = max_emojis
+        self.analysis_mode = analysis_mode
+        # Jobs taken from this channel per ingest round-robin turn
+        self.weight = weight
+
+    def with_overrides(self, data: dict) -> "ChannelPolicy":
+        """Return a copy with the keys given in a routing file entry replaced"""
+        unknown = set(data) - {"enabled", "max_emojis", "analysis_mode", "weight", "name"}
+        if unknown:
+            raise ValueError(f"Unknown policy keys: {', '.join(sorted(unknown))}")
+        return ChannelPolicy(
+            enabled=bool(data.get("enabled", self.enabled)),
+            max_emojis=int(data.get("max_emojis", self.max_emojis)),
+            analysis_mode=str(data.get("analysis_mode", self.analysis_mode)).lower(),
+            weight=int(data.get("weight", self.weight)),
+        )
+
+    def __repr__(self):
+        return (f"ChannelPolicy(enabled={self.enabled}, max_emojis={self.max_emojis}, "
+                f"analysis_mode={self.analysis_mode!r}, weight={self.weight})")
+
+class ChannelRouter:
+    """Maps channel and guild IDs to the policy the bot applies there
+
+    Routes come from the channel IDs passed in (with the default policy) and
+    an optional JSON file:
+
+        {
+            "defaults": {"max_emojis": 3, "analysis_mode": "text"},
+            "channels": {"123": {"max_emojis": 5, "weight": 2}, "456": {"enabled": false}},
+            "guilds": {"789": {"analysis_mode": "structured"}}
+        }
+
+    A guild entry covers every channel of that guild without its own entry.
+    Disabled entries are left out of the tables, so route() is two dict
+    lookups and unrouted messages are rejected in O(1). reload() builds new
+    tables and swaps them in, keeping the old ones if the file is invalid.
+    """
+
+    def __init__(self, default_policy: ChannelPolicy, channel_ids: Iterable[int] = (), path: str = ""):
+        self.default_policy = default_policy
+        self.base_channel_ids = list(channel_ids)
+        self.path = path
+
+        self._channels: Dict[int, ChannelPolicy] = {}
+        self._guilds: Dict[int, ChannelPolicy] = {}
+        self.disabled = 0
+        self.load()
+
+    def load(self):
+        """Build the routing tables, raising ValueError if the routing file is invalid"""
+        defaults = self.default_policy
+        channels = {channel_id: defaults for channel_id in self.base_channel_ids}
+        guilds = {}
+        disabled = 0
+
+        if self.path:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                defaults = defaults.with_overrides(data.get("defaults", {}))
+                for channel_id in self.base_channel_ids:
+                    channels[channel_id] = defaults
+                for table, entries in ((channels, data.get("channels", {})), (guilds, data.get("guilds", {}))):
+                    for entry_id, entry in entries.items():
+                        policy = defaults.with_overrides(entry)
+                        if policy.enabled:
+                            table[int(entry_id)] = policy
+                        else:
+                            table.pop(int(entry_id), None)
+                            disabled += 1
+            except (OSError, TypeError, AttributeError, json.JSONDecodeError) as e:
+                raise ValueError(f"Invalid routing file {self.path}: {e}") from e
+
+        self._channels, self._guilds, self.disabled = channels, guilds, disabled
+        logger.info(f"Routing {len(channels)} channel(s) and {len(guilds)} guild(s), {disabled} disabled")
+
+    def reload(self) -> bool:
+        """
+        Reload the routing file, keeping the current routes on error
+
+        Returns:
+            True if the new routes are in effect
+        """
+        try:
+            self.load()
+            return True
+        except ValueError as e:
+            logger.error(f"Keeping previous routes: {e}")
+            return False
+
+    def route(self, channel_id: int, guild_id: Optional[int] = None) -> Optional[ChannelPolicy]:
+        """Return the policy for a channel, or None if the bot ignores it"""
+        policy = self._channels.get(channel_id)
+        if policy is None and guild_id is not None:
+            policy = self._guilds.get(guild_id)
+        return policy
+
+    def route_message(self, message) -> Optional[ChannelPolicy]:
+        """Return the policy for a message's channel, or None if the bot ignores it"""
+        guild = message.guild
+        return self.route(message.channel.id, guild.id if guild is not None else None)
+
+    @property
+    def channel_ids(self):
+        """IDs of the explicitly routed channels"""
+        return list(self._channels)
+
+    def stats(self) -> dict:
+        """Return routing table sizes"""
+        return {
+            "channels": len(self._channels),
+            "guilds": len(self._guilds),
+            "disabled": self.disabled,
+        }
@@ -0,0 +1,108 @@
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Breaker states
+CLOSED = "closed"          # calls go through
+OPEN = "open"              # calls are skipped until open_seconds have passed
+HALF_OPEN = "half_open"    # a few probe calls decide whether to close again
+
+class CircuitBreaker:
+    """Trips when too many recent calls failed or were slow
+
+    The outcomes of the last `window` calls are kept; once at least
+    `min_calls` are known and the share of failed or slow ones reaches
+    `failure_rate`, the breaker opens and allow() returns False for
+    `open_seconds`. It then lets `half_open_probes` calls through: if they
+    all succeed in time it closes, and any bad probe opens it again.
+    """
+
+    def __init__(self, window: int = 20, min_calls: int = 10, failure_rate: float = 0.5,
+                 slow_call_seconds: float = 15.0, open_seconds: float = 30.0, half_open_probes: int = 3):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        # True for each failed or slow call
+        self._outcomes = deque(maxlen=window)
+        self._probes_allowed = 0
+        self._probes_passed = 0
+
+        # Counters
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Return True if a call may be made now"""
+        if self.state == CLOSED:
+            return True
+
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self._set_state(HALF_OPEN)
+            self.opened_at = now
+
+        if self._probes_allowed < self.half_open_probes:
+            self._probes_allowed += 1
+            return True
+        # Probes that never reported back (e.g. failed before the request)
+        # must not hold the breaker half-open forever
+        if now - self.opened_at >= self.open_seconds:
+            self.opened_at = now
+            self._probes_allowed = 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: bool, seconds: float):
+        """Record the outcome and duration of one call"""
+        bad = not success or seconds >= self.slow_call_seconds
+
+        if self.state == HALF_OPEN:
+            if bad:
+                self._trip()
+            else:
+                self._probes_passed += 1
+                if self._probes_passed >= self.half_open_probes:
+                    self._outcomes.clear()
+                    self._set_state(CLOSED)
+            return
+        if self.state == OPEN:
+            # Calls started before the breaker opened
+            return
+
+        self._outcomes.append(bad)
+        if len(self._outcomes) >= self.min_calls:
+            if sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                self._trip()
+
+    def _trip(self):
+        self.trips += 1
+        self.opened_at = time.monotonic()
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            log = logger.warning if state == OPEN else logger.info
+            log(f"Circuit breaker {self.state} -> {state}")
+        self.state = state
+        self._probes_allowed = 0
+        self._probes_passed = 0
+
+    def stats(self) -> dict:
+        """Return the state, recent bad-call rate and counters"""
+        return {
+            "state": self.state,
+            "bad_rate": sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
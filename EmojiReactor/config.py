@@ -13,9 +13,27 @@ class Config:
         if not self.DISCORD_TOKEN:
             raise ValueError("DISCORD_TOKEN environment variable is required")
         
-        self.TARGET_CHANNEL_ID = os.getenv("TARGET_CHANNEL_ID")
-        if not self.TARGET_CHANNEL_ID:
-            raise ValueError("TARGET_CHANNEL_ID environment variable is required")
+        # Message content is a privileged intent; without it text commands need a mention
+        self.MESSAGE_CONTENT_INTENT = os.getenv("MESSAGE_CONTENT_INTENT", "false").lower() == "true"
+        self.SYNC_COMMANDS = os.getenv("SYNC_COMMANDS", "true").lower() == "true"  # register slash commands at startup
+        
+        # Channels to monitor: comma-separated IDs and/or a JSON routing file
+        self.TARGET_CHANNEL_ID = os.getenv("TARGET_CHANNEL_ID", "")
+        self.CHANNEL_ROUTES_PATH = os.getenv("CHANNEL_ROUTES_PATH", "")
+        if not self.TARGET_CHANNEL_ID and not self.CHANNEL_ROUTES_PATH:
+            raise ValueError("TARGET_CHANNEL_ID or CHANNEL_ROUTES_PATH environment variable is required")
+        self.TARGET_CHANNEL_IDS = [
+            int(channel_id) for channel_id in self.TARGET_CHANNEL_ID.split(",") if channel_id.strip()
+        ]
+        
+        # Sharding Configuration: leave unset to let Discord pick the shard count
+        # and run every shard in this process
+        self.SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+        self.SHARD_IDS = [
+            int(shard_id) for shard_id in os.getenv("SHARD_IDS", "").split(",") if shard_id.strip()
+        ] or None
+        if self.SHARD_IDS and not self.SHARD_COUNT:
+            raise ValueError("SHARD_COUNT is required when SHARD_IDS is set")
         
         # OpenAI Configuration
         self.OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -26,15 +44,100 @@ class Config:
         self.MAX_IMAGE_SIZE = int(os.getenv("MAX_IMAGE_SIZE", "10485760"))  # 10MB default
         self.ANALYSIS_TIMEOUT = int(os.getenv("ANALYSIS_TIMEOUT", "30"))  # 30 seconds
         self.MAX_EMOJIS_PER_IMAGE = int(os.getenv("MAX_EMOJIS_PER_IMAGE", "3"))
+        self.MAX_CONCURRENT_IMAGES = int(os.getenv("MAX_CONCURRENT_IMAGES", "8"))
+        self.MAX_IMAGES_PER_MESSAGE = int(os.getenv("MAX_IMAGES_PER_MESSAGE", "10"))  # attachments and image embeds
+        self.ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "text").lower()  # "text" or "structured"
+        self.EMOJI_DIVERSITY = float(os.getenv("EMOJI_DIVERSITY", "0"))  # score noise seeded per message, 0 is a fixed ranking
+        
+        # Ingest Queue Configuration
+        self.INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+        self.INGEST_MAX_DEPTH = int(os.getenv("INGEST_MAX_DEPTH", "100"))
+        self.INGEST_FULL_POLICY = os.getenv("INGEST_FULL_POLICY", "drop_oldest").lower()  # drop_oldest, drop_newest or degrade
+        
+        # Job Journal Configuration
+        self.JOURNAL_PATH = os.getenv("JOURNAL_PATH", "job_journal.db")  # empty disables the journal
+        self.JOURNAL_FLUSH_MS = int(os.getenv("JOURNAL_FLUSH_MS", "50"))  # group commit window
+        self.JOURNAL_REPLAY_MAX_AGE = int(os.getenv("JOURNAL_REPLAY_MAX_AGE", "86400"))  # seconds
+        
+        # History Backfill Configuration
+        self.BACKFILL_ON_START = os.getenv("BACKFILL_ON_START", "false").lower() == "true"  # or run /backfill
+        self.BACKFILL_RATE = float(os.getenv("BACKFILL_RATE", "2"))  # messages per second
+        self.BACKFILL_MAX_AGE = int(os.getenv("BACKFILL_MAX_AGE", "86400"))  # seconds of history to scan
+        
+        # OpenAI Client Configuration
+        self.OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+        self.OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "16"))
+        self.OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+        self.OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))  # seconds
+        self.OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "8"))  # seconds
+        self.OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))  # requests per minute of our tier
+        self.OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "30000"))  # tokens per minute of our tier
+        self.OPENAI_RATE_HEADROOM = float(os.getenv("OPENAI_RATE_HEADROOM", "0.9"))  # share of the limits to use
+        
+        # Circuit Breaker Configuration: skip the vision API while it is failing or slow
+        self.BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))  # recent requests considered
+        self.BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+        self.BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))  # share of failed or slow requests
+        self.BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "15"))
+        self.BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))  # before probing again
+        self.BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "3"))
+        
+        # Model Routing and Hedging Configuration
+        self.SMALL_IMAGE_MODEL = os.getenv("SMALL_IMAGE_MODEL", "")  # e.g. "gpt-4o-mini", empty sends every image to gpt-4o
+        self.SMALL_IMAGE_MAX_SIDE = int(os.getenv("SMALL_IMAGE_MAX_SIDE", "512"))  # pixels
+        self.SIMPLE_IMAGE_MAX_BPP = float(os.getenv("SIMPLE_IMAGE_MAX_BPP", "0.05"))  # compressed bytes per pixel, 0 disables
+        self.HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+        self.HEDGE_DELAY_MS = int(os.getenv("HEDGE_DELAY_MS", "0"))  # 0 uses the model's observed p90
+        self.HEDGE_MIN_DELAY_MS = int(os.getenv("HEDGE_MIN_DELAY_MS", "500"))
+        self.HEDGE_MODEL = os.getenv("HEDGE_MODEL", "gpt-4o-mini")
+        self.HEDGE_DETAIL = os.getenv("HEDGE_DETAIL", "low").lower()  # "high" or "low"
+        
+        # Vision Batching Configuration (structured mode only)
+        self.BATCH_ENABLED = os.getenv("BATCH_ENABLED", "false").lower() == "true"
+        self.BATCH_WINDOW_MS = int(os.getenv("BATCH_WINDOW_MS", "200"))
+        self.BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "4"))
+        
+        # Image Preprocessing Configuration
+        self.VISION_DETAIL = os.getenv("VISION_DETAIL", "high").lower()  # "high" or "low"
+        self.IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG").upper()  # "JPEG" or "WEBP"
+        self.IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+        self.PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", "2"))
+        self.ANIMATED_MODE = os.getenv("ANIMATED_MODE", "contact_sheet").lower()  # "contact_sheet" or "first_frame"
+        self.ANIMATED_FRAMES = int(os.getenv("ANIMATED_FRAMES", "4"))
+        self.ANIMATED_SELECTION = os.getenv("ANIMATED_SELECTION", "scene").lower()  # "scene" or "even"
+        
+        # Local Classifier Configuration
+        self.LOCAL_CLASSIFIER = os.getenv("LOCAL_CLASSIFIER", "")  # "heuristic", "module:ClassName" or empty to disable
+        self.LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.85"))
+        
+        # Analysis Cache Configuration
+        self.CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+        self.CACHE_TTL = int(os.getenv("CACHE_TTL", "604800"))  # 7 days, 0 disables expiry
+        self.CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "")  # empty disables the disk tier
+        self.CACHE_MAX_DISK_ENTRIES = int(os.getenv("CACHE_MAX_DISK_ENTRIES", "100000"))  # 0 leaves it uncapped
+        
+        # Near-duplicate Detection Configuration
+        self.PHASH_ENABLED = os.getenv("PHASH_ENABLED", "true").lower() == "true"
+        self.PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))  # bits out of 64
+        self.PHASH_MAX_ENTRIES = int(os.getenv("PHASH_MAX_ENTRIES", "200000"))
+        
+        # Metrics Configuration
+        self.METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+        self.METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # 0 disables the /metrics endpoint
         
         # Logging Configuration
         self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+        self.LOG_FILE = os.getenv("LOG_FILE", "discord_bot.log")
+        self.LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # "text" or "json"
+        self.LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", "10485760"))  # rotate at 10MB
+        self.LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+        self.LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "10"))  # DEBUG/INFO records per second per call site, 0 disables
+        self.LOG_SAMPLE = os.getenv("LOG_SAMPLE", "")  # e.g. "bot=0.1,reaction_dispatcher=0.5"
         
     def validate(self):
         """Validate all required configuration values"""
         required_vars = [
             "DISCORD_TOKEN",
-            "TARGET_CHANNEL_ID", 
             "OPENAI_API_KEY"
         ]
         
@@ -42,6 +145,8 @@ class Config:
         for var in required_vars:
             if not getattr(self, var):
                 missing_vars.append(var)
+        if not self.TARGET_CHANNEL_ID and not self.CHANNEL_ROUTES_PATH:
+            missing_vars.append("TARGET_CHANNEL_ID or CHANNEL_ROUTES_PATH")
         
         if missing_vars:
             raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
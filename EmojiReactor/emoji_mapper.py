@@ -1,14 +1,15 @@
 import re
 import logging
-from typing import List, Set
-import random
+from typing import List, Optional, Set
+from emoji_scorer import EmojiScorer
+from keyword_matcher import KeywordMatcher
 
 logger = logging.getLogger(__name__)
 
 class EmojiMapper:
     """Maps image analysis content to appropriate emoji reactions"""
     
-    def __init__(self):
+    def __init__(self, diversity: float = 0.0):
         # Define emoji mappings based on content keywords
         self.emoji_mappings = {
             # Animals
@@ -66,6 +67,7 @@ class EmojiMapper:
             'flower': ['🌸', '🌺', '🌻', '🌷', '🌹'],
             'tree': ['🌳', '🌲', '🎋'],
             'mountain': ['⛰️', '🏔️'],
+            'panorama': ['🏞️', '🌄'],
             'ocean': ['🌊', '🏖️'],
             'beach': ['🏖️', '🌊'],
             'fire': ['🔥', '🚒'],
@@ -171,19 +173,67 @@ class EmojiMapper:
         # Generic neutral reactions  
         self.neutral_reactions = ['👀', '🤔', '😮', '🙂']
         
+        # Generic negative reactions
+        self.negative_reactions = ['😔', '😞', '💔']
+        
         # Fallback emojis for when no specific match is found
         self.fallback_emojis = ['👀', '😊', '👍', '✨']
+        
+        # Simple sentiment keywords
+        self.positive_words = [
+            'beautiful', 'amazing', 'wonderful', 'great', 'awesome', 'fantastic',
+            'lovely', 'perfect', 'excellent', 'stunning', 'gorgeous', 'incredible',
+            'impressive', 'brilliant', 'magnificent', 'spectacular', 'marvelous',
+            'delightful', 'charming', 'elegant', 'graceful', 'vibrant', 'colorful'
+        ]
+        
+        self.negative_words = [
+            'sad', 'terrible', 'awful', 'bad', 'horrible', 'ugly', 'disgusting',
+            'disappointing', 'boring', 'dull', 'dark', 'gloomy', 'depressing'
+        ]
+        
+        # Compile mappings and sentiment lexicons into one automaton
+        self.matcher = KeywordMatcher()
+        for keyword in self.emoji_mappings:
+            self.matcher.add(keyword, 'mapping')
+        for word in self.positive_words:
+            self.matcher.add(word, 'positive')
+        for word in self.negative_words:
+            self.matcher.add(word, 'negative')
+        
+        # Relative score noise when picking emojis, 0 ranks deterministically
+        self.diversity = diversity
+        # Built on first use, then updated in place as mappings change
+        self._scorer: Optional[EmojiScorer] = None
+    
+    @property
+    def scorer(self) -> EmojiScorer:
+        """Ranking rows of the keyword mappings (keyed by keyword) and sentiment reactions"""
+        if self._scorer is None:
+            rows = dict(self.emoji_mappings)
+            rows[('sentiment', 'positive')] = self.positive_reactions
+            rows[('sentiment', 'negative')] = self.negative_reactions
+            rows[('sentiment', 'neutral')] = self.neutral_reactions
+            self._scorer = EmojiScorer(rows)
+        return self._scorer
 
-    def get_emojis_for_content(self, analysis_text: str, max_emojis: int = 3) -> List[str]:
+    def get_emojis_for_content(self, analysis_text: str, max_emojis: int = 3,
+                               seed: Optional[int] = None) -> List[str]:
         """
         Get appropriate emojis based on image analysis content
         
+        Every keyword occurrence adds its emojis to the scores, weighted by
+        how early in the text it appears (descriptions lead with the main
+        subject). The best-scoring emojis are returned in rank order; with
+        no keyword match, the reactions of the prevailing sentiment are.
+        
         Args:
             analysis_text: The image analysis text from OpenAI
             max_emojis: Maximum number of emojis to return
+            seed: Seed for the diversity noise, e.g. the message ID
             
         Returns:
-            List of emoji strings
+            List of emoji strings, best first
         """
         try:
             if not analysis_text:
@@ -192,57 +242,89 @@ class EmojiMapper:
             # Convert to lowercase for matching
             text_lower = analysis_text.lower()
             
-            # Find matching emojis
-            matched_emojis = set()
-            
-            # Check for keyword matches
-            for keyword, emojis in self.emoji_mappings.items():
-                if keyword in text_lower:
-                    # Add random emoji from the category
-                    matched_emojis.add(random.choice(emojis))
-                    logger.debug(f"Matched keyword '{keyword}' -> {emojis[0]}")
+            # Find all keyword and sentiment matches in one pass
+            scorer = self.scorer
+            rows = []
+            row_weights = []
+            text_length = len(text_lower)
+            sentiment_words = {'positive': set(), 'negative': set()}
+            for label, keyword, start in self.matcher.find_all(text_lower):
+                if label == 'mapping':
+                    rows.append(scorer.row_index(keyword))
+                    # From 1.0 at the start of the text down to 0.5 at the end
+                    row_weights.append(1.0 - 0.5 * start / text_length)
+                else:
+                    sentiment_words[label].add(keyword)
             
-            # Convert to list and limit
-            emoji_list = list(matched_emojis)
-            
-            # If we have matches, return them (up to max_emojis)
-            if emoji_list:
-                if len(emoji_list) > max_emojis:
-                    emoji_list = random.sample(emoji_list, max_emojis)
-                return emoji_list
+            if rows:
+                logger.debug(f"Matched {len(rows)} keyword occurrence(s)")
+                return scorer.score(rows, row_weights, max_emojis, self.diversity, seed)
             
             # If no specific matches, use sentiment-based selection
-            return self._get_sentiment_emojis(text_lower, max_emojis)
+            return self._get_sentiment_emojis(
+                len(sentiment_words['positive']),
+                len(sentiment_words['negative']),
+                max_emojis,
+                seed
+            )
             
         except Exception as e:
             logger.error(f"Error mapping emojis: {e}")
             return self.fallback_emojis[:max_emojis]
     
-    def _get_sentiment_emojis(self, text: str, max_emojis: int) -> List[str]:
-        """Get emojis based on sentiment analysis of the text"""
+    def get_emojis_for_structured(self, analysis: dict, max_emojis: int = 3) -> List[str]:
+        """
+        Get emojis from a structured analysis (tags, sentiment, emojis)
+        
+        The model's own emoji picks come first, then emojis mapped from the
+        tags, then generic reactions for the reported sentiment.
+        
+        Args:
+            analysis: Structured analysis from ImageAnalyzer.analyze_image_structured
+            max_emojis: Maximum number of emojis to return
+            
+        Returns:
+            List of emoji strings
+        """
         try:
-            # Simple sentiment keywords
-            positive_words = [
-                'beautiful', 'amazing', 'wonderful', 'great', 'awesome', 'fantastic',
-                'lovely', 'perfect', 'excellent', 'stunning', 'gorgeous', 'incredible',
-                'impressive', 'brilliant', 'magnificent', 'spectacular', 'marvelous',
-                'delightful', 'charming', 'elegant', 'graceful', 'vibrant', 'colorful'
-            ]
+            emojis = list(dict.fromkeys(analysis.get('emojis', [])))
+            
+            if len(emojis) < max_emojis:
+                tag_text = ". ".join(analysis.get('tags', [])).lower()
+                for label, keyword, _ in self.matcher.find_all(tag_text):
+                    if label == 'mapping':
+                        emoji = self.emoji_mappings[keyword][0]
+                        if emoji not in emojis:
+                            emojis.append(emoji)
             
-            negative_words = [
-                'sad', 'terrible', 'awful', 'bad', 'horrible', 'ugly', 'disgusting',
-                'disappointing', 'boring', 'dull', 'dark', 'gloomy', 'depressing'
-            ]
+            if len(emojis) < max_emojis:
+                sentiment = analysis.get('sentiment')
+                for emoji in self._get_sentiment_emojis(
+                    int(sentiment == 'positive'),
+                    int(sentiment == 'negative'),
+                    max_emojis
+                ):
+                    if emoji not in emojis:
+                        emojis.append(emoji)
             
-            positive_count = sum(1 for word in positive_words if word in text)
-            negative_count = sum(1 for word in negative_words if word in text)
+            return emojis[:max_emojis]
             
+        except Exception as e:
+            logger.error(f"Error mapping structured analysis: {e}")
+            return self.fallback_emojis[:max_emojis]
+    
+    def _get_sentiment_emojis(self, positive_count: int, negative_count: int, max_emojis: int,
+                              seed: Optional[int] = None) -> List[str]:
+        """Get emojis based on the number of distinct positive and negative words"""
+        try:
             if positive_count > negative_count:
-                return random.sample(self.positive_reactions, min(max_emojis, len(self.positive_reactions)))
+                sentiment = 'positive'
             elif negative_count > positive_count:
-                return ['😔', '😞', '💔'][:max_emojis]
+                sentiment = 'negative'
             else:
-                return random.sample(self.neutral_reactions, min(max_emojis, len(self.neutral_reactions)))
+                sentiment = 'neutral'
+            scorer = self.scorer
+            return scorer.score([scorer.row_index(('sentiment', sentiment))], [1.0], max_emojis, self.diversity, seed)
                 
         except Exception as e:
             logger.error(f"Error in sentiment analysis: {e}")
@@ -251,10 +333,16 @@ class EmojiMapper:
     def add_custom_mapping(self, keyword: str, emojis: List[str]):
         """Add custom keyword -> emoji mapping"""
         self.emoji_mappings[keyword.lower()] = emojis
+        self.matcher.add(keyword.lower(), 'mapping')
+        if self._scorer is not None:
+            self._scorer.set_row(keyword.lower(), emojis)
         logger.info(f"Added custom mapping: {keyword} -> {emojis}")
     
     def remove_mapping(self, keyword: str):
         """Remove a keyword mapping"""
         if keyword.lower() in self.emoji_mappings:
             del self.emoji_mappings[keyword.lower()]
+            self.matcher.remove(keyword.lower(), 'mapping')
+            if self._scorer is not None:
+                self._scorer.remove_row(keyword.lower())
             logger.info(f"Removed mapping for: {keyword}")
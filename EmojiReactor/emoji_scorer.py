@@ -0,0 +1,101 @@
+import heapq
+import logging
+import random
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+class EmojiScorer:
+    """Ranks emojis for a set of matched keywords
+
+    Every row (a keyword or a sentiment) is stored as a tuple of
+    (emoji ID, weight) pairs, with weights that decay with the emoji's
+    position in the row so each row's first emoji ranks above the others.
+    Scoring scales the matched rows by the match weights and sums per
+    emoji in a dict, so a call only touches the emojis of the matched rows,
+    however many mappings are loaded. Rows can be set or removed in place,
+    which costs the same however many rows there are.
+
+    Ties are broken by emoji ID (first registration order), which makes the
+    ranking deterministic. With diversity > 0 the scores are perturbed by
+    seeded noise, so the same seed always gives the same picks.
+    """
+
+    # Weight of the n-th emoji of a row is RANK_DECAY ** n
+    RANK_DECAY = 0.3
+
+    def __init__(self, rows: Dict[Hashable, Sequence[str]]):
+        self.emojis: List[str] = []
+        self._emoji_ids: Dict[str, int] = {}
+        self._rows: Dict[Hashable, int] = {}
+        self._entries: List[Tuple[Tuple[int, float], ...]] = []
+
+        for key, emojis in rows.items():
+            self.set_row(key, emojis)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def row_index(self, key: Hashable) -> Optional[int]:
+        """Return the row index of a key, or None if it has no row"""
+        return self._rows.get(key)
+
+    def set_row(self, key: Hashable, emojis: Sequence[str]):
+        """Add a row, or replace the emojis of an existing one keeping its index"""
+        entries = []
+        # A row listing an emoji twice keeps its best rank
+        for rank, emoji in enumerate(dict.fromkeys(emojis)):
+            emoji_id = self._emoji_ids.get(emoji)
+            if emoji_id is None:
+                emoji_id = self._emoji_ids[emoji] = len(self.emojis)
+                self.emojis.append(emoji)
+            entries.append((emoji_id, self.RANK_DECAY ** rank))
+
+        row = self._rows.get(key)
+        if row is None:
+            self._rows[key] = len(self._entries)
+            self._entries.append(tuple(entries))
+        else:
+            self._entries[row] = tuple(entries)
+
+    def remove_row(self, key: Hashable):
+        """Remove a row; its index stays reserved so other indices don't move"""
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._entries[row] = ()
+
+    def score(self, rows: Sequence[int], row_weights: Sequence[float], top_k: int,
+              diversity: float = 0.0, seed: Optional[int] = None) -> List[str]:
+        """
+        Rank the emojis of the given rows
+
+        Args:
+            rows: Row indices, repeated rows add up
+            row_weights: Weight of each entry of rows
+            top_k: Maximum number of emojis to return
+            diversity: Relative noise added to the scores, 0 for a pure ranking
+            seed: Seed of the noise; the same seed gives the same result
+
+        Returns:
+            Up to top_k emojis, best first
+        """
+        if top_k <= 0:
+            return []
+
+        totals: Dict[int, float] = defaultdict(float)
+        entries = self._entries
+        for row, row_weight in zip(rows, row_weights):
+            for emoji_id, weight in entries[row]:
+                totals[emoji_id] += weight * row_weight
+
+        emoji_ids = sorted(totals)
+        if diversity > 0:
+            # Noise is drawn in ID order so the seed alone decides it
+            rng = random.Random(seed)
+            for emoji_id in emoji_ids:
+                totals[emoji_id] *= 1 + diversity * rng.random()
+
+        # Highest score first; nlargest is stable, so equal scores keep the lowest ID first
+        best = heapq.nlargest(top_k, emoji_ids, key=totals.__getitem__)
+        return [self.emojis[emoji_id] for emoji_id in best]
@@ -1,13 +1,95 @@
-import base64
 import json
 import logging
-from openai import OpenAI
+import random
+import httpx
+import openai
+from openai import AsyncOpenAI, NOT_GIVEN
 from config import Config
+from utils import ImageDescriptor, ImageUtils, PRIORITY_FRESH, RateLimiter, get_process_pool, parse_reset_duration, run_in_process
+from metrics import metrics
+from circuit_breaker import CircuitBreaker, CLOSED
+from vision_batcher import VisionBatcher
 import asyncio
-from typing import Optional
+import time
+import unicodedata
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Analysis modes
+TEXT_MODE = "text"                # free-text description, keyword-mapped by EmojiMapper
+STRUCTURED_MODE = "structured"    # compact JSON with tags, sentiment and emojis
+ANALYSIS_MODES = (TEXT_MODE, STRUCTURED_MODE)
+
+SENTIMENTS = ("positive", "neutral", "negative")
+MAX_STRUCTURED_TAGS = 8
+MAX_STRUCTURED_EMOJIS = 5
+
+# JSON schema the model must follow in structured mode
+STRUCTURED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "tags": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": f"Up to {MAX_STRUCTURED_TAGS} short lowercase nouns or adjectives describing the image"
+        },
+        "sentiment": {
+            "type": "string",
+            "enum": list(SENTIMENTS)
+        },
+        "emojis": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": f"Up to {MAX_STRUCTURED_EMOJIS} single unicode emojis that fit as reactions, best first"
+        }
+    },
+    "required": ["tags", "sentiment", "emojis"],
+    "additionalProperties": False
+}
+
+# Same fields per image, tagged with the 1-based image number
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "image": {"type": "integer"},
+                    **STRUCTURED_SCHEMA["properties"]
+                },
+                "required": ["image", "tags", "sentiment", "emojis"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["results"],
+    "additionalProperties": False
+}
+
+# Rough prompt tokens per image, used to reserve budget before the request
+IMAGE_TOKEN_ESTIMATES = {"low": 85, "high": 765}
+
+# Hedge after a fixed delay until the primary model has this many latency samples
+HEDGE_WARMUP_SAMPLES = 20
+DEFAULT_HEDGE_DELAY = 4.0  # seconds
+
+# Errors worth retrying: throttling, timeouts, dropped connections and 5xx
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+# Errors the circuit breaker counts as failed calls: the retryable ones and
+# any other error status (400, 401, 404...), which retrying would not fix
+BREAKER_FAILURES = RETRYABLE_ERRORS + (openai.APIStatusError,)
+
 class ImageAnalyzer:
     """Handles image analysis using OpenAI Vision API"""
     
@@ -15,22 +97,158 @@ class ImageAnalyzer:
         self.config = Config()
         # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
         # do not change this unless explicitly requested by the user
-        self.client = OpenAI(api_key=self.config.OPENAI_API_KEY)
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.config.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=self.config.OPENAI_MAX_CONNECTIONS,
+                keepalive_expiry=60
+            ),
+            timeout=httpx.Timeout(self.config.ANALYSIS_TIMEOUT, connect=10)
+        )
+        # Retries are handled by _create_completion so they can be jittered
+        self.client = AsyncOpenAI(
+            api_key=self.config.OPENAI_API_KEY,
+            http_client=self.http_client,
+            max_retries=0
+        )
+        self.request_semaphore = asyncio.Semaphore(self.config.OPENAI_MAX_CONCURRENCY)
+        # Keeps all requests under the tier's requests/min and tokens/min
+        self.rate_limiter = RateLimiter(
+            self.config.OPENAI_RPM_LIMIT,
+            self.config.OPENAI_TPM_LIMIT,
+            headroom=self.config.OPENAI_RATE_HEADROOM
+        )
+        # Tripped by failing or slow requests; the bot skips the API while it is open
+        self.circuit_breaker = CircuitBreaker(
+            window=self.config.BREAKER_WINDOW,
+            min_calls=self.config.BREAKER_MIN_CALLS,
+            failure_rate=self.config.BREAKER_FAILURE_RATE,
+            slow_call_seconds=self.config.BREAKER_SLOW_CALL_SECONDS,
+            open_seconds=self.config.BREAKER_OPEN_SECONDS,
+            half_open_probes=self.config.BREAKER_HALF_OPEN_PROBES
+        )
         self.model = "gpt-4o"
+        self.detail = self.config.VISION_DETAIL
+        get_process_pool(self.config.PREPROCESS_WORKERS)
+        # Opt-in: structured analyses of images arriving together share one request
+        self.batcher = VisionBatcher(
+            self.analyze_images_batch,
+            window=self.config.BATCH_WINDOW_MS / 1000,
+            max_images=self.config.BATCH_MAX_IMAGES
+        ) if self.config.BATCH_ENABLED else None
+        
+        # Hedged request counters
+        self.hedged = 0
+        self.hedge_wins = 0
+    
+    def choose_model(self, descriptor: Optional[ImageDescriptor]) -> Tuple[str, str]:
+        """
+        Pick the model and detail level for one image
+        
+        Small images and simple ones (flat graphics, screenshots, which
+        compress to few bytes per pixel) go to SMALL_IMAGE_MODEL at low
+        detail when it is configured; everything else to the main model.
+        
+        Returns:
+            (model, detail) tuple
+        """
+        small_model = self.config.SMALL_IMAGE_MODEL
+        if not small_model or descriptor is None or descriptor.is_animated:
+            return self.model, self.detail
+        
+        pixels = descriptor.width * descriptor.height
+        if max(descriptor.width, descriptor.height) <= self.config.SMALL_IMAGE_MAX_SIDE:
+            return small_model, "low"
+        if pixels and descriptor.size / pixels <= self.config.SIMPLE_IMAGE_MAX_BPP:
+            return small_model, "low"
+        return self.model, self.detail
     
-    async def analyze_image(self, image_data: bytes) -> Optional[str]:
+    async def prepare_image(self, image_data: bytes, detail: Optional[str] = None,
+                            descriptor: Optional[ImageDescriptor] = None) -> Optional[str]:
+        """
+        Turn an image into the data URL sent to the vision API
+        
+        The header is parsed once into an ImageDescriptor. Images that already
+        fit the model's resolution are encoded straight from the download
+        buffer; others are shrunk and re-encoded in the process pool first.
+        
+        Args:
+            image_data: Image data as any bytes-like object
+            detail: Detail level the image is sent at, defaults to VISION_DETAIL
+            descriptor: Already parsed header of image_data, if any
+            
+        Returns:
+            Base64 data URL, or None if the image is unreadable
+        """
+        # "high" detail tiles fit 2048px with a 768px short side, "low" uses 512px
+        if (detail or self.detail) == "low":
+            max_long_side, max_short_side = 512, 512
+        else:
+            max_long_side, max_short_side = 2048, 768
+        
+        if descriptor is None:
+            descriptor = ImageUtils.describe(image_data)
+        if descriptor is not None and descriptor.is_animated and self.config.ANIMATED_MODE == "contact_sheet":
+            # Show the model several frames instead of just the first one
+            prepared = await run_in_process(
+                ImageUtils.build_contact_sheet,
+                image_data,
+                self.config.ANIMATED_FRAMES,
+                self.config.ANIMATED_SELECTION,
+                max_long_side,
+                max_short_side,
+                self.config.IMAGE_OUTPUT_FORMAT,
+                self.config.IMAGE_QUALITY
+            )
+            if prepared is not None:
+                payload, mime_type = prepared
+                return ImageUtils.encode_data_url(payload, mime_type)
+        
+        if not ImageUtils.needs_preprocessing(descriptor, max_long_side, max_short_side):
+            return ImageUtils.encode_data_url(image_data, descriptor.mime_type)
+        
+        prepared = await run_in_process(
+            ImageUtils.prepare_for_vision,
+            image_data,
+            max_long_side,
+            max_short_side,
+            self.config.IMAGE_OUTPUT_FORMAT,
+            self.config.IMAGE_QUALITY
+        )
+        if prepared is None:
+            return None
+        payload, mime_type = prepared
+        return ImageUtils.encode_data_url(payload, mime_type)
+    
+    async def analyze(self, image_data: bytes, mode: str = TEXT_MODE, priority: int = PRIORITY_FRESH):
+        """Analyze an image in the given mode (TEXT_MODE or STRUCTURED_MODE) and rate limiter lane"""
+        if mode == STRUCTURED_MODE:
+            if self.batcher is not None:
+                return await self.batcher.submit(image_data, priority)
+            return await self.analyze_image_structured(image_data, priority)
+        return await self.analyze_image(image_data, priority)
+    
+    async def analyze_image(self, image_data: bytes, priority: int = PRIORITY_FRESH) -> Optional[str]:
         """
         Analyze an image using OpenAI Vision API
         
         Args:
             image_data: Image data as bytes
+            priority: Rate limiter lane
             
         Returns:
             Analysis result as string, or None if analysis failed
         """
         try:
-            # Convert image to base64
-            base64_image = base64.b64encode(image_data).decode('utf-8')
+            descriptor = ImageUtils.describe(image_data)
+            model, detail = self.choose_model(descriptor)
+            
+            # Downscale, re-encode and base64 encode for upload
+            with metrics.timer("preprocess"):
+                image_url = await self.prepare_image(image_data, detail, descriptor)
+            if image_url is None:
+                logger.error("Could not prepare image for analysis")
+                return None
             
             # Create the analysis prompt
             system_prompt = """You are an expert image analyzer for a Discord bot that adds emoji reactions.
@@ -43,18 +261,18 @@ class ImageAnalyzer:
             6. Any text visible in the image
             
             Be specific and detailed to help determine appropriate emoji reactions.
-            Focus on concrete, identifiable elements rather than abstract interpretations."""
+            Focus on concrete, identifiable elements rather than abstract interpretations.
+            If the image is a grid of frames from an animation, describe the animation as a whole."""
             
             user_prompt = "Analyze this image in detail and describe all key elements you can identify."
             
-            # Make API call in a thread to avoid blocking
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                self._make_vision_request,
-                base64_image,
+            response = await self._make_vision_request(
+                image_url,
                 system_prompt,
-                user_prompt
+                user_prompt,
+                model=model,
+                detail=detail,
+                priority=priority
             )
             
             if response and response.choices:
@@ -69,11 +287,411 @@ class ImageAnalyzer:
             logger.error(f"Error analyzing image: {e}")
             return None
     
-    def _make_vision_request(self, base64_image: str, system_prompt: str, user_prompt: str):
-        """Make the actual API request (runs in thread)"""
+    async def analyze_image_structured(self, image_data: bytes, priority: int = PRIORITY_FRESH) -> Optional[dict]:
+        """
+        Analyze an image into tags, sentiment and emojis with a single request
+        
+        The model answers with a short JSON object constrained by
+        STRUCTURED_SCHEMA instead of a free-text description, so no second
+        call is needed to pick emojis.
+        
+        Args:
+            image_data: Image data as bytes
+            priority: Rate limiter lane
+            
+        Returns:
+            Dict with "tags", "sentiment" and "emojis", or None if analysis failed
+        """
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            descriptor = ImageUtils.describe(image_data)
+            model, detail = self.choose_model(descriptor)
+            
+            # Downscale, re-encode and base64 encode for upload
+            with metrics.timer("preprocess"):
+                image_url = await self.prepare_image(image_data, detail, descriptor)
+            if image_url is None:
+                logger.error("Could not prepare image for analysis")
+                return None
+            
+            system_prompt = """You label images for a Discord bot that adds emoji reactions.
+            Reply with JSON only: concrete tags for what is visible (subjects, activity, setting, mood),
+            the overall sentiment, and the emoji reactions that fit best.
+            A grid of frames is one animation: label the animation as a whole."""
+            
+            user_prompt = "Label this image."
+            
+            response = await self._make_vision_request(
+                image_url,
+                system_prompt,
+                user_prompt,
+                max_tokens=150,
+                temperature=0.3,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": "image_reactions",
+                        "strict": True,
+                        "schema": STRUCTURED_SCHEMA
+                    }
+                },
+                model=model,
+                detail=detail,
+                priority=priority
+            )
+            
+            if not response or not response.choices:
+                logger.error("No response from OpenAI Vision API")
+                return None
+            
+            content = response.choices[0].message.content
+            try:
+                analysis = self.validate_structured_analysis(json.loads(content))
+            except (json.JSONDecodeError, TypeError) as e:
+                logger.error(f"Failed to parse structured analysis: {e}")
+                return None
+            
+            if analysis is None:
+                logger.error(f"Structured analysis does not match schema: {content[:200]}")
+                return None
+            
+            logger.info("Successfully analyzed image (structured)")
+            return analysis
+            
+        except Exception as e:
+            logger.error(f"Error analyzing image: {e}")
+            return None
+    
+    async def analyze_images_batch(self, images: List[bytes], priority: int = PRIORITY_FRESH) -> List[Optional[dict]]:
+        """
+        Analyze several images with one structured request per model
+        
+        Each image is routed with choose_model(), like a single image would
+        be. Images routed to the same (model, detail) share a request, and
+        the requests of the different routes are sent concurrently.
+        
+        Args:
+            images: Image data for each image
+            priority: Rate limiter lane
+            
+        Returns:
+            Structured analysis per image in the same order, None where it failed
+        """
+        if len(images) == 1:
+            return [await self.analyze_image_structured(images[0], priority)]
+        
+        descriptors = [ImageUtils.describe(image_data) for image_data in images]
+        routes: Dict[Tuple[str, str], List[int]] = {}
+        for index, descriptor in enumerate(descriptors):
+            routes.setdefault(self.choose_model(descriptor), []).append(index)
+        
+        results: List[Optional[dict]] = [None] * len(images)
+        
+        async def analyze_route(model: str, detail: str, indices: List[int]):
+            if len(indices) == 1:
+                route_results = [await self.analyze_image_structured(images[indices[0]], priority)]
+            else:
+                route_results = await self._analyze_batch_request(
+                    [images[index] for index in indices],
+                    [descriptors[index] for index in indices],
+                    model,
+                    detail,
+                    priority
+                )
+            for index, result in zip(indices, route_results):
+                results[index] = result
+        
+        await asyncio.gather(*(
+            analyze_route(model, detail, indices) for (model, detail), indices in routes.items()
+        ))
+        return results
+    
+    async def _analyze_batch_request(self, images: List[bytes], descriptors: List[Optional[ImageDescriptor]],
+                                     model: str, detail: str, priority: int) -> List[Optional[dict]]:
+        """Analyze images routed to the same model and detail level in one structured request"""
+        results: List[Optional[dict]] = [None] * len(images)
+        try:
+            with metrics.timer("preprocess"):
+                prepared = await asyncio.gather(*(
+                    self.prepare_image(image_data, detail, descriptor)
+                    for image_data, descriptor in zip(images, descriptors)
+                ))
+            
+            # Number the images so answers can be matched back to callers
+            content = [{
+                "type": "text",
+                "text": f"Label each of these {len(images)} images separately, "
+                        f"reporting its number in the \"image\" field."
+            }]
+            numbers = []
+            for index, image_url in enumerate(prepared):
+                if image_url is None:
+                    logger.error(f"Could not prepare batch image {index + 1} for analysis")
+                    continue
+                numbers.append(index + 1)
+                content.append({"type": "text", "text": f"Image {index + 1}:"})
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": image_url,
+                        "detail": detail
+                    }
+                })
+            
+            if not numbers:
+                return results
+            
+            with metrics.timer("vision"):
+                response = await self._create_completion(
+                    priority=priority,
+                    model=model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": """You label images for a Discord bot that adds emoji reactions.
+            Reply with JSON only: for every image, concrete tags for what is visible (subjects, activity,
+            setting, mood), the overall sentiment, and the emoji reactions that fit best.
+            A grid of frames is one animation: label the animation as a whole."""
+                        },
+                        {
+                            "role": "user",
+                            "content": content
+                        }
+                    ],
+                    max_tokens=150 * len(numbers),
+                    temperature=0.3,
+                    response_format={
+                        "type": "json_schema",
+                        "json_schema": {
+                            "name": "image_reactions_batch",
+                            "strict": True,
+                            "schema": BATCH_SCHEMA
+                        }
+                    }
+                )
+            
+            if not response or not response.choices:
+                logger.error("No response from OpenAI Vision API for batch")
+                return results
+            
+            for item in json.loads(response.choices[0].message.content).get("results", []):
+                number = item.get("image") if isinstance(item, dict) else None
+                if number in numbers:
+                    results[number - 1] = self.validate_structured_analysis(item)
+            
+            logger.info(f"Successfully analyzed batch of {len(numbers)} images")
+            
+        except Exception as e:
+            logger.error(f"Error analyzing image batch: {e}")
+        
+        return results
+    
+    @staticmethod
+    def validate_structured_analysis(data) -> Optional[dict]:
+        """
+        Check a structured analysis against STRUCTURED_SCHEMA and normalize it
+        
+        Returns:
+            Normalized dict, or None if the data does not match the schema
+        """
+        if not isinstance(data, dict):
+            return None
+        
+        tags, sentiment, emojis = data.get("tags"), data.get("sentiment"), data.get("emojis")
+        if not isinstance(tags, list) or not isinstance(emojis, list) or sentiment not in SENTIMENTS:
+            return None
+        if not all(isinstance(item, str) for item in tags + emojis):
+            return None
+        
+        return {
+            "tags": [tag.strip().lower() for tag in tags if tag.strip()][:MAX_STRUCTURED_TAGS],
+            "sentiment": sentiment,
+            "emojis": [emoji.strip() for emoji in emojis if ImageAnalyzer.is_unicode_emoji(emoji.strip())][:MAX_STRUCTURED_EMOJIS],
+        }
+    
+    @staticmethod
+    def is_unicode_emoji(text: str) -> bool:
+        """
+        Check that a string looks like one unicode emoji
+        
+        Emojis are short and contain a symbol (or a keycap mark). Names such
+        as "cat" or ":smile:", which Discord would reject as reactions, are
+        refused.
+        """
+        if not 0 < len(text) <= 8:
+            return False
+        if any(char.isspace() or char == ":" or (char.isascii() and char.isalpha()) for char in text):
+            return False
+        return any(unicodedata.category(char) == "So" or char == "\u20e3" for char in text)
+    
+    @staticmethod
+    def estimate_tokens(messages: list, max_tokens: int = 0) -> int:
+        """Estimate the tokens a request counts against the tokens/min limit"""
+        tokens = max_tokens
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, str):
+                tokens += len(content) // 4
+                continue
+            for part in content or []:
+                if part.get("type") == "image_url":
+                    tokens += IMAGE_TOKEN_ESTIMATES.get(part["image_url"].get("detail"), IMAGE_TOKEN_ESTIMATES["high"])
+                else:
+                    tokens += len(part.get("text", "")) // 4
+        return tokens
+    
+    async def _create_completion(self, priority: int = PRIORITY_FRESH, **kwargs):
+        """
+        Create a chat completion with rate limiting, bounded concurrency, timeout and retries
+        
+        Each attempt first waits for requests/min and tokens/min budget in the
+        given rate limiter lane, then holds a slot of the request semaphore and
+        is cut off after ANALYSIS_TIMEOUT seconds. The response's rate limit
+        headers and token usage feed back into the limiter, and every attempt's
+        outcome and latency into the circuit breaker. Retryable failures back
+        off exponentially with full jitter so a burst of throttled requests
+        doesn't retry in lockstep. They are only retried while the breaker is
+        closed: once it has opened, or while its half-open probes are out,
+        the failure is raised right away.
+        """
+        model = kwargs.get("model", self.model)
+        max_tokens = kwargs.get("max_tokens") or 0
+        estimate = self.estimate_tokens(kwargs.get("messages", []), max_tokens)
+        max_retries = self.config.OPENAI_MAX_RETRIES
+        for attempt in range(max_retries + 1):
+            reserved = False
+            started = None
+            try:
+                await self.rate_limiter.acquire(estimate, priority)
+                reserved = True
+                async with self.request_semaphore:
+                    started = time.monotonic()
+                    try:
+                        raw_response = await asyncio.wait_for(
+                            self.client.chat.completions.with_raw_response.create(**kwargs),
+                            timeout=self.config.ANALYSIS_TIMEOUT
+                        )
+                    except BREAKER_FAILURES:
+                        self.circuit_breaker.record(False, time.monotonic() - started)
+                        raise
+                    elapsed = time.monotonic() - started
+                    self.circuit_breaker.record(True, elapsed)
+                    metrics.observe_model(model, elapsed)
+                self.rate_limiter.update_from_headers(raw_response.headers)
+                response = raw_response.parse()
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    self.rate_limiter.settle(estimate, usage.total_tokens)
+                metrics.record_usage(model, usage)
+                return response
+            except asyncio.CancelledError:
+                if started is not None:
+                    # Usually the loser of a hedge. It took at least this long, and
+                    # leaving it out would let hedge_delay() see only the fast
+                    # requests. The server still bills the prompt, so the estimate
+                    # stays reserved and the prompt counts towards the cost
+                    metrics.observe_model(model, time.monotonic() - started)
+                    metrics.record_usage(model, SimpleNamespace(prompt_tokens=estimate - max_tokens, completion_tokens=0))
+                elif reserved:
+                    # Never sent: return the reservation
+                    self.rate_limiter.settle(estimate, 0)
+                raise
+            except RETRYABLE_ERRORS as e:
+                delay = random.uniform(0, min(
+                    self.config.OPENAI_RETRY_MAX_DELAY,
+                    self.config.OPENAI_RETRY_BASE_DELAY * 2 ** attempt
+                ))
+                # Never retry sooner than the server asked us to, and hold
+                # every other request back for as long too
+                if isinstance(e, openai.RateLimitError):
+                    headers = e.response.headers
+                    self.rate_limiter.update_from_headers(headers)
+                    waits = [delay]
+                    try:
+                        waits.append(float(headers.get("retry-after")))
+                    except (TypeError, ValueError):
+                        pass
+                    for kind in ("requests", "tokens"):
+                        if headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+                            reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                            if reset is not None:
+                                waits.append(reset)
+                    delay = max(waits)
+                    self.rate_limiter.pause(delay)
+                
+                if attempt == max_retries or self.circuit_breaker.state != CLOSED:
+                    raise
+                
+                logger.warning(
+                    f"OpenAI request failed ({type(e).__name__}), retry {attempt + 1}/{max_retries} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+    
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait for a model before hedging: HEDGE_DELAY_MS, or its observed p90"""
+        if self.config.HEDGE_DELAY_MS > 0:
+            return self.config.HEDGE_DELAY_MS / 1000
+        
+        histogram = metrics.models.get(model)
+        if histogram is None or histogram.count < HEDGE_WARMUP_SAMPLES:
+            delay = DEFAULT_HEDGE_DELAY
+        else:
+            delay = histogram.quantile(0.90)
+        return max(delay, self.config.HEDGE_MIN_DELAY_MS / 1000)
+    
+    async def _hedged_completion(self, priority: int, primary: dict, hedge: dict):
+        """
+        Create a completion, racing a second request if the first one is slow
+        
+        If the primary request has not answered after hedge_delay(), the hedge
+        request (a cheaper model or lower detail) is sent as well. The first
+        successful response wins and the other request is cancelled. If the
+        primary fails before the delay, its error is raised as usual. No hedge
+        is sent unless the circuit breaker is closed, so a half-open breaker
+        only sees its probes.
+        """
+        primary_task = asyncio.create_task(self._create_completion(priority=priority, **primary))
+        tasks = [primary_task]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(primary["model"]))
+            if done or self.circuit_breaker.state != CLOSED:
+                return await primary_task
+            
+            self.hedged += 1
+            logger.debug(f"Hedging {primary['model']} request with {hedge['model']}")
+            hedge_task = asyncio.create_task(self._create_completion(priority=priority, **hedge))
+            tasks.append(hedge_task)
+            
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None and task.result() is not None:
+                        if task is hedge_task:
+                            self.hedge_wins += 1
+                        return task.result()
+            # Both failed: report the primary's error
+            return primary_task.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    def hedge_stats(self) -> dict:
+        """Return how often requests were hedged and how often the hedge won"""
+        return {
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "win_rate": self.hedge_wins / self.hedged if self.hedged else 0.0,
+        }
+    
+    async def _make_vision_request(self, image_url: str, system_prompt: str, user_prompt: str,
+                                   max_tokens: int = 500, temperature: float = 0.7, response_format=None,
+                                   model: Optional[str] = None, detail: Optional[str] = None,
+                                   priority: int = PRIORITY_FRESH):
+        """Make the actual API request, hedged if HEDGE_ENABLED"""
+        def request(model: str, detail: str) -> dict:
+            return dict(
+                model=model,
                 messages=[
                     {
                         "role": "system",
@@ -89,16 +707,28 @@ class ImageAnalyzer:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
-                                    "detail": "high"
+                                    "url": image_url,
+                                    "detail": detail
                                 }
                             }
                         ]
                     }
                 ],
-                max_tokens=500,
-                temperature=0.7
+                max_tokens=max_tokens,
+                temperature=temperature,
+                response_format=response_format or NOT_GIVEN
             )
+        
+        model = model or self.model
+        detail = detail or self.detail
+        hedge = (self.config.HEDGE_MODEL, self.config.HEDGE_DETAIL)
+        try:
+            with metrics.timer("vision"):
+                hedging = self.config.HEDGE_ENABLED and self.circuit_breaker.state == CLOSED
+                if hedging and hedge != (model, detail):
+                    response = await self._hedged_completion(priority, request(model, detail), request(*hedge))
+                else:
+                    response = await self._create_completion(priority=priority, **request(model, detail))
             return response
         except Exception as e:
             logger.error(f"OpenAI API request failed: {e}")
@@ -130,12 +760,7 @@ Respond with a JSON object containing an array of emoji suggestions with explana
 
 Choose emojis that are commonly available on Discord and match the content well."""
             
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                self._make_emoji_request,
-                prompt
-            )
+            response = await self._make_emoji_request(prompt)
             
             if response and response.choices:
                 content = response.choices[0].message.content
@@ -152,10 +777,10 @@ Choose emojis that are commonly available on Discord and match the content well.
             logger.error(f"Error getting emoji suggestions: {e}")
             return None
     
-    def _make_emoji_request(self, prompt: str):
-        """Make emoji suggestion API request (runs in thread)"""
+    async def _make_emoji_request(self, prompt: str):
+        """Make emoji suggestion API request"""
         try:
-            response = self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.model,
                 messages=[
                     {
@@ -171,3 +796,7 @@ Choose emojis that are commonly available on Discord and match the content well.
         except Exception as e:
             logger.error(f"OpenAI emoji suggestion request failed: {e}")
             return None
+    
+    async def close(self):
+        """Close the pooled HTTP connections"""
+        await self.client.close()
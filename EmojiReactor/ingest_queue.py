@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# What to do with a new job when the queue is full
+DROP_OLDEST = "drop_oldest"    # evict the oldest job of the busiest channel
+DROP_NEWEST = "drop_newest"    # reject the incoming job
+DEGRADE = "degrade"            # hand the incoming job back for keyword-only handling
+FULL_POLICIES = (DROP_OLDEST, DROP_NEWEST, DEGRADE)
+
+class IngestJob:
+    """A message waiting for its image attachments to be processed"""
+
+    def __init__(self, message, attachments, policy=None, priority: int = 0):
+        self.message = message
+        self.attachments = attachments
+        # Channel policy from the router; None uses the bot-wide settings
+        self.policy = policy
+        # OpenAI rate limiter lane: 0 for live messages, higher for catch-up work
+        self.priority = priority
+        self.channel_id = message.channel.id
+        self.weight = policy.weight if policy is not None else 1
+        self.enqueued_at = time.monotonic()
+
+class IngestQueue:
+    """Bounded job queue with per-channel round-robin fairness
+
+    Each channel gets its own FIFO and workers take jobs from the channels in
+    turn, so one busy channel cannot starve the others. A channel whose jobs
+    have weight N gets up to N jobs per turn. The total depth is capped; when
+    full, the configured policy decides which job loses.
+    """
+
+    def __init__(self, max_depth: int = 100, policy: str = DROP_OLDEST):
+        if policy not in FULL_POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}, expected one of {', '.join(FULL_POLICIES)}")
+
+        self.max_depth = max_depth
+        self.policy = policy
+
+        # channel id -> deque of jobs, in round-robin order
+        self._channels: "OrderedDict[int, deque]" = OrderedDict()
+        self._depth = 0
+        # Jobs taken from the channel at the head of the rotation this turn
+        self._head_served = 0
+        self._has_jobs = asyncio.Event()
+        self._has_space = asyncio.Event()
+
+        # Counters
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.degraded = 0
+        self.peak_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def __len__(self) -> int:
+        return self._depth
+
+    def put_nowait(self, job: IngestJob) -> Optional[IngestJob]:
+        """
+        Enqueue a job, applying the full-queue policy if needed
+
+        Args:
+            job: Job to enqueue
+
+        Returns:
+            The job that lost out (dropped, or to be degraded), or None
+        """
+        if self._depth >= self.max_depth:
+            if self.policy == DROP_NEWEST:
+                self.dropped += 1
+                return job
+            if self.policy == DEGRADE:
+                self.degraded += 1
+                return job
+
+            # Evict from the channel hogging the most queue slots for its weight
+            busiest = max(self._channels.values(), key=lambda jobs: len(jobs) / jobs[0].weight if jobs else 0)
+            evicted = busiest.popleft()
+            self._depth -= 1
+            self.dropped += 1
+            self._append(job)
+            return evicted
+
+        self._append(job)
+        return None
+
+    async def put(self, job: IngestJob):
+        """Enqueue a job, waiting for a free slot instead of applying the policy"""
+        while self._depth >= self.max_depth:
+            self._has_space.clear()
+            await self._has_space.wait()
+        self._append(job)
+
+    def _append(self, job: IngestJob):
+        jobs = self._channels.get(job.channel_id)
+        if jobs is None:
+            jobs = self._channels[job.channel_id] = deque()
+        jobs.append(job)
+
+        self._depth += 1
+        self.enqueued += 1
+        self.peak_depth = max(self.peak_depth, self._depth)
+        self._has_jobs.set()
+
+    async def get(self) -> IngestJob:
+        """Wait for the next job, rotating between channels"""
+        while not self._depth:
+            self._has_jobs.clear()
+            await self._has_jobs.wait()
+
+        # Take from the channel at the head of the rotation, then send it to the back
+        while True:
+            channel_id, jobs = next(iter(self._channels.items()))
+            if jobs:
+                break
+            del self._channels[channel_id]
+            self._head_served = 0
+
+        job = jobs.popleft()
+        self._head_served += 1
+        if not jobs:
+            del self._channels[channel_id]
+            self._head_served = 0
+        elif self._head_served >= job.weight:
+            self._channels.move_to_end(channel_id)
+            self._head_served = 0
+
+        self._depth -= 1
+        self.dequeued += 1
+        self._has_space.set()
+        waited = time.monotonic() - job.enqueued_at
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return job
+
+    def stats(self) -> dict:
+        """Return queue depth, wait times and drop counters"""
+        return {
+            "depth": self._depth,
+            "peak_depth": self.peak_depth,
+            "channels": len(self._channels),
+            "enqueued": self.enqueued,
+            "dequeued": self.dequeued,
+            "dropped": self.dropped,
+            "degraded": self.degraded,
+            "avg_wait": self.total_wait / self.dequeued if self.dequeued else 0.0,
+            "max_wait": self.max_wait,
+        }
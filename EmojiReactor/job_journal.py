@@ -0,0 +1,207 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Job states in the order a message goes through them
+RECEIVED = "received"
+DOWNLOADED = "downloaded"
+ANALYZED = "analyzed"
+REACTED = "reacted"
+DROPPED = "dropped"
+# Reactions were chosen but none could be added; replayed like unfinished jobs
+FAILED = "failed"
+STATE_RANKS = {RECEIVED: 0, DOWNLOADED: 1, ANALYZED: 2, FAILED: 2, REACTED: 3, DROPPED: 3}
+DONE_RANK = 3
+
+class JobJournal:
+    """Append-only SQLite journal of message processing state
+
+    Every transition is appended as an event. Writers never touch the
+    database: events go onto a queue that a background thread commits in
+    groups (everything that arrived within flush_interval, up to batch_size
+    events per transaction), so burst ingest costs one fsync per group
+    rather than per event. On startup, messages without a terminal event
+    (REACTED or DROPPED) are returned by unfinished() for replay, including
+    the FAILED ones whose download failed or whose reactions could not be
+    added.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.05, batch_size: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        # Used for the schema and reads; the writer thread has its own connection
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS job_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                guild_id INTEGER,
+                state TEXT NOT NULL,
+                state_rank INTEGER NOT NULL,
+                detail TEXT,
+                recorded_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS job_events_message ON job_events (message_id)")
+        # Newest reacted message per channel, where history backfill resumes
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS channel_cursors (
+                channel_id INTEGER PRIMARY KEY,
+                message_id INTEGER NOT NULL
+            )"""
+        )
+        self._db.commit()
+
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="job-journal", daemon=True)
+        self._writer.start()
+
+        # Counters
+        self.events = 0
+        self.commits = 0
+
+    def record(self, message, state: str, detail: Optional[dict] = None):
+        """
+        Append a state transition for a message (non-blocking)
+
+        Args:
+            message: Discord message the job belongs to
+            state: One of RECEIVED, DOWNLOADED, ANALYZED, FAILED, REACTED, DROPPED
+            detail: Optional JSON-serializable extra data
+        """
+        guild = getattr(message, "guild", None)
+        self._queue.put((
+            message.id,
+            message.channel.id,
+            guild.id if guild is not None else None,
+            state,
+            STATE_RANKS[state],
+            json.dumps(detail) if detail else None,
+            time.time(),
+        ))
+
+    def _write_loop(self):
+        """Commit queued events in groups until close() sends None"""
+        db = sqlite3.connect(self.path)
+        db.execute("PRAGMA synchronous=NORMAL")
+        try:
+            self._write_batches(db)
+        finally:
+            db.close()
+
+    def _write_batches(self, db: sqlite3.Connection):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+
+            batch = [event]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if event is None:
+                    stop = True
+                    break
+                batch.append(event)
+
+            try:
+                with db:
+                    db.executemany(
+                        """INSERT INTO job_events
+                           (message_id, channel_id, guild_id, state, state_rank, detail, recorded_at)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                        batch
+                    )
+                    cursors = {}
+                    for message_id, channel_id, _, state, *_ in batch:
+                        if state == REACTED:
+                            cursors[channel_id] = max(message_id, cursors.get(channel_id, 0))
+                    db.executemany(
+                        """INSERT INTO channel_cursors (channel_id, message_id) VALUES (?, ?)
+                           ON CONFLICT (channel_id)
+                           DO UPDATE SET message_id = MAX(message_id, excluded.message_id)""",
+                        cursors.items()
+                    )
+                self.events += len(batch)
+                self.commits += 1
+            except sqlite3.Error as e:
+                logger.error(f"Job journal write of {len(batch)} events failed: {e}")
+
+            if stop:
+                return
+
+    def unfinished(self, max_age: float = 86400) -> List[dict]:
+        """
+        List messages received within max_age seconds that never finished
+
+        Returns:
+            Dicts with message_id, channel_id, guild_id and last state
+        """
+        rows = self._db.execute(
+            """SELECT message_id, channel_id, guild_id,
+                      (SELECT state FROM job_events AS latest
+                       WHERE latest.message_id = job_events.message_id
+                       ORDER BY id DESC LIMIT 1)
+               FROM job_events
+               GROUP BY message_id
+               HAVING MAX(state_rank) < ? AND MIN(recorded_at) >= ?
+               ORDER BY MIN(id)""",
+            (DONE_RANK, time.time() - max_age)
+        ).fetchall()
+        return [
+            {"message_id": row[0], "channel_id": row[1], "guild_id": row[2], "state": row[3]}
+            for row in rows
+        ]
+
+    def last_reacted(self, channel_id: int) -> Optional[int]:
+        """Return the ID of the newest message reacted to in a channel, if any"""
+        row = self._db.execute(
+            "SELECT message_id FROM channel_cursors WHERE channel_id = ?",
+            (channel_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def compact(self, max_age: float = 86400):
+        """Delete events of messages that finished or are older than max_age"""
+        with self._db:
+            self._db.execute(
+                """DELETE FROM job_events WHERE message_id IN (
+                       SELECT message_id FROM job_events
+                       GROUP BY message_id
+                       HAVING MAX(state_rank) >= ? OR MAX(recorded_at) < ?
+                   )""",
+                (DONE_RANK, time.time() - max_age)
+            )
+
+    def stats(self) -> dict:
+        """Return write counters"""
+        return {
+            "events": self.events,
+            "commits": self.commits,
+            "events_per_commit": self.events / self.commits if self.commits else 0.0,
+            "pending": self._queue.qsize(),
+        }
+
+    def close(self):
+        """Flush pending events and close the database"""
+        self._queue.put(None)
+        self._writer.join()
+        self._db.close()
@@ -0,0 +1,148 @@
+import logging
+from typing import Hashable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class KeywordMatcher:
+    """Aho–Corasick automaton matching many keywords in one pass over a text
+
+    Keywords are stored in a trie with one or more labels each (for example
+    which lexicon they belong to). The automaton is kept up to date
+    incrementally: adding a keyword links its new trie nodes and re-points
+    only the nodes whose failure link should now reach one of them, and
+    output links are only updated below the node whose outputs changed. The
+    affected nodes are found through the failure tree (each node's list of
+    nodes failing to it), so no change rebuilds the whole automaton.
+
+    Matches are word-boundary aware: a keyword must start at a word boundary
+    and end at one, optionally followed by a plural "s"/"es", so "cat" matches
+    "cats" but not "category".
+    """
+
+    PLURAL_SUFFIXES = ("s", "es")
+
+    def __init__(self):
+        # Node 0 is the root
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        # node -> nodes whose failure link points at it
+        self._fail_children: List[Set[int]] = [set()]
+        # node -> {label: keyword} for keywords ending at this node
+        self._outputs: List[dict] = [{}]
+        # node -> nearest node on the failure chain that has outputs
+        self._output_link: List[int] = [0]
+
+    def add(self, keyword: str, label: Hashable):
+        """Register a keyword under a label"""
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = self._add_node(node, char)
+            node = next_node
+
+        if not self._outputs[node]:
+            self._outputs[node][label] = keyword
+            # Nodes failing to this one without outputs in between now report it
+            self._relink_outputs(node, node)
+        else:
+            self._outputs[node][label] = keyword
+
+    def remove(self, keyword: str, label: Hashable):
+        """Unregister a keyword from a label, leaving the trie shape intact"""
+        node = 0
+        for char in keyword:
+            node = self._goto[node].get(char)
+            if node is None:
+                return
+        outputs = self._outputs[node]
+        if outputs.pop(label, None) is not None and not outputs and node:
+            fail = self._fail[node]
+            self._relink_outputs(node, fail if self._outputs[fail] else self._output_link[fail])
+
+    def _add_node(self, parent: int, char: str) -> int:
+        """Append a trie node below parent and link it into the automaton"""
+        node = len(self._goto)
+        self._goto.append({})
+        self._outputs.append({})
+        self._fail_children.append(set())
+
+        # Longest proper suffix of the new node's string that is in the trie
+        fail = 0
+        if parent:
+            fail = self._fail[parent]
+            while fail and char not in self._goto[fail]:
+                fail = self._fail[fail]
+            fail = self._goto[fail].get(char, 0)
+        self._fail.append(fail)
+        self._fail_children[fail].add(node)
+        # The new node has no outputs yet, so this leaves other output links valid
+        self._output_link.append(fail if self._outputs[fail] else self._output_link[fail])
+
+        # Nodes y whose failure chain reaches parent before any node with a
+        # char transition: their child y+char used to fail past parent and
+        # now fails to the new node
+        moved = []
+        stack = list(self._fail_children[parent] - {node})
+        while stack:
+            suffix_node = stack.pop()
+            child = self._goto[suffix_node].get(char)
+            if child is not None:
+                moved.append(child)
+            else:
+                stack.extend(self._fail_children[suffix_node])
+        for child in moved:
+            self._fail_children[self._fail[child]].discard(child)
+            self._fail[child] = node
+            self._fail_children[node].add(child)
+
+        self._goto[parent][char] = node
+        return node
+
+    def _relink_outputs(self, node: int, link: int):
+        """Point the output links of node's failure subtree at link, down to nodes with outputs"""
+        stack = list(self._fail_children[node])
+        while stack:
+            child = stack.pop()
+            self._output_link[child] = link
+            if not self._outputs[child]:
+                stack.extend(self._fail_children[child])
+
+    def _is_boundary(self, text: str, start: int, end: int) -> bool:
+        if start > 0 and text[start - 1].isalnum():
+            return False
+        if end == len(text) or not text[end].isalnum():
+            return True
+        for suffix in self.PLURAL_SUFFIXES:
+            after = end + len(suffix)
+            if text.startswith(suffix, end) and (after == len(text) or not text[after].isalnum()):
+                return True
+        return False
+
+    def find_all(self, text: str) -> List[Tuple[Hashable, str, int]]:
+        """
+        Find all keyword occurrences in a single pass
+
+        Args:
+            text: Text to search (match case is the caller's responsibility)
+
+        Returns:
+            List of (label, keyword, start index) in order of where they end
+        """
+        goto, fail, outputs, output_link = self._goto, self._fail, self._outputs, self._output_link
+        matches = []
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            hit = node if outputs[node] else output_link[node]
+            while hit:
+                for label, keyword in outputs[hit].items():
+                    start = index + 1 - len(keyword)
+                    if self._is_boundary(text, start, index + 1):
+                        matches.append((label, keyword, start))
+                hit = output_link[hit]
+
+        return matches
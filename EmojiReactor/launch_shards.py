@@ -0,0 +1,119 @@
+"""Run the bot as several processes, each serving a slice of the shards
+
+Usage: python launch_shards.py [--processes N] [--shard-count N]
+
+Every process gets SHARD_COUNT and its own SHARD_IDS (shards are dealt out
+round-robin), so gateway handling, image decoding and API calls spread
+over N cores. The processes share the analysis cache and the job journal
+through SQLite files in WAL mode; CACHE_DB_PATH defaults to
+analysis_cache.db here so the cache tier is shared. Process i serves
+metrics on METRICS_PORT + i. A process that exits
+with an error is restarted after a short delay.
+
+Ingest queues, rate limiters and circuit breakers are per process, so
+per shard slice: INGEST_MAX_DEPTH, INGEST_WORKERS and the OpenAI limits
+apply to each process. A message is only ever seen by the process whose
+shard receives it, so there is no work to share between queues, and a
+shared queue would put a SQLite write on the hot path of every image.
+What must survive a crash is already shared: jobs are recorded in the
+job journal, and each process replays the unfinished jobs of its own
+shards on startup. Divide OPENAI_RPM_LIMIT and OPENAI_TPM_LIMIT by the
+number of processes to stay within the account's limits.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+RESTART_DELAY = 5  # seconds
+
+def recommended_shard_count(token: str) -> int:
+    """Ask Discord how many shards the bot should run"""
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}", "User-Agent": "EmojiReactor shard launcher"}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return int(json.load(response)["shards"])
+
+def shard_slices(shard_count: int, processes: int):
+    """Deal shard IDs out to processes round-robin"""
+    return [
+        [shard_id for shard_id in range(shard_count) if shard_id % processes == index]
+        for index in range(processes)
+    ]
+
+def spawn(index: int, shard_ids, shard_count: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["SHARD_COUNT"] = str(shard_count)
+    env["SHARD_IDS"] = ",".join(str(shard_id) for shard_id in shard_ids)
+    # The cache's SQLite tier is what the processes share
+    if not env.get("CACHE_DB_PATH"):
+        env["CACHE_DB_PATH"] = "analysis_cache.db"
+    # Rotating handlers must not share a file: discord_bot-0.log, discord_bot-1.log, ...
+    log_root, log_ext = os.path.splitext(env.get("LOG_FILE") or "discord_bot.log")
+    env["LOG_FILE"] = f"{log_root}-{index}{log_ext}"
+    # One metrics endpoint per process: METRICS_PORT, METRICS_PORT + 1, ...
+    metrics_port = int(env.get("METRICS_PORT", "9108"))
+    if metrics_port:
+        env["METRICS_PORT"] = str(metrics_port + index)
+    logger.info(f"Starting shard(s) {env['SHARD_IDS']} of {shard_count}")
+    return subprocess.Popen([sys.executable, BOT_SCRIPT], env=env)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="bot processes to run")
+    parser.add_argument("--shard-count", type=int, default=0, help="total shards (default: SHARD_COUNT or Discord's recommendation)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    shard_count = args.shard_count or int(os.getenv("SHARD_COUNT", "0"))
+    if not shard_count:
+        token = os.getenv("DISCORD_TOKEN")
+        if not token:
+            logger.error("DISCORD_TOKEN is not configured")
+            sys.exit(1)
+        shard_count = recommended_shard_count(token)
+    # No point in processes without shards
+    slices = shard_slices(shard_count, min(args.processes, shard_count))
+
+    processes = {index: spawn(index, shard_ids, shard_count) for index, shard_ids in enumerate(slices)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while processes:
+        time.sleep(1)
+        for index, process in list(processes.items()):
+            code = process.poll()
+            if code is None:
+                continue
+            if stopping or code == 0:
+                del processes[index]
+                continue
+            logger.warning(f"Shard process {index} exited with code {code}, restarting in {RESTART_DELAY}s")
+            time.sleep(RESTART_DELAY)
+            processes[index] = spawn(index, slices[index], shard_count)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import importlib
+import logging
+from abc import ABC, abstractmethod
+import time
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from utils import BufferReader, run_in_process
+
+logger = logging.getLogger(__name__)
+
+class LocalClassifier(ABC):
+    """Base class for CPU-only image classifiers run before the vision API
+
+    Subclasses must implement classify(). Instances are created inside the worker
+    processes (once per process), so they may load models in __init__.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def classify(self, image_data: bytes) -> Optional[dict]:
+        """
+        Classify an image
+
+        Returns:
+            Dict with "label", "confidence" (0-1) and "tags", or None
+        """
+
+class HeuristicClassifier(LocalClassifier):
+    """Recognizes screenshots from cheap Pillow features
+
+    Screenshots have few distinct colours, large flat areas and device
+    aspect ratios, which separates them from camera photos without a model.
+    Only screens of UI and text are labelled confidently: a screenshot whose
+    centre is busy shows a game, video or picture that the tags would not
+    describe, so it gets a low confidence and goes to the vision API, like
+    anything that is not a screenshot.
+    """
+
+    # Coarse colours in the centre of the 64x64 thumbnail from which it
+    # counts as showing a picture rather than UI
+    BUSY_CENTRE_COLORS = 16
+
+    name = "heuristic"
+
+    def classify(self, image_data: bytes) -> Optional[dict]:
+        with Image.open(BufferReader(image_data)) as img:
+            width, height = img.size
+            img.draft('RGB', (128, 128))
+            small = img.convert('RGB').resize((64, 64), Image.Resampling.NEAREST)
+
+        # Coarse colours so JPEG noise doesn't break up flat areas
+        coarse = small.point(lambda value: value // 32 * 32)
+        colors = coarse.getcolors(64 * 64)
+        distinct = len(colors)
+
+        pixels = coarse.tobytes()
+        flat = sum(
+            1 for i in range(0, len(pixels) - 3, 3)
+            if pixels[i:i + 3] == pixels[i + 3:i + 6]
+        )
+        flat_ratio = flat / (len(pixels) // 3 - 1)
+
+        aspect = height / width
+        phone = 1.9 <= aspect <= 2.4
+        desktop = 0.5 <= aspect <= 0.65
+
+        score = 0.0
+        if flat_ratio > 0.55:
+            score += min(0.6, flat_ratio - 0.25)
+        if distinct < 48:
+            score += 0.25
+        if phone or desktop:
+            score += 0.15
+
+        if score >= 0.5:
+            device = 'phone' if phone or aspect > 1 else 'computer'
+            centre = coarse.crop((8, 16, 56, 48))
+            busy_centre = len(centre.getcolors(48 * 32)) >= self.BUSY_CENTRE_COLORS
+            return {
+                "label": "screenshot",
+                # A screenshot for sure, but of something the API should look at
+                "confidence": 0.3 if busy_centre else min(1.0, score),
+                "tags": ["screenshot", device],
+            }
+
+        return {
+            "label": "photo",
+            "confidence": max(0.0, 0.5 - score),
+            "tags": [],
+        }
+
+BUILTIN_CLASSIFIERS = {
+    HeuristicClassifier.name: HeuristicClassifier,
+}
+
+# Classifier instances per worker process, keyed by spec
+_instances: Dict[str, LocalClassifier] = {}
+
+def load_classifier(spec: str) -> LocalClassifier:
+    """Create a classifier from a built-in name or a "module:ClassName" path"""
+    if spec in BUILTIN_CLASSIFIERS:
+        return BUILTIN_CLASSIFIERS[spec]()
+
+    module_name, _, class_name = spec.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown local classifier {spec!r}, use a built-in name or module:ClassName")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+def classify_in_worker(spec: str, image_data: bytes) -> Optional[dict]:
+    """Process pool entry point, reusing one classifier instance per worker"""
+    classifier = _instances.get(spec)
+    if classifier is None:
+        classifier = _instances[spec] = load_classifier(spec)
+    try:
+        return classifier.classify(image_data)
+    except Exception as e:
+        logger.error(f"Local classifier {spec} failed: {e}")
+        return None
+
+class LocalClassifierTier:
+    """Runs a local classifier in the process pool and decides when to escalate
+
+    Results at or above the confidence threshold are used directly; anything
+    less certain is escalated to the vision API.
+    """
+
+    def __init__(self, spec: str, threshold: float = 0.85):
+        # Fail fast on a bad spec instead of in every worker
+        load_classifier(spec)
+        self.spec = spec
+        self.threshold = threshold
+
+        # Counters
+        self.classified = 0
+        self.accepted = 0
+        self.escalated = 0
+        self.total_confidence = 0.0
+        self.total_seconds = 0.0
+
+    async def classify(self, image_data: bytes) -> Optional[List[str]]:
+        """
+        Classify an image locally
+
+        Args:
+            image_data: Image data as bytes
+
+        Returns:
+            Tags if the classifier is confident enough, None to escalate
+        """
+        started = time.monotonic()
+        result = await run_in_process(classify_in_worker, self.spec, image_data)
+        self.total_seconds += time.monotonic() - started
+        self.classified += 1
+
+        if not result:
+            self.escalated += 1
+            return None
+
+        confidence = float(result.get("confidence", 0.0))
+        self.total_confidence += confidence
+        if confidence < self.threshold or not result.get("tags"):
+            self.escalated += 1
+            return None
+
+        self.accepted += 1
+        logger.info(f"Local classifier: {result['label']} ({confidence:.2f})")
+        return list(result["tags"])
+
+    def stats(self) -> dict:
+        """Return confidence, escalation rate and latency"""
+        return {
+            "classified": self.classified,
+            "accepted": self.accepted,
+            "escalated": self.escalated,
+            "escalation_rate": self.escalated / self.classified if self.classified else 0.0,
+            "avg_confidence": self.total_confidence / self.classified if self.classified else 0.0,
+            "avg_ms": self.total_seconds / self.classified * 1000 if self.classified else 0.0,
+        }
@@ -0,0 +1,206 @@
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "emojireactor"
+
+# Log-spaced latency buckets from 1 ms to about 2 minutes, 1.5x apart
+DEFAULT_BUCKETS = tuple(round(0.001 * 1.5 ** i, 6) for i in range(30))
+
+# USD per million (prompt, completion) tokens, for cost accounting
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+class Histogram:
+    """Fixed-bucket latency histogram with interpolated quantiles
+
+    Observing is a bisect and two additions, so it is cheap enough for the
+    hot path. The buckets double as Prometheus histogram buckets.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # One extra slot for observations above the last bound (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / bucket_count)
+            seen += bucket_count
+        return self.max
+
+    def summary(self) -> dict:
+        """Return count, mean and p50/p95/p99 in seconds"""
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+class Metrics:
+    """In-process registry of stage latencies, token usage and gauges"""
+
+    def __init__(self):
+        self.stages: Dict[str, Histogram] = {}
+        # model -> [requests, prompt tokens, completion tokens]
+        self.tokens: Dict[str, List[int]] = {}
+        # model -> latency of requests; cancelled ones count the time until the cancel
+        self.models: Dict[str, Histogram] = {}
+        self._gauge_sources: List[Callable[[], Dict[str, float]]] = []
+
+    def observe(self, stage: str, seconds: float):
+        """Record one duration for a pipeline stage"""
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Time the enclosed block as one observation of a stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def record_usage(self, model: str, usage):
+        """Add the token counts of an OpenAI response's usage object"""
+        totals = self.tokens.setdefault(model, [0, 0, 0])
+        totals[0] += 1
+        if usage is not None:
+            totals[1] += getattr(usage, "prompt_tokens", 0) or 0
+            totals[2] += getattr(usage, "completion_tokens", 0) or 0
+
+    def observe_model(self, model: str, seconds: float):
+        """Record the latency of one request to a model"""
+        histogram = self.models.get(model)
+        if histogram is None:
+            histogram = self.models[model] = Histogram()
+        histogram.observe(seconds)
+
+    def cost(self, model: str) -> float:
+        """Estimated USD spent on a model so far, 0 for models without a known price"""
+        _, prompt_tokens, completion_tokens = self.tokens.get(model, (0, 0, 0))
+        prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def register_gauges(self, source: Callable[[], Dict[str, float]]):
+        """Add a callable returning current gauge values, read at render time"""
+        self._gauge_sources.append(source)
+
+    def summary(self) -> Dict[str, dict]:
+        """Return the latency summary of every stage"""
+        return {stage: histogram.summary() for stage, histogram in sorted(self.stages.items())}
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_seconds Time spent in each pipeline stage",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        lines.append(f"# HELP {METRIC_PREFIX}_openai_requests_total OpenAI responses received")
+        lines.append(f"# TYPE {METRIC_PREFIX}_openai_requests_total counter")
+        for model, (requests, _, _) in sorted(self.tokens.items()):
+            lines.append(f'{METRIC_PREFIX}_openai_requests_total{{model="{model}"}} {requests}')
+        lines.append(f"# HELP {METRIC_PREFIX}_openai_tokens_total OpenAI tokens used")
+        lines.append(f"# TYPE {METRIC_PREFIX}_openai_tokens_total counter")
+        for model, (_, prompt_tokens, completion_tokens) in sorted(self.tokens.items()):
+            lines.append(f'{METRIC_PREFIX}_openai_tokens_total{{model="{model}",type="prompt"}} {prompt_tokens}')
+            lines.append(f'{METRIC_PREFIX}_openai_tokens_total{{model="{model}",type="completion"}} {completion_tokens}')
+
+        lines.append(f"# HELP {METRIC_PREFIX}_openai_cost_usd_total Estimated OpenAI spend")
+        lines.append(f"# TYPE {METRIC_PREFIX}_openai_cost_usd_total counter")
+        for model in sorted(self.tokens):
+            lines.append(f'{METRIC_PREFIX}_openai_cost_usd_total{{model="{model}"}} {self.cost(model):.6f}')
+
+        lines.append(f"# HELP {METRIC_PREFIX}_openai_request_seconds Latency of OpenAI requests, cancelled ones up to the cancel")
+        lines.append(f"# TYPE {METRIC_PREFIX}_openai_request_seconds histogram")
+        for model, histogram in sorted(self.models.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{METRIC_PREFIX}_openai_request_seconds_bucket{{model="{model}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_openai_request_seconds_bucket{{model="{model}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{METRIC_PREFIX}_openai_request_seconds_sum{{model="{model}"}} {histogram.sum}')
+            lines.append(f'{METRIC_PREFIX}_openai_request_seconds_count{{model="{model}"}} {histogram.count}')
+
+        for source in self._gauge_sources:
+            try:
+                gauges = source()
+            except Exception as e:
+                logger.error(f"Metrics gauge source failed: {e}")
+                continue
+            for name, value in gauges.items():
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+                lines.append(f"{METRIC_PREFIX}_{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry shared by the bot, analyzer and dispatcher
+metrics = Metrics()
+
+class MetricsServer:
+    """Serves the registry at /metrics for Prometheus to scrape"""
+
+    def __init__(self, registry: Metrics, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.registry.render_prometheus().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,123 @@
+import logging
+from collections import OrderedDict
+from itertools import combinations
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class PerceptualIndex:
+    """Near-duplicate lookup of perceptual hashes by Hamming distance
+
+    Uses multi-index hashing: each hash is split into 16-bit bands and every
+    band value is indexed separately. If two hashes are within max_distance
+    bits, at least one band differs by no more than max_distance // bands
+    bits (pigeonhole), so a lookup only probes those few neighbouring band
+    values instead of scanning the whole index.
+    """
+
+    BAND_BITS = 16
+
+    def __init__(self, max_distance: int = 6, max_entries: int = 200000, hash_bits: int = 64):
+        if not 0 <= max_distance < hash_bits:
+            raise ValueError("max_distance must be between 0 and hash_bits - 1")
+
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.hash_bits = hash_bits
+
+        # Split the hash into band (shift, mask) pairs of near-equal width
+        band_count = max(1, hash_bits // self.BAND_BITS)
+        base, extra = divmod(hash_bits, band_count)
+        self._bands: List[Tuple[int, int]] = []
+        self._probes: List[List[int]] = []
+        shift = 0
+        for i in range(band_count):
+            width = base + (1 if i < extra else 0)
+            self._bands.append((shift, (1 << width) - 1))
+            self._probes.append(self._flip_masks(width, max_distance // band_count))
+            shift += width
+
+        # hash -> stored value, oldest first for eviction
+        self._entries: "OrderedDict[int, Any]" = OrderedDict()
+        # one dict per band: band value -> set of hashes
+        self._buckets: List[dict] = [{} for _ in self._bands]
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _flip_masks(width: int, radius: int) -> List[int]:
+        """Return every mask of at most `radius` set bits within `width` bits"""
+        masks = [0]
+        for bit_count in range(1, radius + 1):
+            masks.extend(
+                sum(1 << bit for bit in bits)
+                for bits in combinations(range(width), bit_count)
+            )
+        return masks
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, image_hash: int, value: Any):
+        """Store a value under a perceptual hash"""
+        if image_hash in self._entries:
+            self._entries[image_hash] = value
+            self._entries.move_to_end(image_hash)
+            return
+
+        self._entries[image_hash] = value
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            buckets.setdefault((image_hash >> shift) & mask, set()).add(image_hash)
+
+        while len(self._entries) > self.max_entries:
+            oldest, _ = self._entries.popitem(last=False)
+            self._unindex(oldest)
+
+    def _unindex(self, image_hash: int):
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            band = (image_hash >> shift) & mask
+            bucket = buckets.get(band)
+            if bucket is not None:
+                bucket.discard(image_hash)
+                if not bucket:
+                    del buckets[band]
+
+    def find(self, image_hash: int) -> Optional[Tuple[Any, int]]:
+        """
+        Find the closest stored hash within max_distance
+
+        Args:
+            image_hash: Perceptual hash to look up
+
+        Returns:
+            Tuple of (stored value, distance), or None if nothing is close enough
+        """
+        if image_hash in self._entries:
+            self.hits += 1
+            return self._entries[image_hash], 0
+
+        best_hash = None
+        best_distance = self.max_distance + 1
+        for (shift, mask), probes, buckets in zip(self._bands, self._probes, self._buckets):
+            band = (image_hash >> shift) & mask
+            for probe in probes:
+                for candidate in buckets.get(band ^ probe, ()):
+                    distance = (candidate ^ image_hash).bit_count()
+                    if distance < best_distance:
+                        best_hash, best_distance = candidate, distance
+
+        if best_hash is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return self._entries[best_hash], best_distance
+
+    def stats(self) -> dict:
+        """Return index size and hit/miss counters"""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, List, Tuple
+
+import discord
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class ReactionDispatcher:
+    """Schedules message reactions per Discord rate-limit bucket
+
+    The add-reaction route is bucketed on its major parameter, the channel,
+    so each channel gets one sender draining its reactions in order while
+    different channels proceed concurrently. Pacing inside a bucket is left
+    to discord.py's HTTP client, which waits on the real
+    X-RateLimit-Remaining/Reset-After headers and retries 429s, instead of a
+    fixed sleep. Identical pending reactions are coalesced.
+    """
+
+    def __init__(self):
+        # channel id -> pending (message, emoji, future)
+        self._buckets: Dict[int, deque] = {}
+        self._senders: Dict[int, asyncio.Task] = {}
+        # (message id, emoji) -> future of the pending request
+        self._pending: Dict[Tuple[int, str], asyncio.Future] = {}
+
+        # Counters
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+
+    async def add_reactions(self, message, emojis: List[str]) -> List[str]:
+        """
+        Queue reactions for a message and wait until they are applied
+
+        Args:
+            message: Discord message to react to
+            emojis: Emojis in the order they should appear
+
+        Returns:
+            Emojis that were successfully added
+        """
+        futures = [self._submit(message, emoji) for emoji in emojis]
+        results = await asyncio.gather(*futures)
+        return [emoji for emoji, added in zip(emojis, results) if added]
+
+    def _submit(self, message, emoji: str) -> asyncio.Future:
+        key = (message.id, emoji)
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return pending
+
+        future = asyncio.get_event_loop().create_future()
+        self._pending[key] = future
+
+        bucket_id = message.channel.id
+        bucket = self._buckets.setdefault(bucket_id, deque())
+        bucket.append((message, emoji, future))
+
+        if bucket_id not in self._senders:
+            self._senders[bucket_id] = asyncio.create_task(self._drain(bucket_id))
+        return future
+
+    async def _drain(self, bucket_id: int):
+        """Send a bucket's reactions one after another until it is empty"""
+        bucket = self._buckets[bucket_id]
+        try:
+            while bucket:
+                message, emoji, future = bucket[0]
+                added = await self._send(message, emoji)
+                bucket.popleft()
+                del self._pending[(message.id, emoji)]
+                if not future.done():
+                    future.set_result(added)
+        finally:
+            del self._buckets[bucket_id]
+            del self._senders[bucket_id]
+            # Resolve anything left behind if the sender was cancelled
+            for message, emoji, future in bucket:
+                self._pending.pop((message.id, emoji), None)
+                if not future.done():
+                    future.set_result(False)
+
+    async def _send(self, message, emoji: str) -> bool:
+        try:
+            with metrics.timer("reaction"):
+                await message.add_reaction(emoji)
+            self.sent += 1
+            logger.debug(f"Added reaction: {emoji}")
+            return True
+        except discord.HTTPException as e:
+            logger.error(f"Failed to add reaction {emoji}: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error adding reaction {emoji}: {e}")
+        self.failed += 1
+        return False
+
+    def stats(self) -> dict:
+        """Return reaction counters and the number of busy buckets"""
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "active_buckets": len(self._senders),
+            "queued": sum(len(bucket) for bucket in self._buckets.values()),
+        }
+
+    def close(self):
+        """Cancel all senders"""
+        for sender in list(self._senders.values()):
+            sender.cancel()
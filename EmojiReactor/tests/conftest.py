@@ -0,0 +1,14 @@
+import os
+
+# Config() requires these; keep the bot's files and ports out of the way
+os.environ.update({
+    "DISCORD_TOKEN": "test",
+    "OPENAI_API_KEY": "test",
+    "TARGET_CHANNEL_ID": "1",
+    "CHANNEL_ROUTES_PATH": "",
+    "JOURNAL_PATH": "",
+    "CACHE_DB_PATH": "",
+    "METRICS_PORT": "0",
+    "BACKFILL_ON_START": "false",
+    "SYNC_COMMANDS": "false",
+})
@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+from analysis_cache import AnalysisCache
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = AnalysisCache(max_entries=2, ttl=0)
+
+    async def scenario():
+        await cache.set("a", {"v": 1})
+        await cache.set("b", {"v": 2})
+        await cache.get("a")
+        await cache.set("c", {"v": 3})
+        return await cache.get("a"), await cache.get("b"), await cache.get("c")
+
+    assert run(scenario()) == ({"v": 1}, None, {"v": 3})
+    assert cache.evictions == 1
+
+def test_expired_entries_are_misses():
+    cache = AnalysisCache(max_entries=8, ttl=60)
+    cache._remember("old", time.time() - 120, {"v": 1}, 0.0)
+
+    assert run(cache.get("old")) is None
+    assert cache.misses == 1
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    cache = AnalysisCache(max_entries=8, ttl=0, db_path=db_path)
+    run(cache.set("key", {"description": "a dog"}, cost=2.0))
+    cache.close()
+
+    reopened = AnalysisCache(max_entries=8, ttl=0, db_path=db_path)
+    assert run(reopened.get("key")) == {"description": "a dog"}
+    assert reopened.disk_hits == 1
+    assert reopened.saved_seconds == 2.0
+    reopened.close()
+
+def _disk_rows(cache):
+    return cache._db.execute("SELECT key FROM analysis_cache ORDER BY stored_at").fetchall()
+
+def test_sweep_deletes_expired_rows(tmp_path):
+    cache = AnalysisCache(max_entries=8, ttl=60, db_path=str(tmp_path / "cache.db"))
+    cache._db_set("old", time.time() - 120, {"v": 1}, 0.0)
+    cache._db_set("new", time.time(), {"v": 2}, 0.0)
+
+    assert cache.sweep() == 1
+    assert _disk_rows(cache) == [("new",)]
+    cache.close()
+
+def test_sweep_caps_disk_rows_keeping_the_newest(tmp_path):
+    cache = AnalysisCache(max_entries=8, ttl=0, db_path=str(tmp_path / "cache.db"), max_disk_entries=2)
+    now = time.time()
+    for age, key in enumerate(["c", "b", "a"]):
+        cache._db_set(key, now - age, {"key": key}, 0.0)
+
+    assert cache.sweep() == 1
+    assert _disk_rows(cache) == [("b",), ("c",)]
+    assert cache.stats()["disk_evictions"] == 1
+    cache.close()
+
+def test_concurrent_misses_compute_once():
+    cache = AnalysisCache(max_entries=8, ttl=0)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        await cache.set("key", {"v": 1})
+        return {"v": 1}
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(5)))
+
+    assert run(scenario()) == [{"v": 1}] * 5
+    assert len(calls) == 1
+    assert cache.coalesced == 4
+
+def test_waiters_get_none_when_the_computation_fails():
+    cache = AnalysisCache(max_entries=8, ttl=0)
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("api down")
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get_or_compute("key", compute),
+            cache.get_or_compute("key", compute),
+            return_exceptions=True
+        )
+
+    leader, waiter = run(scenario())
+    assert isinstance(leader, RuntimeError)
+    assert waiter is None
+    assert cache._inflight == {}
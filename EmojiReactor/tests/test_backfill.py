@@ -0,0 +1,159 @@
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import discord
+
+from bot import ImageReactionBot
+from job_journal import REACTED, JobJournal
+from utils import PRIORITY_BACKFILL
+
+CHANNEL_ID = 1
+
+class FakeChannel:
+    """Serves a fixed history, optionally failing after it"""
+
+    def __init__(self, messages, error=None):
+        self.id = CHANNEL_ID
+        self.messages = messages
+        self.error = error
+        self.calls = []
+        self.task = None
+
+    async def history(self, **kwargs):
+        self.calls.append(kwargs)
+        self.task = asyncio.current_task()
+        after = kwargs["after"].id
+        for message in self.messages:
+            if message.id > after:
+                yield message
+        if self.error is not None:
+            raise self.error
+
+class FakeIngestQueue:
+    def __init__(self, fail_after=None):
+        self.jobs = []
+        self.fail_after = fail_after
+
+    async def put(self, job):
+        if self.fail_after is not None and len(self.jobs) >= self.fail_after:
+            # Let the history reader fill the page queue first
+            await asyncio.sleep(0.01)
+            raise RuntimeError("ingest queue closed")
+        self.jobs.append(job)
+
+def now_id(offset=0):
+    return discord.utils.time_snowflake(discord.utils.utcnow()) + offset
+
+def message(message_id, author="someone", filename="cat.png", reacted=False):
+    return SimpleNamespace(
+        id=message_id, author=author, guild=None,
+        channel=SimpleNamespace(id=CHANNEL_ID),
+        attachments=[SimpleNamespace(id=message_id, url=f"https://cdn/{message_id}/{filename}", filename=filename)],
+        reactions=[SimpleNamespace(me=True)] if reacted else [],
+    )
+
+def run_backfill(channel, ingest_queue=None, journal=None, skip_ids=frozenset()):
+    """Backfill channel 1 on a bot set up as at startup, returning (queued, bot)"""
+    async def main():
+        bot = ImageReactionBot()
+        await bot.setup_hook()
+        bot.config.BACKFILL_RATE = 0
+        bot.ingest_queue = ingest_queue or FakeIngestQueue()
+        bot.journal = journal
+        bot.get_channel = lambda channel_id: channel
+        try:
+            return await bot.backfill_channel(CHANNEL_ID, skip_ids), bot
+        finally:
+            bot.journal = None
+            await bot.close_pipeline()
+    return asyncio.run(main())
+
+def test_backfill_queues_unreacted_images_oldest_first():
+    base = now_id()
+    channel = FakeChannel([
+        message(base + 1),
+        message(base + 2, reacted=True),
+        message(base + 3, filename="notes.txt"),
+        message(base + 4),
+        message(base + 5),
+    ])
+
+    queued, bot = run_backfill(channel, skip_ids={base + 5})
+
+    assert queued == 2
+    assert [job.message.id for job in bot.ingest_queue.jobs] == [base + 1, base + 4]
+    assert all(job.priority == PRIORITY_BACKFILL for job in bot.ingest_queue.jobs)
+
+def test_backfill_skips_the_bots_own_messages():
+    base = now_id()
+
+    async def scenario():
+        bot = ImageReactionBot()
+        await bot.setup_hook()
+        bot.config.BACKFILL_RATE = 0
+        bot.ingest_queue = FakeIngestQueue()
+        channel = FakeChannel([message(base + 1, author=bot.user), message(base + 2)])
+        bot.get_channel = lambda channel_id: channel
+        try:
+            await bot.backfill_channel(CHANNEL_ID)
+            return [job.message.id for job in bot.ingest_queue.jobs]
+        finally:
+            await bot.close_pipeline()
+
+    assert asyncio.run(scenario()) == [base + 2]
+
+def test_backfill_resumes_after_the_newest_reacted_message(tmp_path):
+    path = str(tmp_path / "journal.db")
+    cursor = now_id(-1000)
+    writer = JobJournal(path, flush_interval=0.01)
+    writer.record(message(cursor), REACTED)
+    writer.close()
+    journal = JobJournal(path)
+    channel = FakeChannel([message(cursor), message(cursor + 1)])
+
+    queued, _ = run_backfill(channel, journal=journal)
+    journal.close()
+
+    assert channel.calls[0]["after"].id == cursor
+    assert queued == 1
+
+def test_backfill_starts_at_max_age_without_a_cursor():
+    channel = FakeChannel([])
+
+    run_backfill(channel)
+
+    started = discord.utils.snowflake_time(channel.calls[0]["after"].id)
+    expected = discord.utils.utcnow() - timedelta(days=1)
+    assert abs(started - expected) < timedelta(minutes=1)
+
+def test_history_errors_end_the_scan_with_what_was_read():
+    base = now_id()
+    error = discord.HTTPException(SimpleNamespace(status=403, reason="Forbidden"), "Missing Access")
+    channel = FakeChannel([message(base + 1), message(base + 2)], error=error)
+
+    queued, _ = run_backfill(channel)
+
+    assert queued == 2
+
+def test_history_reader_stops_when_the_scan_fails_with_a_full_page_queue():
+    base = now_id()
+    channel = FakeChannel([message(base + index) for index in range(1, 300)])
+
+    async def main():
+        bot = ImageReactionBot()
+        await bot.setup_hook()
+        bot.config.BACKFILL_RATE = 0
+        bot.ingest_queue = FakeIngestQueue(fail_after=0)
+        bot.get_channel = lambda channel_id: channel
+        try:
+            try:
+                await bot.backfill_channel(CHANNEL_ID)
+            except RuntimeError:
+                pass
+            await asyncio.wait([channel.task], timeout=1)
+            return channel.task.done()
+        finally:
+            await bot.close_pipeline()
+
+    assert asyncio.run(main())
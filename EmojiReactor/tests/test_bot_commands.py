@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from bot import ImageReactionBot
+from metrics import metrics
+
+class FakeContext:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, embed=None):
+        self.sent.append(content if embed is None else embed)
+
+def run_with_bot(scenario):
+    """Run scenario(bot) against a bot set up as at startup, without logging in"""
+    async def main():
+        bot = ImageReactionBot()
+        await bot.setup_hook()
+        try:
+            return await scenario(bot)
+        finally:
+            await bot.close_pipeline()
+    return asyncio.run(main())
+
+async def invoke(bot, name):
+    command = bot.get_command(name)
+    ctx = FakeContext()
+    await command.callback(command.cog, ctx)
+    return ctx.sent
+
+@pytest.mark.parametrize("name", ["status", "stats", "backfill", "reload", "test"])
+def test_setup_registers_text_and_slash_commands(name):
+    async def scenario(bot):
+        return bot.get_command(name), bot.tree.get_command(name)
+
+    text_command, slash_command = run_with_bot(scenario)
+    assert text_command is not None
+    assert slash_command is not None
+
+def test_stats_reports_stage_latencies():
+    metrics.observe("download", 0.25)
+
+    async def scenario(bot):
+        return await invoke(bot, "stats")
+
+    [embed] = run_with_bot(scenario)
+    latency = embed.fields[0]
+    assert embed.title == "Pipeline Stats"
+    assert latency.name == "Latency"
+    assert "download" in latency.value
+    assert "250ms" in latency.value
+
+def test_backfill_refuses_to_start_twice():
+    async def scenario(bot):
+        # Keep the first scan running while the command is sent again
+        bot.backfill_task = asyncio.get_running_loop().create_future()
+        replies = await invoke(bot, "backfill")
+        bot.backfill_task.cancel()
+        return replies
+
+    assert run_with_bot(scenario) == ["⏳ A backfill is already running"]
+
+def test_reload_applies_the_routing_file_and_keeps_routes_when_invalid(tmp_path, monkeypatch):
+    routes = tmp_path / "routes.json"
+    routes.write_text('{"channels": {"2": {}}}')
+    monkeypatch.setenv("CHANNEL_ROUTES_PATH", str(routes))
+
+    async def scenario(bot):
+        routes.write_text('{"channels": {"2": {}, "3": {}}, "guilds": {"9": {}}}')
+        replies = await invoke(bot, "reload")
+        routes.write_text("{not json")
+        replies += await invoke(bot, "reload")
+        return replies, bot.router.route(3)
+
+    replies, policy = run_with_bot(scenario)
+    assert replies == [
+        "🔁 Routes reloaded: 3 channel(s), 1 guild(s)",
+        "⚠️ Routing file is invalid, keeping the previous routes",
+    ]
+    assert policy is not None
@@ -0,0 +1,49 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from channel_router import ChannelPolicy, ChannelRouter
+
+def write_routes(path, data):
+    path.write_text(json.dumps(data))
+    return str(path)
+
+def message(channel_id, guild_id=None):
+    guild = SimpleNamespace(id=guild_id) if guild_id is not None else None
+    return SimpleNamespace(channel=SimpleNamespace(id=channel_id), guild=guild)
+
+def test_channel_ids_use_the_default_policy():
+    default = ChannelPolicy(max_emojis=3)
+    router = ChannelRouter(default, channel_ids=[1, 2])
+    assert router.route(1) is default
+    assert router.route(3) is None
+
+def test_file_overrides_channels_and_covers_guilds(tmp_path):
+    path = write_routes(tmp_path / "routes.json", {
+        "defaults": {"max_emojis": 4},
+        "channels": {"1": {"weight": 2}, "2": {"enabled": False}},
+        "guilds": {"9": {"analysis_mode": "structured"}},
+    })
+    router = ChannelRouter(ChannelPolicy(), channel_ids=[2, 3], path=path)
+
+    assert (router.route(1).max_emojis, router.route(1).weight) == (4, 2)
+    assert router.route(2) is None
+    assert router.route(3).max_emojis == 4
+    assert router.route_message(message(5, guild_id=9)).analysis_mode == "structured"
+    assert router.route_message(message(5)) is None
+    assert router.disabled == 1
+
+def test_invalid_reload_keeps_the_previous_routes(tmp_path):
+    routes = tmp_path / "routes.json"
+    router = ChannelRouter(ChannelPolicy(), path=write_routes(routes, {"channels": {"1": {}}}))
+
+    routes.write_text('{"channels": {"1": {"max_emojis": "many"}}}')
+    assert not router.reload()
+    assert router.route(1) is not None
+
+def test_invalid_policies_are_rejected():
+    with pytest.raises(ValueError):
+        ChannelPolicy(analysis_mode="poetry")
+    with pytest.raises(ValueError):
+        ChannelPolicy().with_overrides({"colour": "red"})
@@ -0,0 +1,72 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+def make_breaker():
+    return CircuitBreaker(window=4, min_calls=4, failure_rate=0.5, slow_call_seconds=10,
+                          open_seconds=30, half_open_probes=2)
+
+def trip(breaker):
+    for success in (True, True, False, False):
+        breaker.record(success, 1.0)
+
+def test_stays_closed_until_min_calls_are_known(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record(False, 1.0)
+    assert breaker.state == CLOSED
+    breaker.record(True, 1.0)
+    assert breaker.state == OPEN
+
+def test_slow_calls_count_as_bad(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(True, 12.0)
+    assert breaker.state == OPEN
+
+def test_open_rejects_until_open_seconds_have_passed(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    assert not breaker.allow()
+    clock[0] += 31
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert breaker.stats()["rejected"] == 1
+
+def test_half_open_limits_probes_and_closes_after_they_pass(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock[0] += 31
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record(True, 1.0)
+    assert breaker.state == HALF_OPEN
+    breaker.record(True, 1.0)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["bad_rate"] == 0.0
+
+def test_a_bad_probe_opens_again(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock[0] += 31
+    breaker.allow()
+    breaker.record(False, 1.0)
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+
+def test_lost_probes_do_not_hold_it_half_open(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock[0] += 31
+    breaker.allow()
+    breaker.allow()
+    clock[0] += 31
+    assert breaker.allow()
@@ -0,0 +1,63 @@
+from emoji_mapper import EmojiMapper
+from emoji_scorer import EmojiScorer
+
+def make_scorer():
+    return EmojiScorer({
+        "dog": ["🐶", "🐕"],
+        "cat": ["🐱", "🐶"],
+        "sun": ["☀️"],
+    })
+
+def test_first_emoji_of_a_row_ranks_highest():
+    scorer = make_scorer()
+    assert scorer.score([scorer.row_index("dog")], [1.0], top_k=2) == ["🐶", "🐕"]
+
+def test_rows_add_up_across_matches():
+    scorer = make_scorer()
+    rows = [scorer.row_index("cat"), scorer.row_index("dog")]
+    # 🐶 gets 0.3 from cat and 1.0 from dog, ahead of 🐱 (1.0)
+    assert scorer.score(rows, [1.0, 1.0], top_k=3) == ["🐶", "🐱", "🐕"]
+
+def test_ties_are_broken_by_registration_order():
+    scorer = make_scorer()
+    rows = [scorer.row_index("sun"), scorer.row_index("dog")]
+    assert scorer.score(rows, [1.0, 1.0], top_k=2) == ["🐶", "☀️"]
+
+def test_diversity_is_reproducible_for_a_seed():
+    scorer = make_scorer()
+    rows = [scorer.row_index(key) for key in ("dog", "cat", "sun")]
+    weights = [1.0, 1.0, 1.0]
+    picks = scorer.score(rows, weights, top_k=3, diversity=2.0, seed=42)
+    assert picks == scorer.score(rows, weights, top_k=3, diversity=2.0, seed=42)
+    assert sorted(picks) == sorted(scorer.score(rows, weights, top_k=3))
+
+def test_empty_input_and_unknown_keys():
+    scorer = make_scorer()
+    assert scorer.score([], [], top_k=3) == []
+    assert scorer.score([0], [1.0], top_k=0) == []
+    assert scorer.row_index("bird") is None
+    assert len(scorer) == 3
+
+def test_rows_are_updated_in_place():
+    scorer = make_scorer()
+    cat = scorer.row_index("cat")
+
+    scorer.set_row("cat", ["😺"])
+    scorer.set_row("bird", ["🐦"])
+    scorer.remove_row("dog")
+
+    assert scorer.row_index("cat") == cat
+    assert scorer.score([cat], [1.0], top_k=3) == ["😺"]
+    assert scorer.score([scorer.row_index("bird")], [1.0], top_k=3) == ["🐦"]
+    assert scorer.row_index("dog") is None
+    assert len(scorer) == 3
+
+def test_mapper_updates_its_scorer_instead_of_rebuilding():
+    mapper = EmojiMapper()
+    scorer = mapper.scorer
+
+    mapper.add_custom_mapping("Pikachu", ["⚡"])
+    assert mapper.get_emojis_for_content("a pikachu", 1) == ["⚡"]
+    mapper.remove_mapping("pikachu")
+    assert mapper.get_emojis_for_content("a pikachu", 1) != ["⚡"]
+    assert mapper.scorer is scorer
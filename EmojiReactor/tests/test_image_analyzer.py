@@ -0,0 +1,201 @@
+import asyncio
+import base64
+import io
+import json
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from PIL import Image
+
+from circuit_breaker import CLOSED, HALF_OPEN
+from image_analyzer import ImageAnalyzer
+from metrics import metrics
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+class FakeRawResponse:
+    headers = {}
+
+    def __init__(self, content=None):
+        self.content = content
+
+    def parse(self):
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=message)])
+
+class FakeCompletions:
+    """Stands in for client.chat.completions.with_raw_response"""
+
+    def __init__(self, *outcomes, delay=0.0):
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(self.delay)
+        outcome = self.outcomes.pop(0) if self.outcomes else FakeRawResponse()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def make_analyzer(completions):
+    analyzer = ImageAnalyzer()
+    analyzer.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(with_raw_response=completions)))
+    analyzer.config.OPENAI_RETRY_BASE_DELAY = 0
+    return analyzer
+
+def connection_error():
+    return openai.APIConnectionError(request=REQUEST)
+
+def test_non_retryable_status_errors_count_against_the_breaker():
+    completions = FakeCompletions(openai.BadRequestError(
+        "bad image", response=httpx.Response(400, request=REQUEST), body=None
+    ))
+    analyzer = make_analyzer(completions)
+
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(analyzer._create_completion(model="gpt-4o", messages=[]))
+    assert len(completions.calls) == 1
+    assert analyzer.circuit_breaker.stats()["bad_rate"] == 1.0
+
+def test_retries_while_closed():
+    completions = FakeCompletions(connection_error(), FakeRawResponse())
+    analyzer = make_analyzer(completions)
+
+    asyncio.run(analyzer._create_completion(model="gpt-4o", messages=[]))
+    assert len(completions.calls) == 2
+
+def test_half_open_probe_is_not_retried():
+    completions = FakeCompletions(connection_error(), FakeRawResponse())
+    analyzer = make_analyzer(completions)
+    analyzer.circuit_breaker.state = HALF_OPEN
+
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(analyzer._create_completion(model="gpt-4o", messages=[]))
+    assert len(completions.calls) == 1
+
+@pytest.mark.parametrize("state, requests", [(CLOSED, 2), (HALF_OPEN, 1)])
+def test_slow_requests_are_only_hedged_while_closed(state, requests):
+    completions = FakeCompletions(delay=0.05)
+    analyzer = make_analyzer(completions)
+    analyzer.config.HEDGE_DELAY_MS = 1
+    analyzer.circuit_breaker.state = state
+
+    asyncio.run(analyzer._hedged_completion(0, dict(model="gpt-4o", messages=[]), dict(model="gpt-4o-mini", messages=[])))
+    assert len(completions.calls) == requests
+    assert analyzer.hedged == requests - 1
+
+class ModelLatencyCompletions(FakeCompletions):
+    """Answers each model after the next of its delays"""
+
+    def __init__(self, delays):
+        super().__init__()
+        self.delays = {model: list(values) for model, values in delays.items()}
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(self.delays[kwargs["model"]].pop(0))
+        return FakeRawResponse()
+
+def test_hedge_wins_keep_the_slow_primary_in_the_hedge_delay():
+    primary, hedge = "test-primary", "test-hedge"
+    # One in five primary requests is slow, from the warm-up on. The p90 is
+    # interpolated to the middle of the slow time's (0.130, 0.195] bucket, which
+    # leaves the hedge about 20 ms to answer first and the sleep room to overshoot.
+    pattern = [0.001] * 4 + [0.183]
+    warmup = pattern * 4
+    rounds = pattern * 6
+    completions = ModelLatencyCompletions({primary: warmup + rounds, hedge: [0.001] * len(rounds)})
+    analyzer = make_analyzer(completions)
+    analyzer.config.HEDGE_DELAY_MS = 0
+    analyzer.config.HEDGE_MIN_DELAY_MS = 1
+    metrics.models.pop(primary, None)
+    metrics.tokens.pop(primary, None)
+
+    async def scenario():
+        for _ in warmup:
+            await analyzer._create_completion(model=primary, messages=[])
+        initial = analyzer.hedge_delay(primary)
+        for _ in rounds:
+            await analyzer._hedged_completion(0, dict(model=primary, messages=[]), dict(model=hedge, messages=[]))
+        return initial
+
+    initial = asyncio.run(scenario())
+    assert analyzer.hedge_delay(primary) > initial / 2 > analyzer.config.HEDGE_MIN_DELAY_MS / 1000
+    assert analyzer.hedge_wins
+    assert metrics.tokens[primary][0] == len(warmup) + len(rounds)
+
+def png(side):
+    output = io.BytesIO()
+    Image.effect_noise((side, side), 128).convert("RGB").save(output, format="PNG")
+    return output.getvalue()
+
+class FakeBatchCompletions(FakeCompletions):
+    """Labels every image of a batch request with its route"""
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = kwargs["messages"][1]["content"]
+        numbers = [int(part["text"].split()[1].rstrip(":")) for part in content[1:] if part["type"] == "text"]
+        detail = next(part["image_url"]["detail"] for part in content if part["type"] == "image_url")
+        results = [
+            {"image": number, "tags": [kwargs["model"], detail], "sentiment": "neutral", "emojis": []}
+            for number in numbers
+        ]
+        return FakeRawResponse(json.dumps({"results": results}))
+
+def test_batches_are_split_by_the_route_of_each_image():
+    completions = FakeBatchCompletions()
+    analyzer = make_analyzer(completions)
+    analyzer.config.SMALL_IMAGE_MODEL = "gpt-4o-mini"
+    analyzer.config.SMALL_IMAGE_MAX_SIDE = 256
+    analyzer.detail = "high"
+    small, large = png(64), png(600)
+
+    results = asyncio.run(analyzer.analyze_images_batch([small, large, small, large]))
+
+    assert sorted(call["model"] for call in completions.calls) == ["gpt-4o", "gpt-4o-mini"]
+    assert [result["tags"] for result in results] == [
+        ["gpt-4o-mini", "low"], ["gpt-4o", "high"], ["gpt-4o-mini", "low"], ["gpt-4o", "high"],
+    ]
+
+def test_images_within_the_limits_are_sent_as_is():
+    data = png(64)
+    url = asyncio.run(make_analyzer(FakeCompletions()).prepare_image(bytearray(data), detail="high"))
+    assert url == "data:image/png;base64," + base64.b64encode(data).decode("ascii")
+
+VALID = {"tags": [" Cat ", "sofa", ""], "sentiment": "positive", "emojis": ["🐱", " 😺 "]}
+
+def test_structured_analysis_is_normalized():
+    assert ImageAnalyzer.validate_structured_analysis(VALID) == {
+        "tags": ["cat", "sofa"], "sentiment": "positive", "emojis": ["🐱", "😺"],
+    }
+
+@pytest.mark.parametrize("data", [
+    None,
+    [VALID],
+    {key: value for key, value in VALID.items() if key != "tags"},
+    {key: value for key, value in VALID.items() if key != "sentiment"},
+    {key: value for key, value in VALID.items() if key != "emojis"},
+    {**VALID, "tags": "cat"},
+    {**VALID, "emojis": [1, 2]},
+    {**VALID, "sentiment": "ecstatic"},
+])
+def test_structured_analysis_not_matching_the_schema_is_rejected(data):
+    assert ImageAnalyzer.validate_structured_analysis(data) is None
+
+def test_emoji_names_are_dropped_from_structured_analysis():
+    data = {**VALID, "emojis": ["cat", ":smile:", "🐱", "thumbs up", "1️⃣", "🇫🇷"]}
+    assert ImageAnalyzer.validate_structured_analysis(data)["emojis"] == ["🐱", "1️⃣", "🇫🇷"]
+
+@pytest.mark.parametrize("content", ["not json", '{"tags": ["cat"]}', "null"])
+def test_malformed_structured_responses_give_no_analysis(content):
+    analyzer = make_analyzer(FakeCompletions(FakeRawResponse(content)))
+    assert asyncio.run(analyzer.analyze_image_structured(png(64))) is None
+
+def test_malformed_batch_responses_give_no_analyses():
+    analyzer = make_analyzer(FakeCompletions(FakeRawResponse("{truncated")))
+    assert asyncio.run(analyzer.analyze_images_batch([png(64), png(64)])) == [None, None]
@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from channel_router import ChannelPolicy
+from ingest_queue import DEGRADE, DROP_NEWEST, DROP_OLDEST, IngestJob, IngestQueue
+
+def job(channel_id, message_id=0, weight=1):
+    message = SimpleNamespace(id=message_id, channel=SimpleNamespace(id=channel_id))
+    return IngestJob(message, [], ChannelPolicy(weight=weight))
+
+def drain(queue):
+    async def take_all():
+        return [(await queue.get()).message.id for _ in range(len(queue))]
+    return asyncio.run(take_all())
+
+def test_channels_are_served_round_robin():
+    queue = IngestQueue(max_depth=10)
+    for message_id in (1, 2, 3):
+        queue.put_nowait(job(100, message_id))
+    queue.put_nowait(job(200, 4))
+    assert drain(queue) == [1, 4, 2, 3]
+
+def test_weighted_channels_get_more_jobs_per_turn():
+    queue = IngestQueue(max_depth=10)
+    for message_id in (1, 2, 3):
+        queue.put_nowait(job(100, message_id, weight=2))
+    for message_id in (4, 5):
+        queue.put_nowait(job(200, message_id))
+    assert drain(queue) == [1, 2, 4, 3, 5]
+
+def test_drop_oldest_evicts_from_the_busiest_channel():
+    queue = IngestQueue(max_depth=3, policy=DROP_OLDEST)
+    queue.put_nowait(job(100, 1))
+    queue.put_nowait(job(200, 2))
+    queue.put_nowait(job(200, 3))
+
+    evicted = queue.put_nowait(job(100, 4))
+
+    assert evicted.message.id == 2
+    assert queue.stats()["dropped"] == 1
+    assert sorted(drain(queue)) == [1, 3, 4]
+
+@pytest.mark.parametrize("policy, counter", [(DROP_NEWEST, "dropped"), (DEGRADE, "degraded")])
+def test_full_queue_hands_back_the_incoming_job(policy, counter):
+    queue = IngestQueue(max_depth=1, policy=policy)
+    queue.put_nowait(job(100, 1))
+
+    rejected = queue.put_nowait(job(100, 2))
+
+    assert rejected.message.id == 2
+    assert queue.stats()[counter] == 1
+    assert drain(queue) == [1]
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        IngestQueue(policy="drop_all")
+
+def test_put_waits_for_a_free_slot():
+    async def scenario():
+        queue = IngestQueue(max_depth=1)
+        await queue.put(job(100, 1))
+        blocked = asyncio.create_task(queue.put(job(100, 2)))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+        first = await queue.get()
+        await blocked
+        second = await queue.get()
+        return first.message.id, second.message.id
+
+    assert asyncio.run(scenario()) == (1, 2)
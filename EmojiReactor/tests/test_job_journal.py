@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import pytest
+
+from job_journal import ANALYZED, DOWNLOADED, DROPPED, FAILED, RECEIVED, REACTED, JobJournal
+
+def message(message_id, channel_id=10, guild_id=None):
+    guild = SimpleNamespace(id=guild_id) if guild_id is not None else None
+    return SimpleNamespace(id=message_id, channel=SimpleNamespace(id=channel_id), guild=guild)
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "journal.db")
+
+def record_all(path, events):
+    journal = JobJournal(path, flush_interval=0.01)
+    for msg, state in events:
+        journal.record(msg, state)
+    journal.close()
+
+def test_replay_lists_unfinished_and_failed_jobs_with_their_last_state(path):
+    record_all(path, [
+        (message(1), RECEIVED),
+        (message(2, guild_id=5), RECEIVED), (message(2, guild_id=5), DOWNLOADED),
+        (message(3), RECEIVED), (message(3), ANALYZED), (message(3), FAILED),
+        (message(4), RECEIVED), (message(4), REACTED),
+        (message(5), RECEIVED), (message(5), DROPPED),
+    ])
+
+    journal = JobJournal(path)
+    jobs = journal.unfinished()
+    journal.close()
+
+    assert jobs == [
+        {"message_id": 1, "channel_id": 10, "guild_id": None, "state": RECEIVED},
+        {"message_id": 2, "channel_id": 10, "guild_id": 5, "state": DOWNLOADED},
+        {"message_id": 3, "channel_id": 10, "guild_id": None, "state": FAILED},
+    ]
+
+def test_a_failed_job_that_reacts_on_replay_is_done(path):
+    record_all(path, [(message(1), RECEIVED), (message(1), FAILED), (message(1), REACTED)])
+
+    journal = JobJournal(path)
+    assert journal.unfinished() == []
+    journal.close()
+
+def test_jobs_older_than_max_age_are_not_replayed(path):
+    record_all(path, [(message(1), RECEIVED)])
+
+    journal = JobJournal(path)
+    assert journal.unfinished(max_age=-1) == []
+    journal.close()
+
+def test_compact_keeps_only_unfinished_jobs(path):
+    record_all(path, [(message(1), RECEIVED), (message(2), RECEIVED), (message(2), REACTED)])
+
+    journal = JobJournal(path)
+    journal.compact()
+    count = journal._db.execute("SELECT COUNT(DISTINCT message_id) FROM job_events").fetchone()[0]
+    journal.close()
+    assert count == 1
+
+def test_cursor_tracks_the_newest_reacted_message_per_channel(path):
+    record_all(path, [
+        (message(7, channel_id=1), REACTED),
+        (message(5, channel_id=1), REACTED),
+        (message(9, channel_id=1), FAILED),
+        (message(3, channel_id=2), REACTED),
+    ])
+
+    journal = JobJournal(path)
+    assert journal.last_reacted(1) == 7
+    assert journal.last_reacted(2) == 3
+    assert journal.last_reacted(3) is None
+    journal.close()
@@ -0,0 +1,73 @@
+import random
+
+from keyword_matcher import KeywordMatcher
+
+def naive_find_all(keywords, text):
+    """Every boundary-respecting occurrence of the registered (label, keyword) pairs"""
+    matcher = KeywordMatcher()
+    matches = []
+    for label, keyword in keywords:
+        start = text.find(keyword)
+        while start != -1:
+            if matcher._is_boundary(text, start, start + len(keyword)):
+                matches.append((label, keyword, start))
+            start = text.find(keyword, start + 1)
+    return sorted(matches)
+
+def node_strings(matcher):
+    strings = {0: ""}
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        for char, child in matcher._goto[node].items():
+            strings[child] = strings[node] + char
+            stack.append(child)
+    return strings
+
+def assert_links_are_exact(matcher):
+    strings = node_strings(matcher)
+    nodes = {string: node for node, string in strings.items()}
+    for node, string in strings.items():
+        if not node:
+            continue
+        fail = next(nodes[string[i:]] for i in range(1, len(string) + 1) if string[i:] in nodes)
+        assert matcher._fail[node] == fail, string
+        assert node in matcher._fail_children[fail]
+        link = fail
+        while link and not matcher._outputs[link]:
+            link = matcher._fail[link]
+        assert matcher._output_link[node] == link, string
+
+def test_matches_whole_words_and_plurals():
+    matcher = KeywordMatcher()
+    matcher.add("cat", "mapping")
+    matcher.add("happy", "positive")
+    found = matcher.find_all("happy cats, no category")
+    assert sorted(found) == [("mapping", "cat", 6), ("positive", "happy", 0)]
+
+def test_removed_keywords_stop_matching():
+    matcher = KeywordMatcher()
+    matcher.add("sun", "mapping")
+    matcher.add("sunset", "mapping")
+    matcher.remove("sunset", "mapping")
+    assert matcher.find_all("sunset sun") == [("mapping", "sun", 7)]
+
+def test_incremental_updates_match_a_fresh_automaton():
+    rng = random.Random(7)
+    matcher = KeywordMatcher()
+    keywords = set()
+    for step in range(600):
+        keyword = "".join(rng.choice("ab") for _ in range(rng.randint(1, 6)))
+        label = rng.choice(("x", "y"))
+        if keywords and rng.random() < 0.3:
+            label, keyword = rng.choice(sorted(keywords))
+            matcher.remove(keyword, label)
+            keywords.discard((label, keyword))
+        else:
+            matcher.add(keyword, label)
+            keywords.add((label, keyword))
+
+        if step % 20 == 0:
+            assert_links_are_exact(matcher)
+            text = " ".join("".join(rng.choice("ab") for _ in range(rng.randint(1, 8))) for _ in range(20))
+            assert sorted(matcher.find_all(text)) == naive_find_all(keywords, text)
@@ -0,0 +1,76 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from local_classifier import HeuristicClassifier, LocalClassifier, load_classifier
+
+def test_base_class_and_incomplete_subclasses_cannot_be_instantiated():
+    class Incomplete(LocalClassifier):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        LocalClassifier()
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_heuristic_recognizes_a_flat_phone_screenshot():
+    output = io.BytesIO()
+    Image.new("RGB", (1080, 2340), "white").save(output, format="PNG")
+
+    result = load_classifier("heuristic").classify(output.getvalue())
+
+    assert isinstance(load_classifier("heuristic"), HeuristicClassifier)
+    assert result["label"] == "screenshot"
+    assert result["tags"] == ["screenshot", "phone"]
+
+PHONE = (1080, 2340)
+
+def game_screenshot():
+    """A catch screen: UI bars around a rendered scene with a shaded creature on textured grass"""
+    width, height = PHONE
+    img = Image.new("RGB", PHONE)
+    draw = ImageDraw.Draw(img)
+    for y in range(height):
+        t = y / height
+        draw.line([(0, y), (width, y)], fill=(int(90 + 100 * t), int(160 + 60 * t * (1 - t)), int(230 - 180 * t)))
+    grass = Image.effect_noise((width // 4, height // 8), 40).convert("L").resize((width, height // 2))
+    img.paste(Image.merge("RGB", (
+        grass.point(lambda value: value // 3),
+        grass.point(lambda value: 80 + value // 2),
+        grass.point(lambda value: value // 4),
+    )), (0, height // 2))
+    for radius in range(300, 0, -6):
+        shade = int(255 - radius * 0.5)
+        draw.ellipse((width // 2 - radius, height // 2 - radius - 200, width // 2 + radius, height // 2 + radius - 200),
+                     fill=(shade, int(shade * 0.8), 40))
+    draw.rectangle((0, 0, width, 140), fill=(30, 30, 30))
+    draw.ellipse((width // 2 - 120, height - 400, width // 2 + 120, height - 160), fill=(230, 40, 40))
+    draw.rectangle((0, height - 100, width, height), fill=(250, 250, 250))
+    output = io.BytesIO()
+    img.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+def chat_screenshot():
+    """A messaging app: alternating chat bubbles with text"""
+    img = Image.new("RGB", PHONE, "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, PHONE[0], 160), fill=(240, 240, 245))
+    for index in range(12):
+        x, y = (40 if index % 2 else 400), 220 + index * 170
+        draw.rounded_rectangle((x, y, x + 640, y + 130), 30, fill=(230, 230, 235) if index % 2 else (0, 120, 255))
+        for line in range(3):
+            draw.text((x + 30, y + 20 + line * 30), "see you at the raid at six", fill="black")
+    output = io.BytesIO()
+    img.save(output, format="PNG")
+    return output.getvalue()
+
+def test_game_screenshots_are_left_to_the_vision_api():
+    result = HeuristicClassifier().classify(game_screenshot())
+    assert result["label"] == "screenshot"
+    assert result["confidence"] < 0.5
+
+def test_ui_screenshots_are_labelled_confidently():
+    result = HeuristicClassifier().classify(chat_screenshot())
+    assert result["tags"] == ["screenshot", "phone"]
+    assert result["confidence"] >= 0.85
@@ -0,0 +1,91 @@
+import json
+import logging
+import random
+import sys
+
+import pytest
+
+import utils
+from utils import JsonFormatter, SamplingFilter, parse_sample_rates, setup_logging
+
+def record(level=logging.INFO, name="bot", lineno=10, message="hello %s", args=("world",), exc_info=None):
+    return logging.LogRecord(name, level, "/src/bot.py", lineno, message, args, exc_info)
+
+def test_json_lines_carry_the_record_fields():
+    entry = json.loads(JsonFormatter().format(record()))
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "bot"
+    assert entry["message"] == "hello world"
+    assert entry["location"] == "bot:10"
+    assert entry["time"]
+    assert "exception" not in entry and "suppressed" not in entry
+
+def test_json_lines_include_the_traceback():
+    try:
+        raise ValueError("bad image")
+    except ValueError:
+        line = JsonFormatter().format(record(logging.ERROR, exc_info=sys.exc_info()))
+    entry = json.loads(line)
+    assert "\n" not in line
+    assert entry["exception"].startswith("Traceback")
+    assert "ValueError: bad image" in entry["exception"]
+
+def test_sampling_keeps_the_configured_fraction(monkeypatch):
+    monkeypatch.setattr(utils.random, "random", random.Random(1).random)
+    sampler = SamplingFilter(sample_rates={"noisy": 0.25})
+
+    kept = sum(sampler.filter(record(name="noisy")) for _ in range(4000))
+    assert 900 < kept < 1100
+    assert all(sampler.filter(record(name="quiet")) for _ in range(100))
+
+@pytest.mark.parametrize("level", [logging.WARNING, logging.ERROR, logging.CRITICAL])
+def test_warnings_and_above_always_pass(level):
+    sampler = SamplingFilter(rate_limit=1, sample_rates={"noisy": 0.0})
+    assert all(sampler.filter(record(level, name="noisy")) for _ in range(50))
+
+def test_rate_limit_reports_what_it_suppressed(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(utils.time, "monotonic", lambda: now[0])
+    sampler = SamplingFilter(rate_limit=3)
+
+    assert [sampler.filter(record()) for _ in range(10)] == [True] * 3 + [False] * 7
+    # Other call sites have their own budget
+    assert sampler.filter(record(lineno=11))
+
+    now[0] += 1.0
+    next_record = record()
+    assert sampler.filter(next_record)
+    assert next_record.suppressed == 7
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("discord=0.1, bot = 0.5,,broken") == {"discord": 0.1, "bot": 0.5}
+
+@pytest.fixture
+def root_logger():
+    """Restore the root logger's handlers and level that setup_logging replaces"""
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+def test_listener_writes_json_lines_and_stops_cleanly(tmp_path, root_logger):
+    log_file = tmp_path / "bot.log"
+    listener = setup_logging("DEBUG", str(log_file), json_format=True)
+    logger = logging.getLogger("emojireactor.test")
+    for index in range(100):
+        logger.info(f"message {index}")
+
+    listener.stop()
+
+    assert listener._thread is None
+    lines = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+    assert [line["message"] for line in lines] == [f"message {index}" for index in range(100)]
+    # Records logged after stop() stay on the queue instead of blocking
+    logger.info("after stop")
+    assert len(log_file.read_text(encoding="utf-8").splitlines()) == 100
+    for handler in listener.handlers:
+        handler.close()
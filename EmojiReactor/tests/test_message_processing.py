@@ -0,0 +1,172 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot import ImageReactionBot
+from ingest_queue import DEGRADE, IngestQueue
+from job_journal import FAILED, REACTED
+from utils import DownloadError
+
+class FakeJournal:
+    def __init__(self):
+        self.events = []
+
+    def record(self, message, state, detail=None):
+        self.events.append((message.id, state))
+
+    def close(self):
+        pass
+
+class FakeDownloader:
+    """Answers each attachment URL with its entry of outcomes"""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+
+    async def download(self, url, expected_size=None):
+        outcome = self.outcomes[url]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def stats(self):
+        return {}
+
+def message(*urls, embeds=()):
+    attachments = [SimpleNamespace(id=index, url=url, filename=f"{url}.png", size=10) for index, url in enumerate(urls)]
+    return SimpleNamespace(id=7, channel=SimpleNamespace(id=1), guild=None, attachments=attachments,
+                           embeds=list(embeds), reactions=[])
+
+def embed(url, kind="image", field="thumbnail"):
+    """A link preview (kind "image", URL in the thumbnail) or a rich embed with an image"""
+    media = {"image": SimpleNamespace(url=None), "thumbnail": SimpleNamespace(url=None)}
+    media[field] = SimpleNamespace(url=url)
+    return SimpleNamespace(type=kind, image=media["image"], thumbnail=media["thumbnail"])
+
+def process(message, outcomes):
+    """Run process_message_images on a bot set up as at startup, returning the journal events"""
+    async def main():
+        bot = ImageReactionBot()
+        await bot.setup_hook()
+        bot.journal = FakeJournal()
+        bot.downloader = FakeDownloader(outcomes)
+        try:
+            await bot.process_message_images(message, message.attachments, bot.router.default_policy)
+            return bot.journal.events
+        finally:
+            await bot.close_pipeline()
+    return asyncio.run(main())
+
+def test_rejected_files_finish_the_job_without_reactions():
+    assert process(message("big"), {"big": None}) == [(7, REACTED)]
+
+def test_failed_downloads_leave_the_job_for_replay():
+    events = process(message("big", "flaky"), {"big": None, "flaky": DownloadError("timeout")})
+    assert events == [(7, FAILED)]
+
+def test_degraded_reactions_are_tracked_until_done():
+    async def main():
+        bot = ImageReactionBot()
+        await bot.setup_hook()
+        # Workers keep waiting on the original queue
+        bot.ingest_queue = IngestQueue(max_depth=1, policy=DEGRADE)
+        reacted = []
+
+        async def add_reactions(message, emojis):
+            reacted.append(message.id)
+            return emojis
+
+        bot.add_reactions = add_reactions
+        try:
+            for message_id in (1, 2):
+                msg = message("cat")
+                msg.id = message_id
+                bot.enqueue_images(msg, msg.attachments, bot.router.default_policy)
+            tracked = len(bot.degraded_tasks)
+            await asyncio.gather(*bot.degraded_tasks)
+            await asyncio.sleep(0)
+            return tracked, len(bot.degraded_tasks), reacted
+        finally:
+            await bot.close_pipeline()
+
+    tracked, remaining, reacted = asyncio.run(main())
+    assert tracked == 1
+    assert remaining == 0
+    assert len(reacted) == 1
+
+def images_of(msg):
+    async def main():
+        bot = ImageReactionBot()
+        return [image.url for image in bot.get_image_attachments(msg)]
+    return asyncio.run(main())
+
+def test_images_come_from_attachments_then_embeds_each_once():
+    msg = message("https://cdn/a.png?ex=1", "https://cdn/b.jpg", embeds=[
+        embed("https://cdn/a.png?ex=2"),
+        embed("https://img/c.gif"),
+        embed("https://img/d.png", kind="rich", field="image"),
+        embed("https://site/article", kind="article"),
+        embed("https://img/c.gif"),
+    ])
+    msg.attachments.append(SimpleNamespace(id=9, url="https://cdn/notes.txt", filename="notes.txt", size=10))
+
+    assert images_of(msg) == ["https://cdn/a.png?ex=1", "https://cdn/b.jpg", "https://img/c.gif", "https://img/d.png"]
+
+def test_images_are_capped_per_message():
+    urls = [f"https://cdn/{index}" for index in range(15)]
+    assert images_of(message(*urls)) == urls[:10]
+
+def test_reactions_keep_attachment_order_without_duplicates():
+    # Later attachments finish first
+    results = {"a": (0.03, ["🐱", "🌞"]), "b": (0.0, ["🌞", "🐶"]), "c": (0.01, None)}
+
+    async def main():
+        bot = ImageReactionBot()
+        await bot.setup_hook()
+        reacted = []
+
+        async def get_emojis_for_attachment(message, attachment, policy, priority):
+            delay, emojis = results[attachment.url]
+            await asyncio.sleep(delay)
+            return emojis
+
+        async def add_reactions(message, emojis):
+            reacted.append(emojis)
+            return emojis
+
+        bot.get_emojis_for_attachment = get_emojis_for_attachment
+        bot.add_reactions = add_reactions
+        try:
+            msg = message("a", "b", "c")
+            await bot.process_message_images(msg, msg.attachments, bot.router.default_policy)
+            return reacted
+        finally:
+            await bot.close_pipeline()
+
+    assert asyncio.run(main()) == [["🐱", "🌞", "🐶", "❌"]]
+
+def test_attachments_are_processed_concurrently_within_the_image_limit():
+    urls = [f"img{index}" for index in range(6)]
+    running = []
+    peak = []
+
+    class SlowDownloader(FakeDownloader):
+        async def download(self, url, expected_size=None):
+            running.append(url)
+            peak.append(len(running))
+            await asyncio.sleep(0.02)
+            running.remove(url)
+            return None
+
+    async def main():
+        bot = ImageReactionBot()
+        await bot.setup_hook()
+        bot.image_semaphore = asyncio.Semaphore(2)
+        bot.downloader = SlowDownloader({})
+        try:
+            msg = message(*urls)
+            await bot.process_message_images(msg, msg.attachments, bot.router.default_policy)
+        finally:
+            await bot.close_pipeline()
+
+    asyncio.run(main())
+    assert max(peak) == 2
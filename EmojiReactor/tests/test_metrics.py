@@ -0,0 +1,77 @@
+import re
+
+import pytest
+
+from metrics import METRIC_PREFIX, Histogram, Metrics
+
+def histogram(*values, buckets=(1.0, 2.0, 4.0)):
+    result = Histogram(buckets)
+    for value in values:
+        result.observe(value)
+    return result
+
+def test_empty_histogram():
+    empty = histogram()
+    assert empty.quantile(0.5) == 0.0
+    assert empty.summary() == {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+@pytest.mark.parametrize("values, q, expected", [
+    # Interpolated inside the (1, 2] bucket
+    ([1.5] * 10, 0.1, 1.1),
+    ([1.5] * 10, 0.5, 1.5),
+    # Half in (0, 1], half in (2, 4]
+    ([0.5] * 5 + [3.0] * 5, 0.2, 0.4),
+    ([0.5] * 5 + [3.0] * 5, 0.6, 2.4),
+    # Never above the largest observation
+    ([0.5] * 5 + [3.0] * 5, 0.9, 3.0),
+    # Above the last bound, interpolated up to the maximum
+    ([10.0] * 4, 0.5, 7.0),
+])
+def test_quantiles_interpolate_within_buckets(values, q, expected):
+    assert histogram(*values).quantile(q) == pytest.approx(expected)
+
+def test_bucket_bounds_are_inclusive():
+    assert histogram(1.0, 2.0, 4.0, 5.0).counts == [1, 1, 1, 1]
+
+def parse(text):
+    """Map "name{labels}" to its value for every sample line"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            key, value = line.rsplit(" ", 1)
+            samples[key] = float(value)
+    return samples
+
+def test_prometheus_histograms_are_cumulative():
+    registry = Metrics()
+    for seconds in (0.002, 0.002, 0.5, 200.0):
+        registry.observe("download", seconds)
+
+    text = registry.render_prometheus()
+    samples = parse(text)
+    name = f"{METRIC_PREFIX}_stage_seconds"
+    buckets = [
+        (float(bound), value) for key, value in samples.items()
+        for bound in re.findall(rf'^{name}_bucket{{stage="download",le="([\d.e-]+)"}}$', key)
+    ]
+
+    assert f"# TYPE {name} histogram" in text
+    assert [value for _, value in buckets] == sorted(value for _, value in buckets)
+    assert dict(buckets)[0.00225] == 2
+    # 200 s is past the last bound and only counted by +Inf
+    assert buckets[-1][1] == 3
+    assert samples[f'{name}_bucket{{stage="download",le="+Inf"}}'] == 4
+    assert samples[f'{name}_sum{{stage="download"}}'] == pytest.approx(200.504)
+    assert samples[f'{name}_count{{stage="download"}}'] == 4
+
+def test_prometheus_counters_and_gauges():
+    registry = Metrics()
+    registry.record_usage("gpt-4o-mini", type("Usage", (), {"prompt_tokens": 1000, "completion_tokens": 10})())
+    registry.register_gauges(lambda: {"ingest_queue_depth": 3})
+
+    samples = parse(registry.render_prometheus())
+
+    assert samples[f'{METRIC_PREFIX}_openai_requests_total{{model="gpt-4o-mini"}}'] == 1
+    assert samples[f'{METRIC_PREFIX}_openai_tokens_total{{model="gpt-4o-mini",type="prompt"}}'] == 1000
+    assert samples[f'{METRIC_PREFIX}_openai_cost_usd_total{{model="gpt-4o-mini"}}'] == pytest.approx(0.000156)
+    assert samples[f"{METRIC_PREFIX}_ingest_queue_depth"] == 3
@@ -0,0 +1,67 @@
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+from perceptual_index import PerceptualIndex
+from utils import ImageUtils
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+def test_finds_hashes_within_max_distance():
+    index = PerceptualIndex(max_distance=6)
+    base = 0x0123456789ABCDEF
+    index.add(base, "a")
+
+    assert index.find(base) == ("a", 0)
+    assert index.find(flip(base, 0, 17, 33, 40, 50, 63)) == ("a", 6)
+    assert index.find(flip(base, 0, 1, 17, 33, 40, 50, 63)) is None
+    assert index.stats()["hits"] == 2
+
+def test_returns_the_closest_match():
+    index = PerceptualIndex(max_distance=6)
+    index.add(0, "far")
+    index.add(flip(0, 1), "near")
+    assert index.find(flip(0, 1, 2)) == ("near", 1)
+
+def test_agrees_with_a_linear_scan():
+    rng = random.Random(3)
+    index = PerceptualIndex(max_distance=6)
+    stored = [rng.getrandbits(64) for _ in range(300)]
+    for image_hash in stored:
+        index.add(image_hash, image_hash)
+
+    for _ in range(300):
+        query = flip(rng.choice(stored), *rng.sample(range(64), rng.randint(0, 9)))
+        distance, closest = min(((candidate ^ query).bit_count(), candidate) for candidate in stored)
+        found = index.find(query)
+        if distance <= 6:
+            assert found is not None and found[1] == distance
+        else:
+            assert found is None
+
+def test_evicts_the_oldest_entries():
+    index = PerceptualIndex(max_distance=0, max_entries=2)
+    for value in (1, 2, 3):
+        index.add(value << 40, value)
+    assert len(index) == 2
+    assert index.find(1 << 40) is None
+    assert index.find(3 << 40) == (3, 0)
+
+def test_resized_copies_hash_within_the_default_distance():
+    img = Image.new("RGB", (400, 300), "white")
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((50, 40, 250, 240), fill="red")
+    draw.rectangle((260, 60, 380, 280), fill="navy")
+
+    def encoded(image, image_format, **options):
+        output = io.BytesIO()
+        image.save(output, format=image_format, **options)
+        return output.getvalue()
+
+    original = ImageUtils.compute_dhash(encoded(img, "PNG"))
+    copy = ImageUtils.compute_dhash(encoded(img.resize((200, 150)), "JPEG", quality=70))
+    assert (original ^ copy).bit_count() <= 6
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from utils import PRIORITY_BACKFILL, PRIORITY_FRESH, RateLimiter, TokenBucket
+
+def test_bucket_refills_continuously_up_to_capacity():
+    bucket = TokenBucket(60)
+    bucket.updated = 0.0
+    bucket.level = 0
+
+    assert bucket.time_until(1, now=0.0) == pytest.approx(1.0)
+    assert bucket.time_until(1, now=0.5) == pytest.approx(0.5)
+    bucket.refill(1000.0)
+    assert bucket.level == 60
+
+def test_amounts_above_capacity_wait_for_a_full_bucket():
+    bucket = TokenBucket(60)
+    bucket.updated = 0.0
+    bucket.level = 30
+    assert bucket.time_until(500, now=0.0) == pytest.approx(30.0)
+
+def test_set_limit_never_raises_the_level():
+    bucket = TokenBucket(600)
+    bucket.set_limit(100)
+    assert (bucket.capacity, bucket.level) == (100, 100)
+
+def test_fresh_requests_are_granted_before_backfill():
+    async def scenario():
+        # 20 requests/s with the request bucket empty
+        limiter = RateLimiter(1200, 10 ** 9, headroom=1.0)
+        limiter.requests.level = 0
+        order = []
+
+        async def request(name, priority):
+            await limiter.acquire(10, priority)
+            order.append(name)
+
+        backfill = asyncio.create_task(request("backfill", PRIORITY_BACKFILL))
+        await asyncio.sleep(0)
+        fresh = asyncio.create_task(request("fresh", PRIORITY_FRESH))
+        await asyncio.gather(backfill, fresh)
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["fresh", "backfill"]
+    assert stats["granted"] == {PRIORITY_FRESH: 1, PRIORITY_BACKFILL: 1}
+
+def test_headers_tighten_the_budget_and_settle_refunds_tokens():
+    limiter = RateLimiter(1000, 100000, headroom=0.9)
+    limiter.update_from_headers({
+        "x-ratelimit-limit-requests": "500",
+        "x-ratelimit-remaining-requests": "100",
+        "x-ratelimit-limit-tokens": "100000",
+        "x-ratelimit-remaining-tokens": "50000",
+    })
+    assert limiter.requests.capacity == pytest.approx(450)
+    # Remaining minus the 10% held back
+    assert limiter.requests.level == pytest.approx(50)
+    assert limiter.tokens.level == pytest.approx(40000)
+
+    async def settle():
+        limiter.settle(reserved=1000, used=400)
+
+    asyncio.run(settle())
+    assert limiter.tokens.level == pytest.approx(40600, abs=1)
+
+def test_pause_holds_every_lane():
+    async def scenario():
+        limiter = RateLimiter(10 ** 6, 10 ** 9, headroom=1.0)
+        limiter.pause(0.05)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await limiter.acquire(1)
+        return loop.time() - started, limiter.stats()["throttled"]
+
+    waited, throttled = asyncio.run(scenario())
+    assert waited >= 0.04
+    assert throttled == 1
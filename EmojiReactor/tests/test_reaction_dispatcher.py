@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from reaction_dispatcher import ReactionDispatcher
+
+class FakeMessage:
+    def __init__(self, message_id, channel_id, log, fail=()):
+        self.id = message_id
+        self.channel = SimpleNamespace(id=channel_id)
+        self.log = log
+        self.fail = set(fail)
+
+    async def add_reaction(self, emoji):
+        await asyncio.sleep(0.001)
+        if emoji in self.fail:
+            raise discord.HTTPException(SimpleNamespace(status=403, reason="Forbidden"), "Missing Permissions")
+        self.log.append((self.channel.id, self.id, emoji))
+
+def test_reactions_are_sent_in_order_per_channel():
+    log = []
+
+    async def scenario():
+        dispatcher = ReactionDispatcher()
+        first, second = FakeMessage(1, 10, log), FakeMessage(2, 20, log)
+        return await asyncio.gather(
+            dispatcher.add_reactions(first, ["a", "b", "c"]),
+            dispatcher.add_reactions(second, ["x", "y"]),
+        )
+
+    assert asyncio.run(scenario()) == [["a", "b", "c"], ["x", "y"]]
+    assert [emoji for channel, _, emoji in log if channel == 10] == ["a", "b", "c"]
+    assert [emoji for channel, _, emoji in log if channel == 20] == ["x", "y"]
+
+def test_identical_pending_reactions_are_coalesced():
+    log = []
+
+    async def scenario():
+        dispatcher = ReactionDispatcher()
+        message = FakeMessage(1, 10, log)
+        results = await asyncio.gather(
+            dispatcher.add_reactions(message, ["a", "b"]),
+            dispatcher.add_reactions(message, ["b"]),
+        )
+        return results, dispatcher.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [["a", "b"], ["b"]]
+    assert [emoji for _, _, emoji in log] == ["a", "b"]
+    assert stats["coalesced"] == 1
+    assert stats["sent"] == 2
+
+def test_failed_reactions_are_left_out_and_counted():
+    async def scenario():
+        dispatcher = ReactionDispatcher()
+        added = await dispatcher.add_reactions(FakeMessage(1, 10, [], fail={"b"}), ["a", "b"])
+        return added, dispatcher.stats()
+
+    added, stats = asyncio.run(scenario())
+    assert added == ["a"]
+    assert stats["failed"] == 1
+    assert stats["queued"] == 0 and stats["active_buckets"] == 0
@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+from bot import ImageReactionBot
+from launch_shards import shard_slices
+
+@pytest.mark.parametrize("shard_count, processes", [(1, 1), (4, 4), (10, 3), (16, 5), (7, 7)])
+def test_every_shard_goes_to_exactly_one_process(shard_count, processes):
+    slices = shard_slices(shard_count, processes)
+
+    assert len(slices) == processes
+    assert sorted(shard_id for shard_ids in slices for shard_id in shard_ids) == list(range(shard_count))
+    # Round-robin keeps the slices within one shard of each other
+    assert max(map(len, slices)) - min(map(len, slices)) <= 1
+
+def bot_for(shard_ids, shard_count):
+    bot = ImageReactionBot()
+    bot.shard_count = shard_count
+    bot.shard_ids = shard_ids
+    return bot
+
+def test_every_guild_is_owned_by_exactly_one_process():
+    shard_count = 10
+    bots = [bot_for(shard_ids, shard_count) for shard_ids in shard_slices(shard_count, 3)]
+    rng = random.Random(1)
+    guild_ids = [rng.getrandbits(63) for _ in range(500)] + [None]
+
+    for guild_id in guild_ids:
+        assert sum(bot.owns_guild(guild_id) for bot in bots) == 1
+
+def test_ownership_follows_discords_shard_formula():
+    bot = bot_for([3], 4)
+    # Only the timestamp bits above 22 count
+    assert bot.owns_guild((7 << 22) | 4095)
+    assert not bot.owns_guild(8 << 22)
+    # DMs arrive on shard 0
+    assert not bot.owns_guild(None)
+    assert bot_for([0], 4).owns_guild(None)
+
+def test_an_unsharded_bot_owns_every_guild():
+    bot = bot_for(None, None)
+    assert bot.owns_guild(12345 << 22)
+    assert bot.owns_guild(None)
@@ -0,0 +1,229 @@
+import asyncio
+import base64
+import io
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from PIL import Image
+
+from utils import DownloadError, ImageDownloader, ImageUtils
+
+def test_encode_data_url_matches_b64encode():
+    data = bytes(range(256)) * 7 + b"x"
+    url = ImageUtils.encode_data_url(bytearray(data), "image/png")
+    assert url == "data:image/png;base64," + base64.b64encode(data).decode("ascii")
+
+def test_encode_data_url_of_empty_data():
+    assert ImageUtils.encode_data_url(b"", "image/jpeg") == "data:image/jpeg;base64,"
+
+def download(handler, expected_size=None, **options):
+    """Download /image from a local server answering with handler, returning (result, downloader)"""
+    async def main():
+        app = web.Application()
+        app.router.add_get("/image", handler)
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            downloader = ImageDownloader(session, **options)
+            try:
+                return await downloader.download(str(server.make_url("/image")), expected_size), downloader
+            except DownloadError as e:
+                return e, downloader
+    return asyncio.run(main())
+
+@pytest.mark.parametrize("status", [500, 503, 429])
+def test_server_errors_are_transient(status):
+    async def handler(request):
+        return web.Response(status=status)
+
+    result, downloader = download(handler)
+    assert isinstance(result, DownloadError)
+    assert downloader.failed == 1
+
+def test_missing_files_are_rejected():
+    async def handler(request):
+        return web.Response(status=404)
+
+    assert download(handler)[0] is None
+
+def test_timeouts_are_transient():
+    async def handler(request):
+        await asyncio.sleep(1)
+        return web.Response(body=b"late")
+
+    result, _ = download(handler, timeout=0.1)
+    assert isinstance(result, DownloadError)
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+def serve(body):
+    async def handler(request):
+        return web.Response(body=body)
+    return handler
+
+def stream(*chunks):
+    """Answer with a chunked body, without Content-Length"""
+    async def handler(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for chunk in chunks:
+            await response.write(chunk)
+        await response.write_eof()
+        return response
+    return handler
+
+def test_oversized_attachments_are_rejected_before_the_request():
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        return web.Response(body=PNG_HEADER)
+
+    result, downloader = download(handler, expected_size=2048, max_size=1024)
+    assert result is None
+    assert requests == []
+    assert downloader.rejected_too_large == 1
+
+def test_oversized_content_length_is_rejected_before_the_body():
+    result, downloader = download(serve(PNG_HEADER + bytes(2048)), max_size=1024)
+    assert result is None
+    assert downloader.rejected_too_large == 1
+    assert downloader.bytes_downloaded == 0
+
+def test_chunked_streams_are_aborted_past_max_size():
+    result, downloader = download(stream(PNG_HEADER, bytes(600), bytes(600)), max_size=1024, chunk_size=256)
+    assert result is None
+    assert downloader.rejected_too_large == 1
+
+@pytest.mark.parametrize("body", [b"<html>not an image</html>", b"tiny"])
+def test_non_images_are_rejected_by_their_magic_bytes(body):
+    result, downloader = download(serve(body))
+    assert result is None
+    assert downloader.rejected_not_image == 1
+
+def test_short_images_are_accepted():
+    result, _ = download(serve(b"GIF89a"))
+    assert result == b"GIF89a"
+
+def test_buffer_is_trimmed_to_the_body():
+    body = PNG_HEADER + bytes(1000)
+    result, downloader = download(stream(body[:500], body[500:]), expected_size=4096, chunk_size=256)
+    assert result == body
+    assert downloader.stats() == {
+        "downloads": 1,
+        "bytes_downloaded": len(body),
+        "rejected_too_large": 0,
+        "rejected_not_image": 0,
+        "failed": 0,
+        # Preallocated from the announced size
+        "peak_buffer_bytes": 4096,
+        "last_buffer_bytes": 4096,
+    }
+
+def encode(img, image_format, **options):
+    output = io.BytesIO()
+    img.save(output, format=image_format, **options)
+    return output.getvalue()
+
+@pytest.mark.parametrize("size, image_format, expected", [
+    ((640, 480), "PNG", False),
+    ((640, 480), "JPEG", False),
+    ((640, 480), "GIF", True),
+    ((640, 480), "BMP", True),
+    ((3000, 600), "PNG", True),
+    ((1000, 1000), "PNG", True),
+])
+def test_needs_preprocessing(size, image_format, expected):
+    descriptor = ImageUtils.describe(encode(Image.new("RGB", size), image_format))
+    assert ImageUtils.needs_preprocessing(descriptor) is expected
+
+def test_needs_preprocessing_of_large_or_unreadable_files():
+    descriptor = ImageUtils.describe(encode(Image.effect_noise((700, 700), 128).convert("RGB"), "PNG"))
+    assert ImageUtils.needs_preprocessing(descriptor, max_bytes=1024)
+    assert ImageUtils.needs_preprocessing(None)
+
+@pytest.mark.parametrize("size, expected", [
+    ((4000, 1000), (2048, 512)),
+    ((1000, 4000), (512, 2048)),
+    ((1200, 1000), (922, 768)),
+    ((300, 200), (300, 200)),
+])
+def test_prepare_for_vision_fits_both_limits(size, expected):
+    payload, mime_type = ImageUtils.prepare_for_vision(encode(Image.new("RGB", size), "PNG"))
+    assert mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(payload)).size == expected
+
+def test_prepare_for_vision_converts_formats_the_api_does_not_take():
+    payload, mime_type = ImageUtils.prepare_for_vision(encode(Image.new("RGB", (64, 64), "red"), "BMP"))
+    assert mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(payload)).format == "JPEG"
+
+def test_prepare_for_vision_flattens_alpha_for_jpeg_and_keeps_it_for_webp():
+    transparent = encode(Image.new("RGBA", (64, 64), (0, 0, 0, 0)), "PNG")
+
+    jpeg, _ = ImageUtils.prepare_for_vision(transparent)
+    assert Image.open(io.BytesIO(jpeg)).getpixel((32, 32)) == (255, 255, 255)
+
+    webp, mime_type = ImageUtils.prepare_for_vision(transparent, output_format="WEBP")
+    assert mime_type == "image/webp"
+    assert Image.open(io.BytesIO(webp)).mode == "RGBA"
+
+COLOURS = [(255, 0, 0), (0, 0, 255), (0, 255, 0), (255, 255, 0)]
+
+def animation(colours, image_format="GIF", size=(100, 50)):
+    frames = [Image.new("RGB", size, colour) for colour in colours]
+    # Lossless, so nearly identical frames stay distinct
+    options = {"lossless": True} if image_format == "WEBP" else {}
+    return encode(frames[0], image_format, save_all=True, append_images=frames[1:], duration=100, loop=0, **options)
+
+@pytest.mark.parametrize("image_format", ["GIF", "WEBP"])
+def test_even_selection_spaces_frames(image_format):
+    data = animation([(index * 20, 0, 0) for index in range(12)], image_format)
+    assert ImageUtils.select_frames(data, 4, "even") == [0, 3, 6, 9]
+
+@pytest.mark.parametrize("image_format", ["GIF", "WEBP"])
+def test_scene_selection_keeps_the_cuts(image_format):
+    # Three scenes of four frames each; encoders merge identical frames, so each differs a little
+    scenes = [(0, 0, 0), (255, 255, 255), (128, 128, 128)]
+    data = animation([(red, green, blue ^ index) for red, green, blue in scenes for index in range(4)], image_format)
+    frames = ImageUtils.select_frames(data, 4, "scene")
+    assert len(frames) == 4
+    assert frames[0] == 0
+    assert {4, 8} <= set(frames)
+
+def test_short_animations_and_still_images_keep_every_frame():
+    assert ImageUtils.select_frames(animation(COLOURS[:3]), 4) == [0, 1, 2]
+    assert ImageUtils.select_frames(encode(Image.new("RGB", (10, 10)), "PNG"), 4) == [0]
+
+def cell_colours(sheet, columns, rows):
+    width, height = sheet.width // columns, sheet.height // rows
+    return [
+        sheet.getpixel((column * width + width // 2, row * height + height // 2))
+        for row in range(rows) for column in range(columns)
+    ]
+
+def close_to(actual, expected):
+    return all(abs(a - b) <= 16 for a, b in zip(actual, expected))
+
+def test_contact_sheet_tiles_frames_in_playback_order():
+    payload, mime_type = ImageUtils.build_contact_sheet(animation(COLOURS), count=4)
+    sheet = Image.open(io.BytesIO(payload)).convert("RGB")
+
+    assert mime_type == "image/jpeg"
+    assert sheet.size == (200, 100)
+    assert all(map(close_to, cell_colours(sheet, 2, 2), COLOURS))
+
+def test_contact_sheet_leaves_unused_cells_blank():
+    payload, _ = ImageUtils.build_contact_sheet(animation(COLOURS[:3]), count=3)
+    sheet = Image.open(io.BytesIO(payload)).convert("RGB")
+
+    assert sheet.size == (200, 100)
+    assert close_to(cell_colours(sheet, 2, 2)[3], (255, 255, 255))
+
+def test_contact_sheet_of_a_single_frame_is_the_frame():
+    payload, _ = ImageUtils.build_contact_sheet(encode(Image.new("RGB", (100, 50), "red"), "PNG"))
+    assert Image.open(io.BytesIO(payload)).size == (100, 50)
+
+def test_contact_sheet_fits_the_vision_limits():
+    payload, _ = ImageUtils.build_contact_sheet(animation(COLOURS, size=(1000, 1000)), count=4)
+    assert Image.open(io.BytesIO(payload)).size == (768, 768)
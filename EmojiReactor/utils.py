@@ -1,12 +1,133 @@
 import logging
+import logging.handlers
 import asyncio
-from typing import Optional, Tuple
+import binascii
+import json
+import math
+import queue
+import random
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 import aiohttp
 from PIL import Image
 import io
 
 logger = logging.getLogger(__name__)
 
+# MIME types accepted by the vision API, keyed by Pillow format name
+VISION_MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'GIF': 'image/gif',
+}
+
+# Magic bytes of the image formats we accept, with their Pillow format name
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'RIFF', 'WEBP'),  # followed by 4 size bytes and "WEBP"
+    (b'BM', 'BMP'),
+]
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Return the shared process pool used for CPU-heavy image work"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker_logging)
+    return _process_pool
+
+async def run_in_process(func, *args):
+    """Run a picklable function in the shared process pool"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+def shutdown_process_pool():
+    """Shut down the shared process pool"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+class BufferReader(io.RawIOBase):
+    """Read-only file object over a bytes-like buffer without copying it
+    
+    io.BytesIO copies anything that isn't an immutable bytes object, which
+    for a downloaded bytearray means a second full copy of the image just to
+    let Pillow read its header.
+    """
+    
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._position = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+    
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._position + size)
+        data = bytes(self._view[self._position:end])
+        self._position = max(self._position, end)
+        return data
+    
+    def readinto(self, target) -> int:
+        data = self._view[self._position:self._position + len(target)]
+        target[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+class ImageDescriptor:
+    """Image metadata parsed once from the header and passed along the pipeline"""
+    
+    def __init__(self, image_format: str, width: int, height: int, size: int, is_animated: bool = False):
+        self.format = image_format
+        self.width = width
+        self.height = height
+        self.size = size
+        self.is_animated = is_animated
+    
+    @property
+    def mime_type(self) -> Optional[str]:
+        """MIME type if the vision API accepts this format as-is"""
+        return VISION_MIME_TYPES.get(self.format)
+    
+    def __repr__(self) -> str:
+        return (f"ImageDescriptor({self.format} {self.width}x{self.height}, {self.size} bytes"
+                f"{', animated' if self.is_animated else ''})")
+
+# Upper hue bounds (0-255 scale) of the colour names EmojiMapper maps
+COLOR_HUES = (
+    (11, 'red'),
+    (28, 'orange'),
+    (46, 'yellow'),
+    (120, 'green'),
+    (185, 'blue'),
+    (215, 'purple'),
+    (242, 'pink'),
+    (256, 'red'),
+)
+
 class ImageUtils:
     """Utility functions for image processing"""
     
@@ -27,7 +148,8 @@ class ImageUtils:
         return len(data) <= max_size
     
     @staticmethod
-    async def download_image(session: aiohttp.ClientSession, url: str, timeout: int = 30) -> Optional[bytes]:
+    async def download_image(session: aiohttp.ClientSession, url: str, timeout: int = 30,
+                             max_size: int = 10485760) -> Optional[bytearray]:
         """
         Download image data from URL
         
@@ -35,26 +157,27 @@ class ImageUtils:
             session: aiohttp session
             url: Image URL
             timeout: Request timeout in seconds
+            max_size: Maximum accepted size in bytes
             
         Returns:
-            Image data as bytes, or None if failed
+            Image data, or None if failed
         """
         try:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
-                if response.status == 200:
-                    data = await response.read()
-                    logger.debug(f"Downloaded image: {len(data)} bytes from {url}")
-                    return data
-                else:
-                    logger.error(f"Failed to download image: HTTP {response.status}")
-                    return None
-        except asyncio.TimeoutError:
-            logger.error(f"Timeout downloading image from {url}")
-            return None
-        except Exception as e:
-            logger.error(f"Error downloading image from {url}: {e}")
+            return await ImageDownloader(session, max_size=max_size, timeout=timeout).download(url)
+        except DownloadError as e:
+            logger.error(str(e))
             return None
     
+    @staticmethod
+    def sniff_image_format(header: bytes) -> Optional[str]:
+        """Return the Pillow format name matching an image's magic bytes, if any"""
+        for signature, image_format in IMAGE_SIGNATURES:
+            if header.startswith(signature):
+                if image_format == 'WEBP' and header[8:12] != b'WEBP':
+                    continue
+                return image_format
+        return None
+    
     @staticmethod
     def get_image_info(image_data: bytes) -> Optional[Tuple[str, int, int]]:
         """
@@ -66,48 +189,607 @@ class ImageUtils:
         Returns:
             Tuple of (format, width, height) or None if failed
         """
+        descriptor = ImageUtils.describe(image_data)
+        if descriptor is None:
+            return None
+        return descriptor.format, descriptor.width, descriptor.height
+    
+    @staticmethod
+    def describe(image_data) -> Optional[ImageDescriptor]:
+        """
+        Parse image metadata from the header without copying the buffer
+        
+        Args:
+            image_data: Image data as any bytes-like object
+            
+        Returns:
+            ImageDescriptor, or None if the data is not a readable image
+        """
         try:
-            with Image.open(io.BytesIO(image_data)) as img:
-                return img.format, img.width, img.height
+            with Image.open(BufferReader(image_data)) as img:
+                return ImageDescriptor(
+                    img.format,
+                    img.width,
+                    img.height,
+                    memoryview(image_data).nbytes,
+                    is_animated=getattr(img, 'is_animated', False)
+                )
         except Exception as e:
             logger.error(f"Error getting image info: {e}")
             return None
     
+    @staticmethod
+    def needs_preprocessing(descriptor: Optional[ImageDescriptor], max_long_side: int = 2048,
+                            max_short_side: int = 768, max_bytes: int = 524288) -> bool:
+        """
+        Check whether an image should be downscaled/re-encoded before upload
+        
+        Works from the parsed header only, so this is cheap enough for the
+        event loop. Small images already in a format the vision API accepts
+        are sent as-is.
+        """
+        if descriptor is None:
+            return True
+        
+        return (
+            descriptor.mime_type is None
+            or descriptor.format == 'GIF'
+            or max(descriptor.width, descriptor.height) > max_long_side
+            or min(descriptor.width, descriptor.height) > max_short_side
+            or descriptor.size > max_bytes
+        )
+    
+    @staticmethod
+    def encode_data_url(image_data, mime_type: str) -> str:
+        """
+        Build a base64 data URL for an image
+        
+        The image is encoded straight from a memoryview, so a bytearray
+        buffer is not copied to bytes first. At peak two copies of the payload
+        exist (the base64 bytes and their str, then that str and the URL),
+        about twice the URL's size; only the URL is kept.
+        
+        Args:
+            image_data: Image data as any bytes-like object
+            mime_type: MIME type of the image
+            
+        Returns:
+            "data:<mime>;base64,<payload>" string
+        """
+        payload = binascii.b2a_base64(memoryview(image_data).cast('B'), newline=False).decode('ascii')
+        return f"data:{mime_type};base64," + payload
+    
+    @staticmethod
+    def prepare_for_vision(image_data: bytes, max_long_side: int = 2048, max_short_side: int = 768,
+                           output_format: str = 'JPEG', quality: int = 85) -> Optional[Tuple[bytes, str]]:
+        """
+        Decode, downscale and re-encode an image for the vision API
+        
+        The image is decoded once and shrunk so it fits the model's useful
+        resolution (longest side within max_long_side, shortest side within
+        max_short_side), then re-encoded as JPEG or WebP. CPU heavy, meant to
+        run in the process pool.
+        
+        Args:
+            image_data: Image data as bytes
+            max_long_side: Maximum size of the longest side in pixels
+            max_short_side: Maximum size of the shortest side in pixels
+            output_format: 'JPEG' or 'WEBP'
+            quality: Encoder quality (1-100)
+            
+        Returns:
+            Tuple of (encoded bytes, MIME type) or None if failed
+        """
+        try:
+            with Image.open(BufferReader(image_data)) as img:
+                width, height = img.size
+                scale = min(
+                    1.0,
+                    max_long_side / max(width, height),
+                    max_short_side / min(width, height)
+                )
+                target = (max(1, round(width * scale)), max(1, round(height * scale)))
+                
+                # Let JPEG decode at reduced scale before the precise resize
+                img.draft('RGB', target)
+                
+                has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+                if has_alpha and output_format == 'WEBP':
+                    img = img.convert('RGBA')
+                elif has_alpha:
+                    # JPEG has no alpha channel, flatten onto white
+                    rgba = img.convert('RGBA')
+                    img = Image.new('RGB', rgba.size, (255, 255, 255))
+                    img.paste(rgba, mask=rgba.getchannel('A'))
+                else:
+                    img = img.convert('RGB')
+                
+                if img.size != target:
+                    img = img.resize(target, Image.Resampling.LANCZOS)
+                
+                output = io.BytesIO()
+                img.save(output, format=output_format, quality=quality, optimize=output_format == 'JPEG')
+                return output.getvalue(), VISION_MIME_TYPES[output_format]
+        except Exception as e:
+            logger.error(f"Error preparing image for upload: {e}")
+            return None
+    
+    @staticmethod
+    def select_frames(image_data: bytes, count: int = 4, selection: str = 'scene',
+                      max_scanned: int = 240) -> List[int]:
+        """
+        Pick representative frame indices of an animated image
+        
+        'even' spaces the frames evenly. 'scene' keeps the first frame plus
+        the frames that differ most from the frame before them, comparing
+        tiny grayscale thumbnails; long animations are scanned with a stride
+        so at most max_scanned frames are decoded. May return fewer than
+        count frames when the animation has few distinct scenes.
+        
+        Returns:
+            Sorted frame indices
+        """
+        with Image.open(BufferReader(image_data)) as img:
+            frame_total = getattr(img, 'n_frames', 1)
+            if frame_total <= count:
+                return list(range(frame_total))
+            
+            if selection != 'scene':
+                step = frame_total / count
+                return [int(i * step) for i in range(count)]
+            
+            stride = max(1, frame_total // max_scanned)
+            scores = []
+            previous = None
+            for index in range(0, frame_total, stride):
+                img.seek(index)
+                thumbnail = img.convert('L').resize((16, 16), Image.Resampling.BILINEAR).tobytes()
+                if previous is not None:
+                    scores.append((sum(abs(a - b) for a, b in zip(thumbnail, previous)), index))
+                previous = thumbnail
+        
+        # Biggest changes first, but keep picks apart so one cut isn't sampled twice
+        spacing = frame_total // (count * 2)
+        chosen = [0]
+        for _, index in sorted(scores, reverse=True):
+            if all(abs(index - other) > spacing for other in chosen):
+                chosen.append(index)
+                if len(chosen) == count:
+                    break
+        return sorted(chosen)
+    
+    @staticmethod
+    def build_contact_sheet(image_data: bytes, count: int = 4, selection: str = 'scene',
+                            max_long_side: int = 2048, max_short_side: int = 768,
+                            output_format: str = 'JPEG', quality: int = 85) -> Optional[Tuple[bytes, str]]:
+        """
+        Tile representative frames of an animated GIF/WebP into one image
+        
+        The vision model only looks at the first frame of an animation, so
+        the sampled frames are laid out on a grid in playback order instead.
+        Decodes many frames, meant to run in the process pool.
+        
+        Args:
+            image_data: Image data as bytes
+            count: Number of frames to sample
+            selection: 'scene' or 'even', see select_frames()
+            max_long_side: Maximum size of the sheet's longest side in pixels
+            max_short_side: Maximum size of the sheet's shortest side in pixels
+            output_format: 'JPEG' or 'WEBP'
+            quality: Encoder quality (1-100)
+            
+        Returns:
+            Tuple of (encoded bytes, MIME type) or None if failed
+        """
+        try:
+            indices = ImageUtils.select_frames(image_data, count, selection)
+            columns = math.ceil(math.sqrt(len(indices)))
+            rows = math.ceil(len(indices) / columns)
+            
+            with Image.open(BufferReader(image_data)) as img:
+                width, height = img.size
+                sheet_width, sheet_height = width * columns, height * rows
+                scale = min(
+                    1.0,
+                    max_long_side / max(sheet_width, sheet_height),
+                    max_short_side / min(sheet_width, sheet_height)
+                )
+                cell = (max(1, round(width * scale)), max(1, round(height * scale)))
+                
+                sheet = Image.new('RGB', (cell[0] * columns, cell[1] * rows), (255, 255, 255))
+                for position, index in enumerate(indices):
+                    img.seek(index)
+                    frame = img.convert('RGBA')
+                    if frame.size != cell:
+                        frame = frame.resize(cell, Image.Resampling.LANCZOS)
+                    row, column = divmod(position, columns)
+                    sheet.paste(frame, (column * cell[0], row * cell[1]), frame)
+            
+            output = io.BytesIO()
+            sheet.save(output, format=output_format, quality=quality)
+            return output.getvalue(), VISION_MIME_TYPES[output_format]
+        except Exception as e:
+            logger.error(f"Error building contact sheet: {e}")
+            return None
+    
+    @staticmethod
+    def compute_dhash(image_data: bytes, hash_size: int = 8) -> Optional[int]:
+        """
+        Compute a difference hash (dHash) of an image
+        
+        The image is reduced to a (hash_size + 1) x hash_size grayscale
+        thumbnail and each bit records whether a pixel is brighter than its
+        right-hand neighbour, so re-encoded or resized copies hash alike.
+        
+        Args:
+            image_data: Image data as bytes
+            hash_size: Hash width/height, giving hash_size ** 2 bits
+            
+        Returns:
+            Hash as an int, or None if the image could not be decoded
+        """
+        try:
+            with Image.open(BufferReader(image_data)) as img:
+                # Let JPEG decode at reduced scale, we only need a thumbnail
+                img.draft('L', (hash_size * 8, hash_size * 8))
+                small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+                pixels = small.tobytes()
+            
+            value = 0
+            for row in range(hash_size):
+                offset = row * (hash_size + 1)
+                for col in range(hash_size):
+                    value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+            return value
+        except Exception as e:
+            logger.error(f"Error computing perceptual hash: {e}")
+            return None
+    
+    @staticmethod
+    def extract_local_signals(image_data: bytes, max_colors: int = 2) -> Optional[List[str]]:
+        """
+        Describe an image with words EmojiMapper knows, without any model
+        
+        Uses the dominant colour names of a 32x32 thumbnail and the aspect
+        ratio (panoramas, phone screenshots).
+        
+        Args:
+            image_data: Image data as bytes
+            max_colors: Maximum number of colour names
+            
+        Returns:
+            List of words, or None if the image could not be decoded
+        """
+        try:
+            with Image.open(BufferReader(image_data)) as img:
+                width, height = img.size
+                img.draft('RGB', (64, 64))
+                small = img.convert('RGB').resize((32, 32), Image.Resampling.BILINEAR).convert('HSV')
+                pixels = small.tobytes()
+            
+            counts = {}
+            saturated = 0
+            for i in range(0, len(pixels), 3):
+                hue, saturation, value = pixels[i], pixels[i + 1], pixels[i + 2]
+                if value < 50:
+                    name = 'black'
+                elif saturation < 40:
+                    name = 'white' if value > 200 else None
+                else:
+                    saturated += 1
+                    # Hue is 0-255 around the colour wheel
+                    name = next(name for bound, name in COLOR_HUES if hue < bound)
+                if name:
+                    counts[name] = counts.get(name, 0) + 1
+            
+            total = len(pixels) // 3
+            words = [
+                name for name, count in sorted(counts.items(), key=lambda item: -item[1])
+                if count / total >= 0.2
+            ][:max_colors]
+            if saturated / total > 0.6 and len([count for count in counts.values() if count / total >= 0.1]) >= 3:
+                words.append('colorful')
+            
+            aspect = height / width if width else 1.0
+            if aspect <= 0.45:
+                words.append('panorama')
+            elif 1.9 <= aspect <= 2.4:
+                words.append('phone')
+            return words
+        except Exception as e:
+            logger.error(f"Error extracting image signals: {e}")
+            return None
+    
     @staticmethod
     def is_animated_gif(image_data: bytes) -> bool:
         """Check if image is an animated GIF"""
         try:
-            with Image.open(io.BytesIO(image_data)) as img:
+            with Image.open(BufferReader(image_data)) as img:
                 return img.format == 'GIF' and hasattr(img, 'is_animated') and img.is_animated
         except Exception:
             return False
 
+class DownloadError(Exception):
+    """A download failed for a reason that may go away: a network error, timeout or server error"""
+
+# Statuses worth retrying later, besides 5xx
+TRANSIENT_HTTP_STATUSES = (408, 429)
+
+class ImageDownloader:
+    """Streaming, size-capped image downloader
+    
+    Oversized files are rejected from the attachment metadata or the
+    Content-Length header before any body is read, and non-images are
+    rejected from the magic bytes of the first chunk. The body is streamed
+    into a buffer preallocated from the expected size and the download is
+    aborted as soon as it grows past max_size.
+    """
+    
+    def __init__(self, session: aiohttp.ClientSession, max_size: int = 10485760,
+                 timeout: int = 30, chunk_size: int = 65536):
+        self.session = session
+        self.max_size = max_size
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        
+        # Counters
+        self.downloads = 0
+        self.bytes_downloaded = 0
+        self.rejected_too_large = 0
+        self.rejected_not_image = 0
+        self.failed = 0
+        self.peak_buffer_bytes = 0
+        self.last_buffer_bytes = 0
+    
+    async def download(self, url: str, expected_size: Optional[int] = None) -> Optional[bytearray]:
+        """
+        Download an image
+        
+        Args:
+            url: Image URL
+            expected_size: Size announced by Discord for the attachment, if known
+            
+        Returns:
+            Image data, or None if the file was rejected (too large, not an
+            image, or gone)
+            
+        Raises:
+            DownloadError: The download failed in a way a retry may fix
+        """
+        if expected_size and expected_size > self.max_size:
+            logger.warning(f"Skipping {url}: attachment is {MessageUtils.format_file_size(expected_size)}")
+            self.rejected_too_large += 1
+            return None
+        
+        try:
+            async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                if response.status != 200:
+                    self.failed += 1
+                    if response.status >= 500 or response.status in TRANSIENT_HTTP_STATUSES:
+                        raise DownloadError(f"HTTP {response.status} from {url}")
+                    logger.error(f"Failed to download image: HTTP {response.status}")
+                    return None
+                
+                content_length = response.content_length
+                if content_length is not None and content_length > self.max_size:
+                    logger.warning(f"Skipping {url}: Content-Length is {MessageUtils.format_file_size(content_length)}")
+                    self.rejected_too_large += 1
+                    return None
+                
+                buffer = bytearray(min(content_length or expected_size or self.chunk_size, self.max_size))
+                size = 0
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    end = size + len(chunk)
+                    if end > self.max_size:
+                        # Leaving the context manager drops the connection mid-body
+                        logger.warning(f"Aborted download of {url}: exceeds {MessageUtils.format_file_size(self.max_size)}")
+                        self.rejected_too_large += 1
+                        return None
+                    
+                    # Fills the preallocated space, growing the buffer only past it
+                    buffer[size:end] = chunk
+                    
+                    # The first 12 bytes identify every supported format
+                    if size < 12 <= end and ImageUtils.sniff_image_format(bytes(buffer[:12])) is None:
+                        logger.warning(f"Aborted download of {url}: not an image")
+                        self.rejected_not_image += 1
+                        return None
+                    size = end
+                
+                if size < 12 and ImageUtils.sniff_image_format(bytes(buffer[:size])) is None:
+                    logger.warning(f"Skipping {url}: not an image")
+                    self.rejected_not_image += 1
+                    return None
+                
+                self.last_buffer_bytes = len(buffer)
+                self.peak_buffer_bytes = max(self.peak_buffer_bytes, len(buffer))
+                del buffer[size:]
+                
+                self.downloads += 1
+                self.bytes_downloaded += size
+                logger.debug(f"Downloaded image: {size} bytes from {url}")
+                return buffer
+                
+        except DownloadError:
+            raise
+        except asyncio.TimeoutError as e:
+            self.failed += 1
+            raise DownloadError(f"Timeout downloading {url}") from e
+        except (aiohttp.ClientError, OSError) as e:
+            self.failed += 1
+            raise DownloadError(f"Error downloading {url}: {e}") from e
+        except Exception as e:
+            logger.error(f"Error downloading image from {url}: {e}")
+        self.failed += 1
+        return None
+    
+    def stats(self) -> dict:
+        """Return download counters and buffer sizes"""
+        return {
+            "downloads": self.downloads,
+            "bytes_downloaded": self.bytes_downloaded,
+            "rejected_too_large": self.rejected_too_large,
+            "rejected_not_image": self.rejected_not_image,
+            "failed": self.failed,
+            "peak_buffer_bytes": self.peak_buffer_bytes,
+            "last_buffer_bytes": self.last_buffer_bytes,
+        }
+
+# Rate limiter lanes, most urgent first
+PRIORITY_FRESH = 0       # messages that just arrived
+PRIORITY_BACKFILL = 1    # history backfill and journal replay
+PRIORITY_LANES = (PRIORITY_FRESH, PRIORITY_BACKFILL)
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """Parse an x-ratelimit-reset-* duration such as "1s", "6m0s" or "20ms" into seconds"""
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value or "")
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to one minute of budget"""
+    
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+    
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (amounts above capacity wait for a full bucket)"""
+        self.refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+    
+    def set_limit(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = min(self.level, per_minute)
+
 class RateLimiter:
-    """Simple rate limiter for API calls"""
+    """Async requests/min and tokens/min budget shared by concurrent callers
     
-    def __init__(self, max_calls: int, time_window: int):
-        self.max_calls = max_calls
-        self.time_window = time_window
-        self.calls = []
+    Callers wait in priority lanes; the head of the most urgent non-empty
+    lane is granted as soon as both buckets cover it, and the grant is
+    deducted at once, so concurrent callers cannot burst through together.
+    Token costs are estimates up front and corrected with the actual usage
+    afterwards. Limits and remaining budget are tightened from the API's
+    x-ratelimit-* headers, keeping `headroom` of the limit in reserve.
+    """
     
-    async def wait_if_needed(self):
-        """Wait if rate limit would be exceeded"""
-        import time
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, headroom: float = 0.9):
+        self.headroom = headroom
+        self.requests = TokenBucket(requests_per_minute * headroom)
+        self.tokens = TokenBucket(tokens_per_minute * headroom)
+        self.paused_until = 0.0
         
-        now = time.time()
+        # Waiting (tokens, future, queued_at) per lane
+        self._lanes = {lane: deque() for lane in PRIORITY_LANES}
+        self._timer: Optional[asyncio.TimerHandle] = None
         
-        # Remove old calls outside the time window
-        self.calls = [call_time for call_time in self.calls if now - call_time < self.time_window]
+        # Counters
+        self.granted = {lane: 0 for lane in PRIORITY_LANES}
+        self.waited = {lane: 0.0 for lane in PRIORITY_LANES}
+        self.throttled = 0
+    
+    async def acquire(self, tokens: int, priority: int = PRIORITY_FRESH):
+        """
+        Wait until one request costing `tokens` fits the budget, then reserve it
         
-        # If we're at the limit, wait
-        if len(self.calls) >= self.max_calls:
-            wait_time = self.time_window - (now - self.calls[0]) + 1
-            if wait_time > 0:
-                logger.info(f"Rate limit reached, waiting {wait_time:.2f} seconds")
-                await asyncio.sleep(wait_time)
+        Args:
+            tokens: Estimated tokens the request will use
+            priority: Lane to wait in, PRIORITY_FRESH or PRIORITY_BACKFILL
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[priority].append((tokens, future, time.monotonic()))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller gave up: return the reservation
+                self.requests.level += 1
+                self.tokens.level += tokens
+            self._schedule()
+            raise
+    
+    def _schedule(self):
+        """Grant waiting requests in priority order and arm a timer for the next one"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
         
-        # Record this call
-        self.calls.append(now)
+        now = time.monotonic()
+        for lane in PRIORITY_LANES:
+            waiting = self._lanes[lane]
+            while waiting:
+                tokens, future, queued_at = waiting[0]
+                if future.done():
+                    waiting.popleft()
+                    continue
+                
+                wait = max(
+                    self.paused_until - now,
+                    self.requests.time_until(1, now),
+                    self.tokens.time_until(tokens, now)
+                )
+                if wait > 0:
+                    # Lower lanes wait behind the blocked head too
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._schedule)
+                    return
+                
+                waiting.popleft()
+                self.requests.level -= 1
+                self.tokens.level -= min(tokens, self.tokens.capacity)
+                self.granted[lane] += 1
+                self.waited[lane] += now - queued_at
+                future.set_result(None)
+    
+    def settle(self, reserved: int, used: int):
+        """Correct the token bucket once a request's actual usage is known"""
+        self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved - used)
+        self._schedule()
+    
+    def update_from_headers(self, headers):
+        """Adopt the limits and remaining budget reported in x-ratelimit-* headers"""
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            try:
+                limit = float(headers.get(f"x-ratelimit-limit-{kind}"))
+                remaining = float(headers.get(f"x-ratelimit-remaining-{kind}"))
+            except (TypeError, ValueError):
+                continue
+            if abs(limit * self.headroom - bucket.capacity) > 0.5:
+                logger.info(f"OpenAI {kind} limit is {limit:.0f}/min, budgeting {limit * self.headroom:.0f}")
+                bucket.set_limit(limit * self.headroom)
+            # Other processes may share the limit: never assume more than the API has left
+            bucket.refill(time.monotonic())
+            bucket.level = min(bucket.level, remaining - limit * (1 - self.headroom))
+    
+    def pause(self, seconds: float):
+        """Hold every lane for `seconds`, e.g. after a 429"""
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self._schedule()
+    
+    def stats(self) -> dict:
+        """Return grants, average wait per lane and current budget"""
+        return {
+            "granted": dict(self.granted),
+            "avg_wait": {
+                lane: self.waited[lane] / self.granted[lane] if self.granted[lane] else 0.0
+                for lane in PRIORITY_LANES
+            },
+            "waiting": sum(len(waiting) for waiting in self._lanes.values()),
+            "throttled": self.throttled,
+            "requests_per_minute": self.requests.capacity,
+            "tokens_per_minute": self.tokens.capacity,
+        }
 
 class MessageUtils:
     """Utility functions for Discord message handling"""
@@ -142,35 +824,143 @@ class MessageUtils:
         )
         return url_pattern.findall(text)
 
-def setup_logging(log_level: str = "INFO", log_file: str = "discord_bot.log"):
-    """Setup logging configuration"""
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "location": f"{record.module}:{record.lineno}",
+        }
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class SamplingFilter(logging.Filter):
+    """Thins out DEBUG and INFO records before they are queued
+    
+    Each call site (logger name and line) may emit rate_limit records per
+    second; the next record let through reports how many were suppressed.
+    Loggers listed in sample_rates additionally keep only that fraction of
+    their records. Warnings and errors always pass.
+    """
+    
+    def __init__(self, rate_limit: float = 0, sample_rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rate_limit = rate_limit
+        self.sample_rates = sample_rates or {}
+        # (logger name, line) -> [window start, records in window, suppressed]
+        self._windows: Dict[tuple, list] = {}
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        
+        sample_rate = self.sample_rates.get(record.name)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return False
+        
+        if self.rate_limit <= 0:
+            return True
+        now = time.monotonic()
+        window = self._windows.get((record.name, record.lineno))
+        if window is None or now - window[0] >= 1.0:
+            suppressed = window[2] if window else 0
+            self._windows[(record.name, record.lineno)] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if window[1] < self.rate_limit:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+def setup_logging(log_level: str = "INFO", log_file: str = "discord_bot.log", json_format: bool = False,
+                  max_bytes: int = 10485760, backup_count: int = 5, rate_limit: float = 0,
+                  sample_rates: Optional[Dict[str, float]] = None) -> logging.handlers.QueueListener:
+    """
+    Setup non-blocking logging
+    
+    Loggers only put records on an in-memory queue; a listener thread does
+    the formatting and the console and rotating file writes, so logging
+    never blocks the event loop on disk I/O.
+    
+    Args:
+        log_level: Minimum level to log
+        log_file: Log file path, rotated when it reaches max_bytes
+        json_format: Write the file as JSON lines instead of text
+        max_bytes: Size at which the log file is rotated
+        backup_count: Rotated files to keep
+        rate_limit: DEBUG/INFO records per second per call site, 0 for no limit
+        sample_rates: Fraction of DEBUG/INFO records to keep per logger name
+        
+    Returns:
+        The started listener; stop() it on shutdown to flush the queue
+    """
     level = getattr(logging, log_level.upper(), logging.INFO)
     
     # Create formatters
-    file_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    if json_format:
+        file_formatter = JsonFormatter()
+    else:
+        file_formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
     console_formatter = logging.Formatter(
         '%(levelname)s - %(message)s'
     )
     
     # Setup file handler
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(level)
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
     file_handler.setFormatter(file_formatter)
     
     # Setup console handler
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(level)
     console_handler.setFormatter(console_formatter)
     
+    # Loggers enqueue, the listener thread writes
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(rate_limit, sample_rates))
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    
     # Setup root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(level)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
     
-    return root_logger
+    listener.start()
+    return listener
+
+def _init_worker_logging():
+    """Log to stderr in process pool workers, which have no listener thread"""
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(levelname)s - %(name)s - %(message)s'))
+    root_logger.addHandler(handler)
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse "logger=rate,logger=rate" into a dict"""
+    rates = {}
+    for item in spec.split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
 
 def validate_environment():
     """Validate that all required environment variables are set"""
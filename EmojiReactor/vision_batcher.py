@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class VisionBatcher:
+    """Collects images arriving close together into one multi-image request
+
+    The first image of a batch opens a window of `window` seconds; the batch
+    is sent when the window closes or `max_images` images are waiting,
+    whichever comes first. Each caller gets back the result for its own image.
+    """
+
+    def __init__(self, analyze_batch: Callable[[List[bytes], int], Awaitable[List[Optional[dict]]]],
+                 window: float = 0.2, max_images: int = 4):
+        self.analyze_batch = analyze_batch
+        self.window = window
+        self.max_images = max_images
+
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+        # Counters
+        self.batches = 0
+        self.images = 0
+
+    async def submit(self, image_data: bytes, priority: int = 0) -> Optional[dict]:
+        """
+        Queue an image for the next batch and wait for its result
+
+        Args:
+            image_data: Image data as bytes
+            priority: Rate limiter lane; a batch goes in its most urgent image's lane
+
+        Returns:
+            Structured analysis for this image, or None if analysis failed
+        """
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((image_data, priority, future))
+
+        if len(self._pending) >= self.max_images:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_window())
+
+        return await future
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        self._flush()
+
+    def _flush(self):
+        """Send everything pending as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run(batch))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch: List[tuple]):
+        self.batches += 1
+        self.images += len(batch)
+        try:
+            results = await self.analyze_batch(
+                [image_data for image_data, _, _ in batch],
+                min(priority for _, priority, _ in batch)
+            )
+        except Exception as e:
+            logger.error(f"Vision batch of {len(batch)} images failed: {e}")
+            results = []
+        # Never leave a caller waiting on a short result list
+        results = list(results) + [None] * (len(batch) - len(results))
+
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """Return batch counters"""
+        return {
+            "batches": self.batches,
+            "images": self.images,
+            "avg_batch_size": self.images / self.batches if self.batches else 0.0,
+        }